@@ -0,0 +1,35 @@
+"""flash3's bandwidth formula for GLM-4.7-FP8 decode on the 4-node TP=4 cluster
+
+tok/s = β×TP / (W + KV): every decode step reads the active weights once and
+the KV cache of every sequence in the batch. Test 1 (RESULTS.md) measured
+η ≈ 0.22 of this on the real cluster.
+"""
+
+# Model config for theoretical calculation
+NUM_LAYERS = 92
+NUM_KV_HEADS = 8
+HEAD_DIM = 53  # 5120 / 96
+KV_DTYPE_BYTES = 2  # bf16
+ACTIVE_WEIGHTS_GB = 32  # ~32B active params × 1 byte FP8
+BANDWIDTH_PER_NODE = 273  # GB/s
+TP = 4
+# With TP=4, effective bandwidth for decode = TP * bandwidth (each node reads its shard in parallel)
+# But there's network overhead for all-reduce after each layer
+EFFECTIVE_BANDWIDTH = BANDWIDTH_PER_NODE * TP  # theoretical max = 1092 GB/s
+MEASURED_EFFICIENCY = 0.22  # η from Test 1
+
+def kv_cache_gb(context_len):
+    """Calculate KV cache size in GB for given context length"""
+    kv_bytes = 2 * NUM_LAYERS * NUM_KV_HEADS * HEAD_DIM * KV_DTYPE_BYTES * context_len
+    return kv_bytes / (1024**3)
+
+def theoretical_toks(context_len):
+    """Calculate theoretical tok/s using flash3's formula adapted for TP"""
+    kv = kv_cache_gb(context_len)
+    # Each node processes W/TP weights + KV/TP cache
+    # tok/s = bandwidth / ((W + KV) / TP)  = (bandwidth * TP) / (W + KV)
+    return EFFECTIVE_BANDWIDTH / (ACTIVE_WEIGHTS_GB + kv)
+
+def decode_step_s(context_lens, efficiency=1.0):
+    """Seconds per decode step for a batch: weights are read once, plus every sequence's KV cache"""
+    return (ACTIVE_WEIGHTS_GB + sum(kv_cache_gb(c) for c in context_lens)) / (EFFECTIVE_BANDWIDTH * efficiency)
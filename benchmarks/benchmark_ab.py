@@ -1,14 +1,43 @@
 #!/usr/bin/env python3
 """
-A/B Benchmark: GLM-4.7-FP8 on SM121 (NVIDIA GB10)
-Test A: Without GB10 MoE configs (fallback/default)
-Test B: With GB10 MoE configs
+A/B/N Benchmark: GLM-4.7-FP8 on SM121 (NVIDIA GB10), fused MoE config variants
+
+Each arm is a directory of MoE config JSON files, or "builtin" for vLLM's
+built-in defaults (no tuned config). The model is loaded once; arms are
+switched by pointing VLLM_TUNED_CONFIG_FOLDER at the arm's directory and
+clearing vLLM's config cache, so the installed package is never modified.
+Every round runs each arm once in a shuffled order, which spreads thermal
+drift over all arms. Rounds continue until every arm's median tok/s is
+known to ±5% (sample_stats.py); each arm is then compared to the first.
+
+Note: vLLM falls back to the configs bundled in site-packages for any file
+missing from the arm directory, so every arm must hold a config for this
+model (checked before the run). "builtin" bypasses both. vLLM looks the file
+up by the name get_config_file_name() builds for this GPU and the model's
+experts, per-GPU intermediate size and fp8 block shape. The files under
+configs/ are named for SGLang at TP=4 (moe_config.CONFIG_FILE, N=384), so an
+arm that holds that file instead is staged under the looked-up name in a
+temporary overlay directory. The launch parameters are then timed at this
+script's TP, not the one they were tuned for. After every switch the config
+vLLM resolves is compared with the arm's file, so an arm can never silently
+time another arm's (or the bundled) configs.
+
+Usage:
+  python benchmark_ab.py                                   # builtin vs configs/triton_<installed triton>
+  python benchmark_ab.py builtin ../configs/triton_3_5_0 wide=/tmp/variants/wide_n
+  python benchmark_ab.py --variants ../configs             # builtin vs every config set under configs/ (triton_3_3_0, triton_3_5_0)
 """
-import subprocess, sys, time, json, os, shutil
+import argparse, itertools, json, os, random, sys, tempfile, time
+from moe_config import CONFIG_FILE as REPO_CONFIG_FILE
+from sample_stats import MAX_REPEATS, MIN_REPEATS, TARGET_REL_CI, bootstrap_diff, describe, rel_ci_half_width
 
-CONFIG_DIR = os.path.expanduser('~/miniforge3/lib/python3.12/site-packages/vllm/model_executor/layers/fused_moe/configs/')
-BACKUP_DIR = os.path.expanduser('~/sm121-kernels/gb10_configs_backup/')
+REPO_CONFIGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'configs')
 MODEL = 'zai-org/GLM-4.7-FP8'
+TENSOR_PARALLEL = 1
+DTYPE = 'fp8_w8a8'
+TUNED_CONFIG_ENV = 'VLLM_TUNED_CONFIG_FOLDER'
+BUILTIN = 'builtin'
+SEED = 42
 
 # Benchmark parameters
 PROMPTS = [
@@ -18,111 +47,199 @@ PROMPTS = [
     'Summarize the history of artificial intelligence in 200 words.',
 ]
 
-def get_gb10_configs():
-    return [f for f in os.listdir(CONFIG_DIR) if 'NVIDIA_GB10' in f]
+def default_arms():
+    """builtin vs the repo configs for the installed Triton version (newest if it has none)"""
+    dirs = sorted(d for d in os.listdir(REPO_CONFIGS) if d.startswith('triton_'))
+    try:
+        import triton
+        installed = 'triton_' + '_'.join(triton.__version__.split('+')[0].split('.')[:3])
+    except ImportError:
+        installed = None
+    chosen = installed if installed in dirs else dirs[-1]
+    return [BUILTIN, f'repo={os.path.join(REPO_CONFIGS, chosen)}']
+
+def moe_lookup_args():
+    """(E, N, dtype, block_n, block_k) as vLLM's fused MoE layer passes them to get_moe_configs()"""
+    from transformers import AutoConfig
+    hf_config = AutoConfig.from_pretrained(MODEL)
+    quant = getattr(hf_config, 'quantization_config', None) or {}
+    block_n, block_k = quant.get('weight_block_size') or (None, None)
+    return hf_config.n_routed_experts, hf_config.moe_intermediate_size // TENSOR_PARALLEL, DTYPE, block_n, block_k
+
+def config_file_name(lookup_args):
+    """The file vLLM looks up for this model on this GPU"""
+    from vllm.model_executor.layers.fused_moe.fused_moe import get_config_file_name
+    E, N, dtype, block_n, block_k = lookup_args
+    return get_config_file_name(E, N, dtype, [block_n, block_k] if block_n and block_k else None)
+
+def load_arm_config(path):
+    """The arm's config as vLLM returns it: int batch-size keys, no triton_version"""
+    with open(path) as f:
+        config = json.load(f)
+    config.pop('triton_version', None)
+    return {int(key): value for key, value in config.items()}
+
+def arm_config_source(path, config_file):
+    """The arm directory's config for this model: the file vLLM looks up, else the repo's layout; None if neither"""
+    for name in (config_file, REPO_CONFIG_FILE):
+        if os.path.isfile(os.path.join(path, name)):
+            return os.path.join(path, name)
+    return None
+
+def parse_arm(spec, config_file):
+    """'name=dir', 'dir' (named after the directory) or 'builtin' -> (name, config file or None)"""
+    if spec == BUILTIN:
+        return BUILTIN, None
+    name, path = spec.split('=', 1) if '=' in spec.split('/', 1)[0] else ('', spec)
+    path = os.path.abspath(os.path.expanduser(path))
+    source = arm_config_source(path, config_file)
+    if source is None:
+        raise SystemExit(f'{spec}: {path} has neither {config_file} nor {REPO_CONFIG_FILE}; '
+                         f'vLLM would silently use the installed configs')
+    return name or os.path.basename(path.rstrip('/')), source
+
+def stage_arm(overlay, name, source, config_file):
+    """Directory where vLLM finds source under config_file (the arm's own directory if the name already matches)"""
+    if os.path.basename(source) == config_file:
+        return os.path.dirname(source)
+    staged = os.path.join(overlay, name)
+    os.makedirs(staged)
+    os.symlink(source, os.path.join(staged, config_file))
+    return staged
+
+class ConfigSwitch:
+    """Points vLLM's fused MoE kernels at one arm's configs without touching site-packages
 
-def backup_configs():
-    os.makedirs(BACKUP_DIR, exist_ok=True)
-    for f in get_gb10_configs():
-        shutil.copy2(os.path.join(CONFIG_DIR, f), os.path.join(BACKUP_DIR, f))
+    Needs the engine in this process (VLLM_ENABLE_V1_MULTIPROCESSING=0) so
+    the environment variable and cache reset reach the model runner. Newer
+    vLLM caches environment variables once the engine starts
+    (envs.enable_envs_cache), so that cache is cleared too, and use() checks
+    that the lookup now returns the arm's config before anything is timed.
+    """
 
-def remove_configs():
-    for f in get_gb10_configs():
-        os.remove(os.path.join(CONFIG_DIR, f))
+    def __init__(self, lookup_args, config_file):
+        from vllm import envs
+        from vllm.model_executor.layers.fused_moe import fused_moe
+        self.envs = envs
+        self.module = fused_moe
+        self.lookup = fused_moe.get_moe_configs  # functools.lru_cache-wrapped
+        self.lookup_args = lookup_args
+        self.config_file = config_file
 
-def restore_configs():
-    for f in os.listdir(BACKUP_DIR):
-        shutil.copy2(os.path.join(BACKUP_DIR, f), os.path.join(CONFIG_DIR, f))
+    def use(self, arm_dir):
+        self.lookup.cache_clear()
+        env_cache_clear = getattr(self.envs.__getattr__, 'cache_clear', None)
+        if arm_dir is None:
+            os.environ.pop(TUNED_CONFIG_ENV, None)
+            self.module.get_moe_configs = lambda *args, **kwargs: None  # no tuned config: vLLM defaults
+        else:
+            os.environ[TUNED_CONFIG_ENV] = arm_dir
+            self.module.get_moe_configs = self.lookup
+        if env_cache_clear is not None:
+            env_cache_clear()
+        resolved = self.module.get_moe_configs(*self.lookup_args)
+        expected = load_arm_config(os.path.join(arm_dir, self.config_file)) if arm_dir else None
+        if resolved != expected:
+            raise SystemExit(f'vLLM resolved a different MoE config than arm {arm_dir or BUILTIN} '
+                             f'({"no config" if resolved is None else "another file"}); its timings would be mislabelled')
 
-def run_benchmark(label, prompts):
+def load_model():
+    os.environ['VLLM_ENABLE_V1_MULTIPROCESSING'] = '0'
     from vllm import LLM, SamplingParams
-    
-    print(f'\n=== {label} ===')
+
     print(f'Loading model: {MODEL}')
-    
     llm = LLM(
         model=MODEL,
-        tensor_parallel_size=1,
+        tensor_parallel_size=TENSOR_PARALLEL,
         max_model_len=4096,
         gpu_memory_utilization=0.85,
-        enforce_eager=True,  # No CUDA graph for fair comparison
+        enforce_eager=True,  # No CUDA graph: kernels pick their config on every call
     )
-    
-    sampling_params = SamplingParams(temperature=0.0, max_tokens=256)
-    
-    # Warmup
+    return llm, SamplingParams(temperature=0.0, max_tokens=256)
+
+def run_round(llm, sampling_params, prompts):
+    start = time.perf_counter()
+    outputs = llm.generate(prompts, sampling_params, use_tqdm=False)
+    elapsed = time.perf_counter() - start
+    total_tokens = sum(len(o.outputs[0].token_ids) for o in outputs)
+    return {'tokens': total_tokens, 'time_s': elapsed, 'tok_per_s': total_tokens / elapsed}
+
+def run_interleaved(llm, sampling_params, switch, arms, min_rounds, max_rounds):
+    rng = random.Random(SEED)
+    results = {name: [] for name, _ in arms}
+    for round_num in itertools.count(1):
+        order = arms[:]
+        rng.shuffle(order)  # a fresh order every round cancels drift
+        print(f'\n--- Round {round_num}: {", ".join(name for name, _ in order)} ---')
+        for name, arm_dir in order:
+            switch.use(arm_dir)
+            r = run_round(llm, sampling_params, PROMPTS)
+            results[name].append({'round': round_num, **r})
+            print(f'  {name:>16}: {r["tokens"]} tokens in {r["time_s"]:.2f}s = {r["tok_per_s"]:.1f} tok/s')
+        tight = all(rel_ci_half_width([r['tok_per_s'] for r in rs]) <= TARGET_REL_CI for rs in results.values())
+        if round_num >= max_rounds or (round_num >= min_rounds and tight):
+            return results
+
+def main():
+    parser = argparse.ArgumentParser(description='A/B/N fused MoE config benchmark (vLLM, one model load)')
+    parser.add_argument('arms', nargs='*', help="'builtin', a config directory, or name=directory; the first is the baseline")
+    parser.add_argument('--variants', help='add every subdirectory of this directory that holds the config as an arm')
+    parser.add_argument('--min-rounds', type=int, default=MIN_REPEATS)
+    parser.add_argument('--max-rounds', type=int, default=MAX_REPEATS)
+    args = parser.parse_args()
+    lookup_args = moe_lookup_args()
+    config_file = config_file_name(lookup_args)
+    specs = args.arms or ([BUILTIN] if args.variants else default_arms())
+    if args.variants:
+        specs += sorted(os.path.join(args.variants, d) for d in os.listdir(args.variants)
+                        if arm_config_source(os.path.join(args.variants, d), config_file))
+    sources = dict(parse_arm(spec, config_file) for spec in specs)
+    if len(sources) != len(specs):
+        sys.exit('arm names must be unique (use name=directory)')
+    overlay = tempfile.TemporaryDirectory(prefix='moe_ab_arms_')  # removed when the script exits
+    arms = [(name, source and stage_arm(overlay.name, name, source, config_file)) for name, source in sources.items()]
+
+    print('=' * 70)
+    print(f'  A/B/N MoE configs: {MODEL} ({config_file})')
+    for name, arm_dir in arms:
+        staged = f' (staged as {arm_dir})' if arm_dir and arm_dir != os.path.dirname(sources[name]) else ''
+        print(f'  {name:>16}: {sources[name] or "vLLM built-in defaults"}{staged}')
+    print('=' * 70)
+
+    llm, sampling_params = load_model()
+    switch = ConfigSwitch(lookup_args, config_file)
+    # Warmup: compile every arm's kernels before timing anything
     print('Warmup...')
-    llm.generate(['Hello'], sampling_params)
-    
-    # Benchmark
-    results = []
-    for i in range(3):  # 3 rounds
-        start = time.perf_counter()
-        outputs = llm.generate(prompts, sampling_params)
-        elapsed = time.perf_counter() - start
-        
-        total_tokens = sum(len(o.outputs[0].token_ids) for o in outputs)
-        tps = total_tokens / elapsed
-        results.append({'round': i+1, 'tokens': total_tokens, 'time_s': elapsed, 'tok_per_s': tps})
-        print(f'  Round {i+1}: {total_tokens} tokens in {elapsed:.2f}s = {tps:.1f} tok/s')
-    
-    avg_tps = sum(r['tok_per_s'] for r in results) / len(results)
-    print(f'  Average: {avg_tps:.1f} tok/s')
-    
-    # Cleanup GPU
-    del llm
-    import torch
-    torch.cuda.empty_cache()
-    import gc
-    gc.collect()
-    
-    return {'label': label, 'results': results, 'avg_tok_per_s': avg_tps}
+    for _, arm_dir in arms:
+        switch.use(arm_dir)
+        llm.generate(['Hello'], sampling_params, use_tqdm=False)
+
+    results = run_interleaved(llm, sampling_params, switch, arms, args.min_rounds, args.max_rounds)
+
+    baseline = arms[0][0]
+    base_samples = [r['tok_per_s'] for r in results[baseline]]
+    summary = []
+    print('\n' + '=' * 70)
+    print('SUMMARY')
+    print('=' * 70)
+    print(f'{"Arm":>16} | {"Median tok/s":>12} | {"95% CI":>13} | {"vs " + baseline:>24} | Verdict')
+    print('-' * 90)
+    for name, arm_dir in arms:
+        samples = [r['tok_per_s'] for r in results[name]]
+        stats = describe(samples)
+        comparison = bootstrap_diff(base_samples, samples) if name != baseline else None
+        if comparison is None:
+            versus, verdict = 'baseline', ''
+        else:
+            versus = f'{comparison["diff_pct"]:+.1f}% [{comparison["ci_low_pct"]:+.1f}, {comparison["ci_high_pct"]:+.1f}]'
+            verdict = ('faster' if comparison['diff_pct'] > 0 else 'slower') if comparison['significant'] else 'no significant difference'
+        print(f'{name:>16} | {stats["p50"]:>12.1f} | {stats["ci_low"]:>6.1f}-{stats["ci_high"]:<6.1f} | {versus:>24} | {verdict}')
+        summary.append({'arm': name, 'config_file': sources[name], 'rounds': results[name], 'stats': stats, 'vs_baseline': comparison})
+
+    os.makedirs('results', exist_ok=True)
+    with open('results/ab_moe_configs.json', 'w') as f:
+        json.dump({'model': MODEL, 'baseline': baseline, 'seed': SEED, 'arms': summary}, f, indent=2)
+    print('\nResults saved to results/ab_moe_configs.json')
 
 if __name__ == '__main__':
-    mode = sys.argv[1] if len(sys.argv) > 1 else 'both'
-    
-    if mode == 'without':
-        # Test A: Remove GB10 configs
-        backup_configs()
-        remove_configs()
-        print(f'GB10 configs: REMOVED ({len(os.listdir(BACKUP_DIR))} backed up)')
-        result_a = run_benchmark('Test A: Without GB10 Configs (Fallback)', PROMPTS)
-        restore_configs()
-        print(json.dumps(result_a, indent=2))
-    
-    elif mode == 'with':
-        # Test B: With GB10 configs
-        configs = get_gb10_configs()
-        print(f'GB10 configs: {len(configs)} present')
-        result_b = run_benchmark('Test B: With GB10 Configs', PROMPTS)
-        print(json.dumps(result_b, indent=2))
-    
-    elif mode == 'both':
-        # Full A/B test
-        # Test A first
-        backup_configs()
-        remove_configs()
-        print(f'GB10 configs: REMOVED for Test A')
-        result_a = run_benchmark('Test A: Without GB10 Configs (Fallback)', PROMPTS)
-        restore_configs()
-        
-        time.sleep(5)
-        
-        # Test B
-        configs = get_gb10_configs()
-        print(f'GB10 configs: {len(configs)} present for Test B')
-        result_b = run_benchmark('Test B: With GB10 Configs', PROMPTS)
-        
-        # Summary
-        print('\n' + '='*60)
-        print('SUMMARY')
-        print('='*60)
-        print(f'Test A (fallback): {result_a["avg_tok_per_s"]:.1f} tok/s')
-        print(f'Test B (GB10 cfg): {result_b["avg_tok_per_s"]:.1f} tok/s')
-        diff = result_b['avg_tok_per_s'] - result_a['avg_tok_per_s']
-        pct = (diff / result_a['avg_tok_per_s']) * 100
-        print(f'Difference: {diff:+.1f} tok/s ({pct:+.1f}%)')
-        
-        with open(os.path.expanduser('~/sm121-kernels/ab_results.json'), 'w') as f:
-            json.dump({'test_a': result_a, 'test_b': result_b, 'diff_pct': pct}, f, indent=2)
-        print(f'Results saved to ~/sm121-kernels/ab_results.json')
+    main()
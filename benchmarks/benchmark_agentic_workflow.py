@@ -1,13 +1,37 @@
 #!/usr/bin/env python3
-"""Test 2: Agentic Workflow Simulation — multi-turn tool calling with growing context"""
+"""Test 2: Agentic Workflow Simulation — multi-turn tool calling with growing context
+
+Each turn records how much of the prompt the radix cache served: cached
+tokens come from usage.prompt_tokens_details (sglang --enable-cache-report)
+or, failing that, from the /metrics counters (--enable-metrics). TTFT is
+also reported per 1k uncached ("new") prompt tokens.
+
+Prefix cache modes:
+  reuse    the conversation as is; each turn extends the last one's prompt (default)
+  perturb  a fresh nonce at the start of the system prompt on every turn,
+           so no turn can reuse the previous prefix
+  compare  run reuse, then replay the same conversation perturbed and
+           report the TTFT that prefix caching saved
+
+Usage:
+  python benchmark_agentic_workflow.py --prefix-cache compare
+"""
+import argparse
 import time
 import json
 import csv
 import os
+import urllib.request
+import uuid
 from openai import OpenAI
+from token_counting import STREAM_OPTIONS, StreamTokenCounter, load_tokenizer
 
-client = OpenAI(base_url="http://localhost:30000/v1", api_key="none")
+BASE_URL = os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1")
+client = OpenAI(base_url=BASE_URL, api_key="none")
 MODEL = "zai-org/GLM-4.7-FP8"
+TOKENIZER = load_tokenizer()  # optional: GLM_TOKENIZER=/path/to/model for prompt and per-chunk counts
+METRICS_URL = BASE_URL.rstrip("/").removesuffix("/v1") + "/metrics"
+CACHE_COUNTERS = ("sglang:prompt_tokens_total", "sglang:cached_tokens_total")
 
 tools = [
     {"type": "function", "function": {
@@ -154,23 +178,46 @@ TURNS = [
     {"user": "Great work! Now create a README.md documenting both scripts.", "tool_result": "File written successfully: README.md"},
 ]
 
-def estimate_tokens(messages):
-    """Rough token count estimate: ~1 token per 4 chars"""
-    total_chars = sum(len(json.dumps(m)) for m in messages)
+def estimate_tokens(messages, turn_tools=None):
+    """Prompt tokens before sending: chat template + tokenizer if loaded, else ~1 token per 4 chars"""
+    if TOKENIZER is not None:
+        try:
+            return len(TOKENIZER.apply_chat_template(messages, tools=turn_tools, tokenize=True, add_generation_prompt=True))
+        except Exception:
+            pass  # templates that want tool call arguments as dicts
+    total_chars = sum(len(json.dumps(m)) for m in messages) + (len(json.dumps(turn_tools)) if turn_tools else 0)
     return total_chars // 4
 
+def scrape_cache_counters():
+    """Server-wide prompt and cached token totals from sglang's /metrics, or None without --enable-metrics"""
+    try:
+        with urllib.request.urlopen(METRICS_URL, timeout=5) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    totals = {}
+    for line in text.splitlines():
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in CACHE_COUNTERS:
+            totals[name] = totals.get(name, 0.0) + float(line.rsplit(" ", 1)[1])
+    return totals if len(totals) == len(CACHE_COUNTERS) else None
+
+def perturb(messages):
+    """Copy of messages whose first message starts with a fresh nonce, so the cached prefix ends there"""
+    first = dict(messages[0], content=f"[session {uuid.uuid4().hex[:12]}] {messages[0]['content']}")
+    return [first] + messages[1:]
+
 def measure_turn(messages, expect_tool_call=True):
     """Measure a single turn with streaming"""
     t_start = time.perf_counter()
-    first_token_time = None
-    last_token_time = None
-    token_count = 0
+    counter = StreamTokenCounter(TOKENIZER)
     tool_calls_acc = {}
     content_acc = ""
     
     try:
         kwargs = dict(
-            model=MODEL, messages=messages, max_tokens=1024, stream=True, temperature=0.7,
+            model=MODEL, messages=messages, max_tokens=1024, stream=True,
+            stream_options=STREAM_OPTIONS, temperature=0.7,
         )
         if expect_tool_call:
             kwargs["tools"] = tools
@@ -179,19 +226,12 @@ def measure_turn(messages, expect_tool_call=True):
         stream = client.chat.completions.create(**kwargs)
         
         for chunk in stream:
-            now = time.perf_counter()
+            counter.add_chunk(time.perf_counter(), chunk)
             if chunk.choices and chunk.choices[0].delta:
                 delta = chunk.choices[0].delta
                 if delta.content:
-                    if first_token_time is None:
-                        first_token_time = now
-                    last_token_time = now
-                    token_count += 1
                     content_acc += delta.content
                 if delta.tool_calls:
-                    if first_token_time is None:
-                        first_token_time = now
-                    last_token_time = now
                     for tc in delta.tool_calls:
                         idx = tc.index
                         if idx not in tool_calls_acc:
@@ -200,39 +240,77 @@ def measure_turn(messages, expect_tool_call=True):
                             tool_calls_acc[idx]["name"] = tc.function.name
                         if tc.function.arguments:
                             tool_calls_acc[idx]["arguments"] += tc.function.arguments
-                        token_count += 1
-        
-        if first_token_time is None:
-            return {"ttft_ms": 0, "decode_toks": 0, "tool_ok": False, "tools": {}, "content": ""}
         
-        ttft_ms = (first_token_time - t_start) * 1000
-        if token_count > 1 and last_token_time > first_token_time:
-            decode_toks = (token_count - 1) / (last_token_time - first_token_time)
-        else:
-            decode_toks = 0
+        m = counter.summary(t_start)
+        if m is None:
+            return {"ttft_ms": 0, "decode_toks": 0, "output_tokens": 0, "prompt_tokens": None, "cached_tokens": None,
+                    "tool_ok": False, "tools": {}, "content": ""}
         
         tool_ok = len(tool_calls_acc) > 0 if expect_tool_call else True
         
         return {
-            "ttft_ms": round(ttft_ms, 1),
-            "decode_toks": round(decode_toks, 2),
+            "ttft_ms": round(m["ttft_ms"], 1),
+            "decode_toks": round(m["decode_toks"], 2),
+            "output_tokens": m["output_tokens"],
+            "prompt_tokens": m["prompt_tokens"],
+            "cached_tokens": m["cached_tokens"],
             "tool_ok": tool_ok,
             "tools": tool_calls_acc,
             "content": content_acc[:200],
         }
     except Exception as e:
         print(f"  ERROR: {e}")
-        return {"ttft_ms": 0, "decode_toks": 0, "tool_ok": False, "tools": {}, "content": str(e)}
+        return {"ttft_ms": 0, "decode_toks": 0, "output_tokens": 0, "prompt_tokens": None, "cached_tokens": None,
+                "tool_ok": False, "tools": {}, "content": str(e)}
 
-def main():
-    os.makedirs("results", exist_ok=True)
-    
-    print("=" * 90)
-    print("  Test 2: Agentic Workflow Simulation (10-turn multi-tool)")
-    print("=" * 90)
-    
+def measure_cached_turn(messages, expect_tool_call, approx_tokens):
+    """measure_turn plus the prompt split into cached and new tokens, from usage or /metrics"""
+    before = scrape_cache_counters()
+    result = measure_turn(messages, expect_tool_call=expect_tool_call)
+    cache_source = "usage" if result["cached_tokens"] is not None else None
+    if cache_source is None and before is not None:
+        after = scrape_cache_counters()
+        if after is not None:
+            result["cached_tokens"] = round(after[CACHE_COUNTERS[1]] - before[CACHE_COUNTERS[1]])
+            result["prompt_tokens"] = result["prompt_tokens"] or round(after[CACHE_COUNTERS[0]] - before[CACHE_COUNTERS[0]])
+            cache_source = "metrics"
+    prompt_tokens = result["prompt_tokens"] or approx_tokens
+    new_tokens = prompt_tokens - result["cached_tokens"] if cache_source else None
+    result.update({
+        "prompt_tokens": prompt_tokens,
+        "new_tokens": new_tokens,
+        "cache_source": cache_source,
+        "ttft_per_1k_new_ms": round(result["ttft_ms"] / new_tokens * 1000, 1) if new_tokens and result["ttft_ms"] else None,
+    })
+    return result
+
+def turn_row(prefix_cache, turn_num, approx_tokens, result):
+    return {
+        "prefix_cache": prefix_cache,
+        "turn": turn_num,
+        "approx_tokens": approx_tokens,
+        "prompt_tokens": result["prompt_tokens"],
+        "cached_tokens": result["cached_tokens"],
+        "new_tokens": result["new_tokens"],
+        "ttft_ms": result["ttft_ms"],
+        "ttft_per_1k_new_ms": result["ttft_per_1k_new_ms"],
+        "decode_toks": result["decode_toks"],
+        "output_tokens": result["output_tokens"],
+        "tool_ok": result["tool_ok"],
+        "cache_source": result["cache_source"],
+    }
+
+def print_cache_line(result):
+    icon = "✅" if result["tool_ok"] else "❌"
+    cache = f"cached {result['cached_tokens']}/{result['prompt_tokens']} [{result['cache_source']}]" \
+        if result["cache_source"] else "cached ? (start sglang with --enable-cache-report)"
+    print(f"  {icon} TTFT={result['ttft_ms']:.0f}ms, Decode={result['decode_toks']:.1f} tok/s, {cache}")
+
+def run_conversation(prefix_cache):
+    """Play TURNS live; return (result rows, messages sent on each turn)"""
     messages = [{"role": "system", "content": "You are a helpful coding assistant. Use the provided tools to accomplish tasks."}]
     results = []
+    sent = []
     
     for i, turn in enumerate(TURNS):
         turn_num = i + 1
@@ -240,12 +318,14 @@ def main():
         
         # Add user message
         messages.append({"role": "user", "content": turn["user"]})
-        approx_tokens = estimate_tokens(messages)
+        request_messages = perturb(messages) if prefix_cache == "perturb" else list(messages)
+        sent.append((request_messages, expect_tool))
+        approx_tokens = estimate_tokens(request_messages, tools if expect_tool else None)
         
         print(f"\n--- Turn {turn_num}: ~{approx_tokens} tokens ---")
         print(f"  User: {turn['user'][:80]}...")
         
-        result = measure_turn(messages, expect_tool_call=expect_tool)
+        result = measure_cached_turn(request_messages, expect_tool, approx_tokens)
         
         tool_str = ""
         if result["tools"]:
@@ -255,16 +335,8 @@ def main():
         elif result["content"]:
             print(f"  Response: {result['content'][:100]}...")
         
-        icon = "✅" if result["tool_ok"] else "❌"
-        print(f"  {icon} TTFT={result['ttft_ms']:.0f}ms, Decode={result['decode_toks']:.1f} tok/s")
-        
-        results.append({
-            "turn": turn_num,
-            "approx_tokens": approx_tokens,
-            "ttft_ms": result["ttft_ms"],
-            "decode_toks": result["decode_toks"],
-            "tool_ok": result["tool_ok"],
-        })
+        print_cache_line(result)
+        results.append(turn_row(prefix_cache, turn_num, approx_tokens, result))
         
         # Add assistant response to conversation
         if result["tools"]:
@@ -279,13 +351,64 @@ def main():
         else:
             messages.append({"role": "assistant", "content": result["content"]})
     
-    # Print summary
-    print("\n" + "=" * 90)
-    print(f"{'Turn':>5} | {'Tokens':>8} | {'TTFT (ms)':>10} | {'Decode tok/s':>13} | {'Tool OK':>8}")
-    print("-" * 60)
+    return results, sent
+
+def replay_perturbed(sent):
+    """Resend the prompts of a finished conversation with a perturbed prefix, so each turn misses the cache"""
+    results = []
+    for i, (request_messages, expect_tool) in enumerate(sent):
+        request_messages = perturb(request_messages)
+        approx_tokens = estimate_tokens(request_messages, tools if expect_tool else None)
+        print(f"\n--- Replay turn {i + 1} (perturbed): ~{approx_tokens} tokens ---")
+        result = measure_cached_turn(request_messages, expect_tool, approx_tokens)
+        print_cache_line(result)
+        results.append(turn_row("perturb", i + 1, approx_tokens, result))
+    return results
+
+def print_table(results):
+    print(f"{'Turn':>5} | {'Prompt':>7} | {'Cached':>7} | {'New':>7} | {'TTFT (ms)':>10} | {'ms/1k new':>9} | {'Decode tok/s':>13} | {'Tool OK':>8}")
+    print("-" * 90)
     for r in results:
         icon = "✅" if r["tool_ok"] else "❌"
-        print(f"{r['turn']:>5} | {r['approx_tokens']:>8} | {r['ttft_ms']:>10.1f} | {r['decode_toks']:>13.2f} | {icon:>8}")
+        cached = "?" if r["cached_tokens"] is None else r["cached_tokens"]
+        new = "?" if r["new_tokens"] is None else r["new_tokens"]
+        per_1k = "-" if r["ttft_per_1k_new_ms"] is None else f"{r['ttft_per_1k_new_ms']:.1f}"
+        print(f"{r['turn']:>5} | {r['prompt_tokens']:>7} | {cached:>7} | {new:>7} | {r['ttft_ms']:>10.1f} | {per_1k:>9} | {r['decode_toks']:>13.2f} | {icon:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prefix-cache", choices=["reuse", "perturb", "compare"], default="reuse")
+    args = parser.parse_args()
+    os.makedirs("results", exist_ok=True)
+    
+    print("=" * 90)
+    print("  Test 2: Agentic Workflow Simulation (10-turn multi-tool)")
+    print(f"  Prefix cache: {args.prefix_cache}")
+    print("=" * 90)
+    
+    results, sent = run_conversation("perturb" if args.prefix_cache == "perturb" else "reuse")
+    replayed = replay_perturbed(sent) if args.prefix_cache == "compare" else []
+    
+    # Print summary
+    print("\n" + "=" * 90)
+    if replayed:
+        print("  reuse")
+    print_table(results)
+    if replayed:
+        print("\n  perturb (same prompts, prefix cache defeated)")
+        print_table(replayed)
+        paired = [(r, p) for r, p in zip(results, replayed) if r["ttft_ms"] and p["ttft_ms"]]
+        ttft_reuse = sum(r["ttft_ms"] for r, _ in paired)
+        ttft_perturb = sum(p["ttft_ms"] for _, p in paired)
+        if ttft_perturb > 0:
+            print(f"\nPrefix caching saved {ttft_perturb - ttft_reuse:.0f} ms of TTFT over {len(paired)} turns "
+                  f"({(1 - ttft_reuse / ttft_perturb) * 100:.0f}%): {ttft_reuse:.0f} ms vs {ttft_perturb:.0f} ms")
+    known = [r for r in results if r["cache_source"]]
+    if known:
+        cached = sum(r["cached_tokens"] for r in known)
+        prompt = sum(r["prompt_tokens"] for r in known)
+        print(f"Cache hit rate ({results[0]['prefix_cache']}): {cached}/{prompt} prompt tokens ({cached / prompt * 100:.0f}%)")
+    results += replayed
     
     # Save
     csv_path = "results/test2_agentic_workflow.csv"
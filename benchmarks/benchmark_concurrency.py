@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Test 5: Concurrent Load — aggregate decode throughput vs number of in-flight requests
+
+Sweeps concurrency levels with an asyncio load generator and records
+per-request TTFT, inter-token latency (ITL) and end-to-end latency, with
+exact token counts (see token_counting.py). Two arrival models:
+  closed   N workers, each sends its next request as soon as the last one finished
+  poisson  open loop: requests arrive at --rate req/s (exponential gaps),
+           at most N in flight; queueing time counts towards TTFT and E2E
+
+Usage:
+  python benchmark_concurrency.py                                # closed loop, 1..32
+  python benchmark_concurrency.py --concurrency 1,4,16 --arrival poisson --rate 2
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+from openai import AsyncOpenAI
+from prompt_builder import PromptBuilder
+from sample_stats import describe, percentile
+from token_counting import STREAM_OPTIONS, StreamTokenCounter, load_tokenizer
+
+BASE_URL = os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1")
+MODEL = "zai-org/GLM-4.7-FP8"
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+REQUESTS_PER_WORKER = 4  # requests per level = max(MIN_REQUESTS, level × this)
+MIN_REQUESTS = 8
+PROMPT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = 128
+KNEE_GAIN = 1.10  # the knee is the first level whose next level adds <10% total tok/s
+SEED = 42
+TOKENIZER = load_tokenizer()  # optional: GLM_TOKENIZER=/path/to/model for exact prompt and per-chunk counts
+PROMPTS = PromptBuilder(TOKENIZER, seed=SEED)  # PROMPT_CACHE_MODE=unique (default) keeps requests off each other's cached prefix
+
+def build_prompts(n_requests):
+    """(one PROMPT_TOKENS chat prompt per request, whether all are exact), built before the level is timed"""
+    built = [PROMPTS.messages(PROMPT_TOKENS, "You are a helpful assistant. Continue the text naturally.",
+                              "Please continue writing naturally:") for _ in range(n_requests)]
+    return [messages for messages, _, _ in built], all(exact for _, _, exact in built)
+
+async def send_request(client, request_id, messages, t_arrival):
+    """Stream one completion; latencies are measured from t_arrival"""
+    counter = StreamTokenCounter(TOKENIZER)
+    try:
+        stream = await client.chat.completions.create(
+            model=MODEL, messages=messages, max_tokens=MAX_OUTPUT_TOKENS,
+            stream=True, stream_options=STREAM_OPTIONS, temperature=0.7,
+        )
+        async for chunk in stream:
+            counter.add_chunk(time.perf_counter(), chunk)
+    except Exception as e:
+        return {"id": request_id, "ok": False, "error": str(e)}
+    t_end = time.perf_counter()
+    m = counter.summary(t_arrival)
+    if m is None:
+        return {"id": request_id, "ok": False, "error": "no content"}
+    return {
+        "id": request_id,
+        "ok": True,
+        "tokens": m["output_tokens"],
+        "ttft_ms": m["ttft_ms"],
+        "itl_ms": m["itl_ms"],
+        "e2e_ms": (t_end - t_arrival) * 1000,
+        "decode_toks": m["decode_toks"],
+    }
+
+async def run_closed(client, concurrency, prompts):
+    next_id = iter(range(len(prompts)))
+    results = []
+
+    async def worker():
+        for request_id in next_id:
+            results.append(await send_request(client, request_id, prompts[request_id], time.perf_counter()))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+async def run_poisson(client, concurrency, prompts, rate, rng):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def arrival(request_id, t_arrival):
+        async with slots:
+            return await send_request(client, request_id, prompts[request_id], t_arrival)
+
+    tasks = []
+    for request_id in range(len(prompts)):
+        tasks.append(asyncio.create_task(arrival(request_id, time.perf_counter())))
+        await asyncio.sleep(rng.expovariate(rate))
+    return await asyncio.gather(*tasks)
+
+def summarize(concurrency, results, wall_s):
+    ok = [r for r in results if r["ok"]]
+    ttft = sorted(r["ttft_ms"] for r in ok)
+    itl = sorted(x for r in ok for x in r["itl_ms"])
+    e2e = sorted(r["e2e_ms"] for r in ok)
+    tokens = sum(r["tokens"] for r in ok)
+    per_request = sorted(r["decode_toks"] for r in ok if r["decode_toks"] > 0)
+    per_request_stats = describe(per_request)
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "failed": len(results) - len(ok),
+        "wall_s": round(wall_s, 2),
+        "total_toks": round(tokens / wall_s, 2) if wall_s > 0 else 0,
+        "req_per_s": round(len(ok) / wall_s, 3) if wall_s > 0 else 0,
+        "per_request_toks": round(percentile(per_request, 50), 2),
+        "ttft_p50_ms": round(percentile(ttft, 50), 1),
+        "ttft_p90_ms": round(percentile(ttft, 90), 1),
+        "ttft_p99_ms": round(percentile(ttft, 99), 1),
+        "itl_p50_ms": round(percentile(itl, 50), 1),
+        "itl_p90_ms": round(percentile(itl, 90), 1),
+        "itl_p99_ms": round(percentile(itl, 99), 1),
+        "e2e_p50_ms": round(percentile(e2e, 50), 1),
+        "e2e_p90_ms": round(percentile(e2e, 90), 1),
+        "e2e_p99_ms": round(percentile(e2e, 99), 1),
+        "per_request_toks_std": per_request_stats["std"] if per_request_stats else 0,
+        "stats": {
+            "ttft_ms": describe(ttft, 1),
+            "itl_ms": describe(itl, 1),
+            "e2e_ms": describe(e2e, 1),
+            "per_request_toks": per_request_stats,
+        },
+    }
+
+def find_knee(summaries):
+    """First concurrency level whose successor adds less than KNEE_GAIN total tok/s; None if never"""
+    for prev, cur in zip(summaries, summaries[1:]):
+        if prev["total_toks"] <= 0 or cur["total_toks"] / prev["total_toks"] < KNEE_GAIN:
+            return prev["concurrency"]
+    return None
+
+async def sweep(args):
+    client = AsyncOpenAI(base_url=args.base_url, api_key="none", max_retries=0, timeout=600)
+    rng = random.Random(SEED)
+    summaries, raw = [], []
+    for concurrency in args.concurrency:
+        n_requests = args.requests or max(MIN_REQUESTS, concurrency * REQUESTS_PER_WORKER)
+        print(f"\n--- Concurrency {concurrency}: {n_requests} requests ({args.arrival}) ---", flush=True)
+        prompts, exact = build_prompts(n_requests)
+        t_start = time.perf_counter()
+        if args.arrival == "closed":
+            results = await run_closed(client, concurrency, prompts)
+        else:
+            results = await run_poisson(client, concurrency, prompts, args.rate, rng)
+        summary = summarize(concurrency, results, time.perf_counter() - t_start)
+        summaries.append(summary)
+        raw.append({"concurrency": concurrency, "prompt_exact": exact, "requests": results})
+        for r in results:
+            if not r["ok"]:
+                print(f"  ERROR (request {r['id']}): {r['error']}")
+        print(f"  {summary['total_toks']:.1f} tok/s total, TTFT p50={summary['ttft_p50_ms']:.0f}ms, "
+              f"ITL p50={summary['itl_p50_ms']:.0f}ms, {summary['failed']} failed")
+    await client.close()
+    return summaries, raw
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=CONCURRENCY_LEVELS,
+                        help="comma-separated levels (default: %(default)s)")
+    parser.add_argument("--arrival", choices=["closed", "poisson"], default="closed")
+    parser.add_argument("--rate", type=float, default=1.0, help="poisson arrival rate in req/s")
+    parser.add_argument("--requests", type=int, default=None, help="requests per level (default: 4 per worker, min 8)")
+    parser.add_argument("--base-url", default=BASE_URL)
+    args = parser.parse_args()
+
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 110)
+    print("  Test 5: Concurrent Load — total tok/s vs concurrency")
+    print(f"  {args.arrival} arrival{f' at {args.rate} req/s' if args.arrival == 'poisson' else ''}, "
+          f"{'' if TOKENIZER else '~'}{PROMPT_TOKENS} prompt tokens ({PROMPTS.cache_mode} prefix-cache mode), "
+          f"{MAX_OUTPUT_TOKENS} max output tokens")
+    print("=" * 110)
+
+    summaries, raw = asyncio.run(sweep(args))
+    knee = find_knee(summaries)
+
+    print("\n" + "=" * 110)
+    print(f"{'Conc':>5} | {'Total tok/s':>11} | {'Req/s':>6} | {'Per-req tok/s':>13} | {'TTFT p50/p99 ms':>16} | "
+          f"{'ITL p50/p99 ms':>15} | {'E2E p50/p99 ms':>16} | {'Fail':>4}")
+    print("-" * 110)
+    for s in summaries:
+        marker = " ← knee" if s["concurrency"] == knee else ""
+        print(f"{s['concurrency']:>5} | {s['total_toks']:>11.1f} | {s['req_per_s']:>6.2f} | {s['per_request_toks']:>13.1f} | "
+              f"{s['ttft_p50_ms']:>7.0f}/{s['ttft_p99_ms']:<8.0f} | {s['itl_p50_ms']:>6.0f}/{s['itl_p99_ms']:<8.0f} | "
+              f"{s['e2e_p50_ms']:>7.0f}/{s['e2e_p99_ms']:<8.0f} | {s['failed']:>4}{marker}")
+    if knee is None:
+        print(f"\nKnee: not reached — total tok/s still grows >{(KNEE_GAIN - 1) * 100:.0f}% per level up to {summaries[-1]['concurrency']}")
+    else:
+        print(f"\nKnee: concurrency {knee} (the next level adds <{(KNEE_GAIN - 1) * 100:.0f}% total tok/s)")
+
+    csv_path = "results/test5_concurrency.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[k for k in summaries[0] if k != "stats"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(summaries)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/test5_concurrency.json", "w") as f:
+        json.dump({"arrival": args.arrival, "rate": args.rate if args.arrival == "poisson" else None,
+                   "prompt_tokens": PROMPT_TOKENS, "prompt_cache_mode": PROMPTS.cache_mode, "knee": knee, "levels": summaries, "requests": raw}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
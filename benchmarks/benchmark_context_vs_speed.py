@@ -3,68 +3,31 @@
 import time
 import json
 import csv
+import itertools
 import os
 import statistics
 from openai import OpenAI
+from bandwidth_model import ACTIVE_WEIGHTS_GB, BANDWIDTH_PER_NODE, TP, kv_cache_gb, theoretical_toks
+from prompt_builder import PromptBuilder
+from sample_stats import describe, percentile, repeat_until_tight
+from token_counting import STREAM_OPTIONS, StreamTokenCounter, load_tokenizer
 
-client = OpenAI(base_url="http://localhost:30000/v1", api_key="none")
+client = OpenAI(base_url=os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1"), api_key="none")
 MODEL = "zai-org/GLM-4.7-FP8"
 
-# Model config for theoretical calculation
-NUM_LAYERS = 92
-NUM_KV_HEADS = 8
-HEAD_DIM = 53  # 5120 / 96
-KV_DTYPE_BYTES = 2  # bf16
-ACTIVE_WEIGHTS_GB = 32  # ~32B active params × 1 byte FP8
-BANDWIDTH_PER_NODE = 273  # GB/s
-TP = 4
-# With TP=4, effective bandwidth for decode = TP * bandwidth (each node reads its shard in parallel)
-# But there's network overhead for all-reduce after each layer
-EFFECTIVE_BANDWIDTH = BANDWIDTH_PER_NODE * TP  # theoretical max = 1092 GB/s
-
 CONTEXT_LENGTHS = [512, 1024, 2048, 4096, 8192, 16384, 32768]
 MAX_OUTPUT_TOKENS = 128
-REPEATS = 3
-
-# Generate filler text (~1.3 chars per token for English, but let's use a known ratio)
-FILLER_BLOCK = "The quick brown fox jumps over the lazy dog. " * 20  # ~200 tokens worth
-
-def kv_cache_gb(context_len):
-    """Calculate KV cache size in GB for given context length"""
-    kv_bytes = 2 * NUM_LAYERS * NUM_KV_HEADS * HEAD_DIM * KV_DTYPE_BYTES * context_len
-    return kv_bytes / (1024**3)
-
-def theoretical_toks(context_len):
-    """Calculate theoretical tok/s using flash3's formula adapted for TP"""
-    kv = kv_cache_gb(context_len)
-    # Each node processes W/TP weights + KV/TP cache
-    # tok/s = bandwidth / ((W + KV) / TP)  = (bandwidth * TP) / (W + KV)
-    return EFFECTIVE_BANDWIDTH / (ACTIVE_WEIGHTS_GB + kv)
-
-def build_prompt(target_tokens):
-    """Build a prompt approximately target_tokens long"""
-    # Rough estimate: 1 token ≈ 4 chars for English
-    target_chars = target_tokens * 4
-    prompt = ""
-    while len(prompt) < target_chars:
-        prompt += FILLER_BLOCK
-    prompt = prompt[:target_chars]
-    return prompt
+# Repeats per context: 3 to 10, until the decode tok/s median is known to ±5% (sample_stats.py)
+TOKENIZER = load_tokenizer()  # optional: GLM_TOKENIZER=/path/to/model for exact prompt and per-chunk counts
+PROMPTS = PromptBuilder(TOKENIZER)  # PROMPT_CACHE_MODE=unique (default) defeats the prefix cache, shared exercises it
 
 def measure_streaming(context_len):
     """Send a streaming request and measure TTFT and decode tok/s"""
-    prompt = build_prompt(context_len)
     system_msg = "You are a helpful assistant. Continue the text naturally."
-    
-    messages = [
-        {"role": "system", "content": system_msg},
-        {"role": "user", "content": prompt + "\n\nPlease continue writing naturally:"}
-    ]
+    messages, prompt_tokens, exact = PROMPTS.messages(context_len, system_msg, "Please continue writing naturally:")
     
     t_start = time.perf_counter()
-    first_token_time = None
-    last_token_time = None
-    token_count = 0
+    counter = StreamTokenCounter(TOKENIZER)
     
     try:
         stream = client.chat.completions.create(
@@ -72,30 +35,20 @@ def measure_streaming(context_len):
             messages=messages,
             max_tokens=MAX_OUTPUT_TOKENS,
             stream=True,
+            stream_options=STREAM_OPTIONS,
             temperature=0.7,
         )
         
         for chunk in stream:
-            now = time.perf_counter()
-            if chunk.choices and chunk.choices[0].delta.content:
-                if first_token_time is None:
-                    first_token_time = now
-                last_token_time = now
-                token_count += 1  # approximate: 1 chunk ≈ 1 token for streaming
+            counter.add_chunk(time.perf_counter(), chunk)
         
-        if first_token_time is None:
-            return None, None, 0
-            
-        ttft_ms = (first_token_time - t_start) * 1000
-        if token_count > 1 and last_token_time > first_token_time:
-            decode_toks = (token_count - 1) / (last_token_time - first_token_time)
-        else:
-            decode_toks = 0
-            
-        return ttft_ms, decode_toks, token_count
+        m = counter.summary(t_start)
+        if m is not None:
+            m["built_prompt_tokens"], m["prompt_exact"] = prompt_tokens, exact
+        return m
     except Exception as e:
         print(f"  ERROR: {e}")
-        return None, None, 0
+        return None
 
 def main():
     os.makedirs("results", exist_ok=True)
@@ -104,6 +57,8 @@ def main():
     print("  Test 1: Context Length vs Decode Speed")
     print("  Formula: tok/s = β×TP / (W + KV)")
     print(f"  β={BANDWIDTH_PER_NODE} GB/s, TP={TP}, W={ACTIVE_WEIGHTS_GB} GB")
+    print(f"  Prompts: {'exact token counts' if TOKENIZER else '~4 chars/token (set GLM_TOKENIZER for exact counts)'}, "
+          f"{PROMPTS.cache_mode} prefix-cache mode")
     print("=" * 90)
     
     results = []
@@ -114,18 +69,30 @@ def main():
         
         print(f"\n--- Context: {ctx_len} tokens (KV={kv:.2f} GB, Theoretical={theo:.1f} tok/s) ---")
         
-        ttfts = []
-        decode_rates = []
+        rounds = itertools.count(1)
         
-        for r in range(REPEATS):
-            print(f"  Round {r+1}/{REPEATS}...", end=" ", flush=True)
-            ttft, decode, tokens = measure_streaming(ctx_len)
-            if ttft is not None:
-                ttfts.append(ttft)
-                decode_rates.append(decode)
-                print(f"TTFT={ttft:.0f}ms, Decode={decode:.1f} tok/s ({tokens} tokens)")
-            else:
+        def measure_round():
+            print(f"  Round {next(rounds)}...", end=" ", flush=True)
+            m = measure_streaming(ctx_len)
+            if m is None:
                 print("FAILED")
+                return None
+            estimated = m["prompt_tokens"] is None and not m["prompt_exact"]
+            m["prompt_tokens"] = m["prompt_tokens"] or m["built_prompt_tokens"]
+            print(f"TTFT={m['ttft_ms']:.0f}ms, Decode={m['decode_toks']:.1f} tok/s "
+                  f"({m['output_tokens']} tokens [{m['token_source']}] in {m['chunks']} chunks, "
+                  f"prompt={m['prompt_tokens']}{' est.' if estimated else ''})")
+            return m
+        
+        rounds_ok = repeat_until_tight(measure_round, key=lambda m: m["decode_toks"])
+        ttfts = [m["ttft_ms"] for m in rounds_ok]
+        decode_rates = [m["decode_toks"] for m in rounds_ok]
+        itls = [x for m in rounds_ok for x in m["itl_ms"]]  # per-token inter-token latencies, pooled over rounds
+        tokens_per_chunk = [m["tokens_per_chunk"] for m in rounds_ok]
+        token_source = rounds_ok[-1]["token_source"] if rounds_ok else None
+        prompt_tokens = [m["prompt_tokens"] for m in rounds_ok]
+        cached_tokens = [m["cached_tokens"] for m in rounds_ok if m["cached_tokens"] is not None]
+        decode_stats = describe(decode_rates)
         
         if ttfts:
             med_ttft = statistics.median(ttfts)
@@ -141,19 +108,37 @@ def main():
             "decode_toks": round(med_decode, 2),
             "theoretical_toks": round(theo, 2),
             "ratio": round(med_decode / theo, 2) if theo > 0 and med_decode > 0 else 0,
+            "itl_p50_ms": round(percentile(sorted(itls), 50), 1),
+            "itl_p99_ms": round(percentile(sorted(itls), 99), 1),
+            "tokens_per_chunk": round(statistics.median(tokens_per_chunk), 2) if tokens_per_chunk else 0,
+            "token_source": token_source,
+            "prompt_tokens": round(statistics.median(prompt_tokens)) if prompt_tokens else 0,
+            "cached_tokens": round(statistics.median(cached_tokens)) if cached_tokens else None,
+            "prompt_cache_mode": PROMPTS.cache_mode,
+            "repeats": len(rounds_ok),
+            "decode_std": decode_stats["std"] if decode_stats else 0,
+            "decode_ci_low": decode_stats["ci_low"] if decode_stats else 0,
+            "decode_ci_high": decode_stats["ci_high"] if decode_stats else 0,
+            "stats": {
+                "decode_toks": decode_stats,
+                "ttft_ms": describe(ttfts, 1),
+                "itl_ms": describe(itls, 1),
+            },
         })
     
     # Print summary
-    print("\n" + "=" * 90)
-    print(f"{'Context':>8} | {'KV (GB)':>8} | {'TTFT (ms)':>10} | {'Decode tok/s':>13} | {'Theory tok/s':>13} | {'Ratio':>6}")
-    print("-" * 90)
+    print("\n" + "=" * 128)
+    print(f"{'Context':>8} | {'KV (GB)':>8} | {'TTFT (ms)':>10} | {'Decode tok/s':>13} | {'95% CI':>15} | {'Theory tok/s':>13} | {'Ratio':>6} | {'ITL p50/p99':>12} | {'Tok/chunk':>9} | {'N':>3}")
+    print("-" * 128)
     for r in results:
-        print(f"{r['context_length']:>8} | {r['kv_cache_gb']:>8.3f} | {r['ttft_ms']:>10.1f} | {r['decode_toks']:>13.2f} | {r['theoretical_toks']:>13.2f} | {r['ratio']:>6.2f}")
+        itl = f"{r['itl_p50_ms']:.0f}/{r['itl_p99_ms']:.0f}"
+        ci = f"{r['decode_ci_low']:.2f}-{r['decode_ci_high']:.2f}"
+        print(f"{r['context_length']:>8} | {r['kv_cache_gb']:>8.3f} | {r['ttft_ms']:>10.1f} | {r['decode_toks']:>13.2f} | {ci:>15} | {r['theoretical_toks']:>13.2f} | {r['ratio']:>6.2f} | {itl:>12} | {r['tokens_per_chunk']:>9.2f} | {r['repeats']:>3}")
     
-    # Save CSV
+    # Save CSV (raw samples and full stats go to the JSON)
     csv_path = "results/test1_context_vs_speed.csv"
     with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer = csv.DictWriter(f, fieldnames=[k for k in results[0] if k != "stats"], extrasaction="ignore")
         writer.writeheader()
         writer.writerows(results)
     print(f"\nSaved to {csv_path}")
@@ -3,109 +3,125 @@
 import time
 import json
 import csv
+import itertools
 import os
 import statistics
 from openai import OpenAI
+from prompt_builder import PromptBuilder
+from sample_stats import bootstrap_diff, describe, percentile, repeat_until_tight
+from token_counting import STREAM_OPTIONS, StreamTokenCounter, load_tokenizer
 
-client = OpenAI(base_url="http://localhost:30000/v1", api_key="none")
+client = OpenAI(base_url=os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1"), api_key="none")
 MODEL = "zai-org/GLM-4.7-FP8"
 
 CONTEXT_LENGTHS = [1024, 4096, 16384, 32768]
 MAX_OUTPUT_TOKENS = 128
-REPEATS = 3
-
-FILLER_BLOCK = "The quick brown fox jumps over the lazy dog. " * 20
-
-def build_prompt(target_tokens):
-    target_chars = target_tokens * 4
-    prompt = ""
-    while len(prompt) < target_chars:
-        prompt += FILLER_BLOCK
-    return prompt[:target_chars]
+# Repeats per context: 3 to 10, until the decode tok/s median is known to ±5% (sample_stats.py)
+TOKENIZER = load_tokenizer()  # optional: GLM_TOKENIZER=/path/to/model for exact prompt and per-chunk counts
+PROMPTS = PromptBuilder(TOKENIZER)  # PROMPT_CACHE_MODE=unique (default) defeats the prefix cache, shared exercises it
 
 def measure_streaming(context_len):
-    prompt = build_prompt(context_len)
-    messages = [
-        {"role": "system", "content": "You are a helpful assistant. Continue the text naturally."},
-        {"role": "user", "content": prompt + "\n\nPlease continue writing naturally:"}
-    ]
+    messages, _, _ = PROMPTS.messages(
+        context_len, "You are a helpful assistant. Continue the text naturally.", "Please continue writing naturally:"
+    )
     t_start = time.perf_counter()
-    first_token_time = None
-    last_token_time = None
-    token_count = 0
+    counter = StreamTokenCounter(TOKENIZER)
     try:
         stream = client.chat.completions.create(
             model=MODEL, messages=messages, max_tokens=MAX_OUTPUT_TOKENS,
-            stream=True, temperature=0.7,
+            stream=True, stream_options=STREAM_OPTIONS, temperature=0.7,
         )
         for chunk in stream:
-            now = time.perf_counter()
-            if chunk.choices and chunk.choices[0].delta.content:
-                if first_token_time is None:
-                    first_token_time = now
-                last_token_time = now
-                token_count += 1
-        if first_token_time is None:
-            return None, None, 0
-        ttft_ms = (first_token_time - t_start) * 1000
-        if token_count > 1 and last_token_time > first_token_time:
-            decode_toks = (token_count - 1) / (last_token_time - first_token_time)
-        else:
-            decode_toks = 0
-        return ttft_ms, decode_toks, token_count
+            counter.add_chunk(time.perf_counter(), chunk)
+        return counter.summary(t_start)
     except Exception as e:
         print(f"  ERROR: {e}")
-        return None, None, 0
+        return None
 
 def main():
     os.makedirs("results", exist_ok=True)
     print("=" * 70)
     print("  Test 3: EAGLE OFF — Decode Speed Baseline")
+    print(f"  Prompts: {'exact token counts' if TOKENIZER else '~4 chars/token'}, {PROMPTS.cache_mode} prefix-cache mode")
     print("=" * 70)
     results = []
     for ctx_len in CONTEXT_LENGTHS:
         print(f"\n--- Context: {ctx_len} tokens ---")
-        ttfts = []
-        decode_rates = []
-        for r in range(REPEATS):
-            print(f"  Round {r+1}/{REPEATS}...", end=" ", flush=True)
-            ttft, decode, tokens = measure_streaming(ctx_len)
-            if ttft is not None:
-                ttfts.append(ttft)
-                decode_rates.append(decode)
-                print(f"TTFT={ttft:.0f}ms, Decode={decode:.1f} tok/s ({tokens} tokens)")
-            else:
+        rounds = itertools.count(1)
+        
+        def measure_round():
+            print(f"  Round {next(rounds)}...", end=" ", flush=True)
+            m = measure_streaming(ctx_len)
+            if m is None:
                 print("FAILED")
+                return None
+            print(f"TTFT={m['ttft_ms']:.0f}ms, Decode={m['decode_toks']:.1f} tok/s "
+                  f"({m['output_tokens']} tokens [{m['token_source']}] in {m['chunks']} chunks)")
+            return m
+        
+        rounds_ok = repeat_until_tight(measure_round, key=lambda m: m["decode_toks"])
+        ttfts = [m["ttft_ms"] for m in rounds_ok]
+        decode_rates = [m["decode_toks"] for m in rounds_ok]
+        itls = [x for m in rounds_ok for x in m["itl_ms"]]
+        tokens_per_chunk = [m["tokens_per_chunk"] for m in rounds_ok]
+        prompt_tokens = [m["prompt_tokens"] for m in rounds_ok if m["prompt_tokens"] is not None]
         med_ttft = statistics.median(ttfts) if ttfts else 0
         med_decode = statistics.median(decode_rates) if decode_rates else 0
         results.append({
             "context_length": ctx_len,
             "ttft_ms": round(med_ttft, 1),
             "eagle_off_toks": round(med_decode, 2),
+            "eagle_off_itl_p50_ms": round(percentile(sorted(itls), 50), 1),
+            "eagle_off_tokens_per_chunk": round(statistics.median(tokens_per_chunk), 2) if tokens_per_chunk else 0,
+            "prompt_tokens": round(statistics.median(prompt_tokens)) if prompt_tokens else None,
+            "repeats": len(rounds_ok),
+            "stats": {
+                "eagle_off_toks": describe(decode_rates),
+                "ttft_ms": describe(ttfts, 1),
+                "itl_ms": describe(itls, 1),
+            },
         })
     
     # Load EAGLE ON results from Test 1
     eagle_on = {}
+    eagle_on_samples = {}  # raw Test 1 decode rates, for a CI on the speedup
+    eagle_on_chunk_counted = False
     try:
         with open("results/test1_context_vs_speed.json") as f:
             for r in json.load(f):
                 eagle_on[r["context_length"]] = r["decode_toks"]
+                eagle_on_samples[r["context_length"]] = ((r.get("stats") or {}).get("decode_toks") or {}).get("samples")
+                eagle_on_chunk_counted |= r.get("token_source", "chunks") == "chunks"
     except:
         pass
+    if eagle_on_chunk_counted:
+        print("\n  WARNING: Test 1 results count 1 token per chunk (EAGLE sends several per chunk);")
+        print("  re-run benchmark_context_vs_speed.py for a like-for-like speedup.")
     
     print("\n" + "=" * 70)
-    print(f"{'Context':>8} | {'EAGLE OFF':>12} | {'EAGLE ON':>12} | {'Speedup':>8}")
-    print("-" * 50)
+    print(f"{'Context':>8} | {'EAGLE OFF':>12} | {'EAGLE ON':>12} | {'Speedup':>8} | {'95% CI':>13}")
+    print("-" * 66)
     for r in results:
         on = eagle_on.get(r["context_length"], 0)
         speedup = on / r["eagle_off_toks"] if r["eagle_off_toks"] > 0 else 0
         r["eagle_on_toks"] = on
         r["speedup"] = round(speedup, 2)
-        print(f"{r['context_length']:>8} | {r['eagle_off_toks']:>10.2f} | {on:>10.2f} | {speedup:>7.2f}x")
+        off_samples = (r["stats"]["eagle_off_toks"] or {}).get("samples")
+        on_samples = eagle_on_samples.get(r["context_length"])
+        ci = "-"
+        if off_samples and on_samples:
+            diff = bootstrap_diff(off_samples, on_samples)
+            r["speedup_ci_low"] = round(1 + diff["ci_low_pct"] / 100, 2)
+            r["speedup_ci_high"] = round(1 + diff["ci_high_pct"] / 100, 2)
+            r["stats"]["speedup"] = diff
+            ci = f"{r['speedup_ci_low']:.2f}-{r['speedup_ci_high']:.2f}x"
+        print(f"{r['context_length']:>8} | {r['eagle_off_toks']:>10.2f} | {on:>10.2f} | {speedup:>7.2f}x | {ci:>13}")
     
     csv_path = "results/test3_eagle_efficiency.csv"
     with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["context_length", "ttft_ms", "eagle_off_toks", "eagle_on_toks", "speedup"])
+        writer = csv.DictWriter(f, fieldnames=["context_length", "ttft_ms", "eagle_off_toks", "eagle_off_itl_p50_ms",
+                                               "eagle_off_tokens_per_chunk", "prompt_tokens", "repeats", "eagle_on_toks", "speedup",
+                                               "speedup_ci_low", "speedup_ci_high"], extrasaction="ignore")
         writer.writeheader()
         writer.writerows(results)
     print(f"\nSaved to {csv_path}")
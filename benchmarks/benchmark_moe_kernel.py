@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Kernel Test: fused MoE Triton kernel per batch size, config file vs SGLang defaults
+
+Evaluating a config file with benchmark_ab.py costs a model load and ~244 s
+of generation per round. This times only SGLang's fused_moe_kernel, the up
+(w13) and down (w2) GEMMs of one GLM-4.7-FP8 MoE layer at TP=4, for every
+batch-size key of the file, with random fp8 weights and routing. Each
+sample is one CUDA graph replay of ITERS_PER_SAMPLE layers; samples repeat
+until the median is known to ±5% (sample_stats.py). The baseline is the
+config SGLang uses without a file (or --baseline FILE).
+
+--dry-run needs neither torch nor a GPU: it checks every entry the kernel
+would use (keys, power-of-two blocks, warps, stages, matching up/down
+BLOCK_SIZE_M, grid size, shared memory of the file's device) and exits
+non-zero on problems.
+
+USE_TMA entries of _down.json files are ignored: the non-TMA path is timed.
+
+Usage:
+  python benchmark_moe_kernel.py --dry-run                # check configs/triton_<installed triton>
+  python benchmark_moe_kernel.py                          # time it against the SGLang defaults
+  python benchmark_moe_kernel.py /tmp/variant/E=160,...json --baseline ../configs/triton_3_5_0/E=160,...json
+  python benchmark_moe_kernel.py --batch-sizes 1,64,4096
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from moe_config import (BATCH_SIZES, CONFIG_FILE, GEMM_SHAPES, HIDDEN, INTERMEDIATE, NUM_EXPERTS, TOP_K,
+                        DEFAULT_DEVICE, DEVICE_PROFILES, check_pair, default_config, default_config_dir, grid_size,
+                        load_pair, nearest, parse_name)
+from sample_stats import bootstrap_diff, describe, repeat_until_tight
+
+ITERS_PER_SAMPLE = 10  # layers captured per CUDA graph
+WARMUP_REPLAYS = 3
+SEED = 0
+
+def config_label(config):
+    return (f"{config['BLOCK_SIZE_M']}x{config['BLOCK_SIZE_N']}x{config['BLOCK_SIZE_K']} "
+            f"g{config['GROUP_SIZE_M']} w{config['num_warps']} s{config['num_stages']}")
+
+def dry_run(path, up, down, batch_sizes):
+    info = parse_name(path)
+    device = info["device_name"] if info["device_name"] in DEVICE_PROFILES else DEFAULT_DEVICE
+    report = check_pair(up, down, batch_sizes, device, info["dtype"])
+    print("=" * 110)
+    print(f"  Kernel Test (dry run): {path}")
+    print(f"  device profile: {device}")
+    print(f"  {'with its _down.json' if down else 'no _down.json: the up entries are used for both GEMMs'}")
+    print("=" * 110)
+    print(f"{'M':>5} | {'Up':<24} | {'Down':<24} | {'Programs up/down':>16} | Status")
+    print("-" * 110)
+    for m, problems in report.items():
+        up_config, down_config = nearest(up, m), nearest(down or up, m)
+        try:
+            labels = f"{config_label(up_config):<24} | {config_label(down_config):<24}"
+            programs = f"{grid_size(up_config, m, 'up')}/{grid_size(down_config, m, 'down')}"
+        except (KeyError, TypeError, ZeroDivisionError):
+            labels, programs = f"{'-':<24} | {'-':<24}", "-"
+        status = "✅" if not problems else "❌ " + "; ".join(problems)
+        print(f"{m:>5} | {labels} | {programs:>16} | {status}")
+    failed = sum(1 for problems in report.values() if problems)
+    print(f"\n{len(report) - failed}/{len(report)} batch sizes OK")
+    return failed == 0
+
+class MoeKernel:
+    """One MoE layer's two fused_moe_kernel launches on random fp8 weights (SGLang 0.5.4 kernel API)"""
+
+    def __init__(self):
+        import torch
+        import triton.language as tl
+        try:
+            from sglang.srt.layers.moe.fused_moe_triton.fused_moe_triton_kernels import invoke_fused_moe_kernel
+        except ImportError:  # SGLang < 0.5.3 keeps it next to fused_experts
+            from sglang.srt.layers.moe.fused_moe_triton.fused_moe import invoke_fused_moe_kernel
+        from sglang.srt.layers.moe.fused_moe_triton.moe_align_block_size import moe_align_block_size
+        self.torch, self.invoke, self.align = torch, invoke_fused_moe_kernel, moe_align_block_size
+        self.compute_type = tl.bfloat16
+        torch.manual_seed(SEED)
+        up_n, up_k = GEMM_SHAPES["up"]
+        down_n, down_k = GEMM_SHAPES["down"]
+        self.w1 = torch.randn(NUM_EXPERTS, up_n, up_k, device="cuda").to(torch.float8_e4m3fn)
+        self.w2 = torch.randn(NUM_EXPERTS, down_n, down_k, device="cuda").to(torch.float8_e4m3fn)
+        self.w1_scale = torch.rand(NUM_EXPERTS, device="cuda", dtype=torch.float32)
+        self.w2_scale = torch.rand(NUM_EXPERTS, device="cuda", dtype=torch.float32)
+
+    def inputs(self, m):
+        torch = self.torch
+        scores = torch.randn(m, NUM_EXPERTS, device="cuda")
+        topk_weights, topk_ids = torch.topk(torch.softmax(scores, dim=-1), TOP_K, dim=-1)
+        return {
+            "hidden": torch.randn(m, HIDDEN, device="cuda", dtype=torch.bfloat16),
+            "activated": torch.randn(m * TOP_K, INTERMEDIATE, device="cuda", dtype=torch.bfloat16),
+            "up_out": torch.empty(m * TOP_K, 2 * INTERMEDIATE, device="cuda", dtype=torch.bfloat16),
+            "down_out": torch.empty(m, TOP_K, HIDDEN, device="cuda", dtype=torch.bfloat16),
+            "topk_weights": topk_weights.contiguous(),
+            "topk_ids": topk_ids.to(torch.int32).contiguous(),
+        }
+
+    def launch(self, x, up_config, down_config, aligned):
+        """Both GEMMs; a None config skips that GEMM"""
+        sorted_ids, expert_ids, padded = aligned
+        for a, w, scale, out, mul_routed_weight, top_k, config in (
+            (x["hidden"], self.w1, self.w1_scale, x["up_out"], False, TOP_K, up_config),
+            (x["activated"], self.w2, self.w2_scale, x["down_out"], True, 1, down_config),
+        ):
+            if config is None:
+                continue
+            self.invoke(a, w, None, out, None, scale, None, x["topk_weights"], x["topk_ids"],
+                        sorted_ids, expert_ids, padded, mul_routed_weight, top_k, config,
+                        compute_type=self.compute_type, use_fp8_w8a8=True, use_int8_w8a8=False,
+                        use_int8_w8a16=False, use_int4_w4a16=False, per_channel_quant=False)
+
+    def time_us(self, m, up_config, down_config):
+        """Samples of µs per layer (or per GEMM if one config is None); raises if a config does not compile/launch"""
+        torch = self.torch
+        up_config, down_config = ({k: v for k, v in config.items() if k != "USE_TMA"} if config else None
+                                  for config in (up_config, down_config))
+        x = self.inputs(m)
+        aligned = self.align(x["topk_ids"], (up_config or down_config)["BLOCK_SIZE_M"], NUM_EXPERTS)
+        self.launch(x, up_config, down_config, aligned)  # compile outside the graph
+        torch.cuda.synchronize()
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            for _ in range(ITERS_PER_SAMPLE):
+                self.launch(x, up_config, down_config, aligned)
+        for _ in range(WARMUP_REPLAYS):
+            graph.replay()
+        start, end = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+
+        def measure():
+            start.record()
+            graph.replay()
+            end.record()
+            end.synchronize()
+            return start.elapsed_time(end) * 1000 / ITERS_PER_SAMPLE
+
+        samples = repeat_until_tight(measure, key=lambda us: us)
+        del graph
+        return samples
+
+def time_arm(kernel, m, table):
+    """(samples, error) for one batch size; table None means the SGLang defaults"""
+    up, down = table if table else (None, None)
+    up_config = nearest(up, m) if up else default_config(m)
+    down_config = nearest(down or up, m) if up else up_config
+    try:
+        return kernel.time_us(m, up_config, down_config), None
+    except Exception as e:  # OutOfResources and friends: report, keep going
+        return None, f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", nargs="?", default=None,
+                        help=f"up-projection config file; its _down.json is used too (default: configs/triton_<installed>/{CONFIG_FILE})")
+    parser.add_argument("--baseline", default=None, help="config file to compare against (default: SGLang's built-in defaults)")
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=None,
+                        help="comma-separated M values (default: every key in the file)")
+    parser.add_argument("--dry-run", action="store_true", help="check launch parameters only, no torch/GPU needed")
+    args = parser.parse_args()
+    path = os.path.abspath(args.config or os.path.join(default_config_dir(), CONFIG_FILE))
+    up, down = load_pair(path)
+    batch_sizes = args.batch_sizes or sorted(set(up) | set(BATCH_SIZES))
+
+    if args.dry_run:
+        sys.exit(0 if dry_run(path, up, down, batch_sizes) else 1)
+
+    baseline = load_pair(os.path.abspath(args.baseline)) if args.baseline else None
+    baseline_name = os.path.basename(os.path.dirname(os.path.abspath(args.baseline))) if args.baseline else "SGLang default"
+    kernel = MoeKernel()
+
+    print("=" * 100)
+    print(f"  Kernel Test: fused MoE, E={NUM_EXPERTS} N={INTERMEDIATE} hidden={HIDDEN} top-{TOP_K}, fp8_w8a8")
+    print(f"  config:   {path}{'' if down else ' (no _down.json)'}")
+    print(f"  baseline: {os.path.abspath(args.baseline) if args.baseline else 'SGLang get_default_config()'}")
+    print("=" * 100)
+
+    rows = []
+    for m in batch_sizes:
+        tuned, tuned_error = time_arm(kernel, m, (up, down))
+        base, base_error = time_arm(kernel, m, baseline)
+        row = {"m": m, "config": config_label(nearest(up, m)),
+               "tuned_us": describe(tuned)["p50"] if tuned else None,
+               "baseline_us": describe(base)["p50"] if base else None,
+               "speedup": None, "significant": None,
+               "tuned_error": tuned_error, "baseline_error": base_error}
+        if tuned and base:
+            comparison = bootstrap_diff(base, tuned)
+            row["speedup"] = round(row["baseline_us"] / row["tuned_us"], 3)
+            row["significant"] = comparison["significant"]
+        row["stats"] = {"tuned_us": describe(tuned), "baseline_us": describe(base)}
+        rows.append(row)
+        tuned_text = tuned_error or f"{row['tuned_us']:.1f} µs"
+        base_text = base_error or f"{row['baseline_us']:.1f} µs"
+        print(f"  M={m:<5} {tuned_text} vs {base_text}", flush=True)
+
+    print("\n" + "=" * 100)
+    print(f"{'M':>5} | {'Config (up)':<24} | {'Tuned µs':>9} | {baseline_name[:14] + ' µs':>17} | {'Speedup':>7} | Note")
+    print("-" * 100)
+    for r in rows:
+        tuned = f"{r['tuned_us']:.1f}" if r["tuned_us"] is not None else "fail"
+        base = f"{r['baseline_us']:.1f}" if r["baseline_us"] is not None else "fail"
+        speedup = f"{r['speedup']:.2f}x" if r["speedup"] is not None else "-"
+        note = ("❌ " + r["tuned_error"] if r["tuned_error"] else
+                "baseline fails: " + r["baseline_error"] if r["baseline_error"] else
+                ("faster" if r["speedup"] > 1 else "slower") if r["significant"] else "no significant difference")
+        print(f"{r['m']:>5} | {r['config']:<24} | {tuned:>9} | {base:>17} | {speedup:>7} | {note}")
+
+    os.makedirs("results", exist_ok=True)
+    csv_path = "results/moe_kernel.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[k for k in rows[0] if k != "stats"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    with open("results/moe_kernel.json", "w") as f:
+        json.dump({"config": path, "baseline": os.path.abspath(args.baseline) if args.baseline else None,
+                   "iters_per_sample": ITERS_PER_SAMPLE, "batch_sizes": rows}, f, indent=2)
+    print(f"\nResults saved to {csv_path} and results/moe_kernel.json")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 multi-stream throughput — baseline detector per request (before) vs Glm47BatchParser.feed_many (after)"""
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47BatchParser, Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import DELTA_CHARS, chunks, code_of, default_tools, load_baseline  # noqa: E402
+
+tools = default_tools("write_file", "run_command")
+
+STREAM_COUNTS = [1, 64, 512]  # concurrent agent sessions
+REPEATS = 3
+
+# Agent turns: a sentence of reasoning, then one or two tool calls
+RESPONSES = [
+    "I'll write the helper first.\n<tool_call>write_file<arg_key>path</arg_key><arg_value>src/check.py</arg_value>"
+    f"<arg_key>content</arg_key><arg_value>{code_of(640)}</arg_value></tool_call>",
+    "Now run the tests.\n<tool_call>run_command<arg_key>command</arg_key><arg_value>pytest -q tests/</arg_value>"
+    "<arg_key>timeout</arg_key><arg_value>120</arg_value></tool_call>",
+    "Two steps: save, then check.\n<tool_call>write_file<arg_key>path</arg_key><arg_value>a.py</arg_value>"
+    f"<arg_key>content</arg_key><arg_value>{code_of(240)}</arg_value></tool_call>"
+    "<tool_call>run_command<arg_key>command</arg_key><arg_value>python a.py</arg_value></tool_call>",
+    "The comparison `a < b` is already correct, so no change is needed here. " * 4,
+]
+
+def build_streams(n_streams):
+    """Per-stream delta lists, staggered so streams do not finish in lock-step"""
+    streams = []
+    for sid in range(n_streams):
+        text = RESPONSES[sid % len(RESPONSES)] * (1 + sid % 3)
+        streams.append(chunks(text))
+    return streams
+
+def rounds(streams):
+    """Yield one list of (stream_id, delta) per decode step, as a scheduler would hand them out"""
+    longest = max(len(s) for s in streams)
+    for step in range(longest):
+        yield [(sid, deltas[step]) for sid, deltas in enumerate(streams) if step < len(deltas)]
+
+def detector_runner(detector_cls):
+    """One detector per stream, created on its first delta, as the server does per request"""
+    def run(streams, record=None):
+        detectors = {}
+        for batch in rounds(streams):
+            for sid, delta in batch:
+                detector = detectors.get(sid)
+                if detector is None:
+                    detector = detectors[sid] = detector_cls()
+                result = detector.parse_streaming_increment(delta, tools)
+                if record is not None:
+                    record.setdefault(sid, []).append((result.normal_text, result.calls))
+        return detectors
+    return run
+
+def run_batch(streams, record=None):
+    parser = Glm47BatchParser(tools)
+    for batch in rounds(streams):
+        for sid, normal_text, calls in parser.feed_many(batch):
+            if record is not None:
+                record.setdefault(sid, []).append((normal_text, calls))
+    return parser
+
+def per_delta(record):
+    return {sid: [(text, [(c.tool_index, c.name, c.parameters) for c in calls]) for text, calls in steps]
+            for sid, steps in record.items()}
+
+def final_output(record):
+    """Per stream: all normal text, and each tool call's name and concatenated arguments"""
+    output = {}
+    for sid, steps in record.items():
+        text, tool_calls = "", {}
+        for normal_text, calls in steps:
+            text += normal_text
+            for c in calls:
+                name, args = tool_calls.get(c.tool_index, (None, ""))
+                tool_calls[c.tool_index] = (name or c.name, args + (c.parameters or ""))
+        output[sid] = (text, sorted(tool_calls.values()))
+    return output
+
+def best_time(runner, streams):
+    best = None
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        runner(streams)
+        elapsed = time.perf_counter() - t_start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def state_bytes(runner, streams):
+    """Bytes still allocated once every stream has finished (per-stream state left behind)"""
+    tracemalloc.start()
+    state = runner(streams)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return current
+
+def main():
+    os.makedirs("results", exist_ok=True)
+    arms = {
+        "baseline": detector_runner(load_baseline().Glm47MoeDetector),
+        "detector": detector_runner(Glm47MoeDetector),
+        "batch": run_batch,
+    }
+
+    print("=" * 110)
+    print("  Parser Test: multi-stream throughput (baseline detectors vs current detectors vs feed_many)")
+    print(f"  {DELTA_CHARS}-char deltas, round-robin decode steps, best of {REPEATS}")
+    print("=" * 110)
+
+    results = []
+    for n_streams in STREAM_COUNTS:
+        streams = build_streams(n_streams)
+        n_deltas = sum(len(s) for s in streams)
+
+        records = {}
+        for name, runner in arms.items():
+            records[name] = {}
+            runner(streams, records[name])
+        seconds = {name: best_time(runner, streams) for name, runner in arms.items()}
+        bytes_per_stream = {name: state_bytes(runner, streams) // n_streams for name, runner in arms.items()}
+        results.append({
+            "streams": n_streams,
+            "deltas": n_deltas,
+            **{f"{name}_deltas_per_s": round(n_deltas / seconds[name]) for name in arms},
+            "speedup_vs_baseline": round(seconds["baseline"] / seconds["batch"], 2),
+            "speedup_vs_detector": round(seconds["detector"] / seconds["batch"], 2),
+            **{f"{name}_bytes_per_stream": bytes_per_stream[name] for name in arms},
+            "identical_deltas": per_delta(records["detector"]) == per_delta(records["batch"]),
+            "same_as_baseline": final_output(records["baseline"]) == final_output(records["batch"]),
+        })
+
+    print(f"\n{'Streams':>7} | {'Deltas':>7} | {'Baseline d/s':>12} | {'Detector d/s':>12} | {'feed_many d/s':>13} | "
+          f"{'vs base':>8} | {'vs det':>7} | {'B/stream base/det/batch':>23} | {'Same':>4}")
+    print("-" * 110)
+    for r in results:
+        icon = "✅" if r["identical_deltas"] and r["same_as_baseline"] else "❌"
+        mem = f"{r['baseline_bytes_per_stream']}/{r['detector_bytes_per_stream']}/{r['batch_bytes_per_stream']}"
+        print(f"{r['streams']:>7} | {r['deltas']:>7} | {r['baseline_deltas_per_s']:>12,} | {r['detector_deltas_per_s']:>12,} | "
+              f"{r['batch_deltas_per_s']:>13,} | {r['speedup_vs_baseline']:>7.2f}x | {r['speedup_vs_detector']:>6.2f}x | {mem:>23} | {icon:>4}")
+    print("\nBaseline = patches as of the baseline commit; detector = current Glm47MoeDetector per request.")
+    print("Same = feed_many matches the current detector delta for delta, and the baseline's final text and arguments.")
+    print("B/stream = memory still held per finished stream.")
+
+    csv_path = "results/parser_batch.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_batch.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 argument value decoding — full fallback cascade (before) vs type-directed decoder (after)"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import parse_arguments  # noqa: E402
+from parser_bench.scenarios import code_of, load_baseline  # noqa: E402
+
+REPEATS = 5
+MIN_CALLS = 20
+
+CASES = [
+    # (label, declared type, raw value)
+    ("string 1 KB", "string", code_of(1_000)),
+    ("string 4 KB", "string", code_of(4_000)),
+    ("string 16 KB", "string", code_of(16_000)),
+    ("string 64 KB", "string", code_of(64_000)),
+    ("untyped 16 KB", None, code_of(16_000)),
+    ("integer", "integer", "4096"),
+    ("number", "number", "0.75"),
+    ("boolean", "boolean", "true"),
+    ("object 4 KB", "object", json.dumps({f"k{i}": [i, str(i)] for i in range(300)})),
+]
+
+def time_decoder(decoder, value, arg_type):
+    """Best-of-REPEATS µs per call"""
+    best = None
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        for _ in range(MIN_CALLS):
+            decoder(value, arg_type)
+        elapsed = (time.perf_counter() - t_start) / MIN_CALLS
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 84)
+    print("  Parser Test: argument value decoding (parse_arguments)")
+    print(f"  best of {REPEATS} x {MIN_CALLS} calls per case")
+    print("=" * 84)
+
+    legacy_parse_arguments = load_baseline().parse_arguments
+    results = []
+    for label, arg_type, value in CASES:
+        before_us = time_decoder(legacy_parse_arguments, value, arg_type)
+        after_us = time_decoder(parse_arguments, value, arg_type)
+        results.append({
+            "case": label,
+            "arg_type": arg_type or "untyped",
+            "value_chars": len(value),
+            "before_us": round(before_us, 2),
+            "after_us": round(after_us, 2),
+            "speedup": round(before_us / after_us, 1) if after_us > 0 else 0,
+            "same_value": legacy_parse_arguments(value, arg_type)[0] == parse_arguments(value, arg_type)[0],
+        })
+
+    print(f"\n{'Case':>14} | {'Type':>8} | {'Chars':>7} | {'Before µs':>10} | {'After µs':>9} | {'Speedup':>8} | {'Same':>5}")
+    print("-" * 84)
+    for r in results:
+        icon = "✅" if r["same_value"] else "⚠️"
+        print(f"{r['case']:>14} | {r['arg_type']:>8} | {r['value_chars']:>7} | {r['before_us']:>10.2f} | {r['after_us']:>9.2f} | {r['speedup']:>7.1f}x | {icon:>5}")
+    if not all(r["same_value"] for r in results):
+        print("\n⚠️ = decoded value differs: string arguments are now taken verbatim instead of being")
+        print("   reinterpreted as JSON/Python literals (e.g. \"{'a': 1}\" no longer becomes '{\"a\": 1}').")
+
+    csv_path = "results/parser_decode.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_decode.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
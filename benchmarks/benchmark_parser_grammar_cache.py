@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 grammar cache — time-to-first-token of a mocked request pipeline over a 10-turn agent session"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import GrammarCache, Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import TOOL_DEFS  # noqa: E402
+from sglang.srt.entrypoints.openai.protocol import Tool  # noqa: E402
+
+try:
+    import xgrammar as xgr
+except ImportError:
+    xgr = None
+
+TURNS = 10
+SESSIONS = 20  # repeated sessions; per-turn figures are medians
+VOCAB_SIZE = 32_000  # synthetic vocabulary for the xgrammar compile step
+
+def synthetic_vocab():
+    """Byte tokens plus word-like pieces, enough to give compilation a realistic mask size"""
+    vocab = [f"<0x{b:02X}>" for b in range(256)]
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    i = 0
+    while len(vocab) < VOCAB_SIZE:
+        word = letters[i % 26] + letters[(i // 26) % 26] + letters[(i // 676) % 26] + str(i % 7)
+        vocab.append(word if i % 3 else " " + word)
+        i += 1
+    return vocab
+
+class MockPipeline:
+    """Request handling up to the first token: parse tools, compose grammar, compile it, emit token
+
+    mode "none":     compose and compile on every request
+    mode "string":   compose every request, compiled grammars cached by grammar string
+                     (what sglang's grammar backend does)
+    mode "tool_hash": composed and compiled grammars cached by tool-set hash (GrammarCache)
+    """
+
+    def __init__(self, mode, tokenizer_info):
+        self.mode = mode
+        self.compiler = xgr.GrammarCompiler(tokenizer_info, cache_enabled=False) if tokenizer_info else None
+        self.compiled_by_string = {}
+        Glm47MoeDetector.grammar_cache = GrammarCache(maxsize=0 if mode != "tool_hash" else 64)
+
+    def compile(self, ebnf):
+        return self.compiler.compile_grammar(ebnf) if self.compiler else None
+
+    def handle(self, request):
+        """Return seconds until the first token would be emitted"""
+        t_start = time.perf_counter()
+        tools = [Tool(**t) for t in request["tools"]]
+        detector = Glm47MoeDetector()
+        if self.mode == "tool_hash":
+            Glm47MoeDetector.grammar_cache.get_or_build(
+                "compiled", tools, lambda: self.compile(detector.build_ebnf(tools))
+            )
+        else:
+            ebnf = detector.build_ebnf(tools)
+            if self.mode == "string":
+                if ebnf not in self.compiled_by_string:
+                    self.compiled_by_string[ebnf] = self.compile(ebnf)
+            else:
+                self.compile(ebnf)
+        # mocked prefill: the first token is ready as soon as the grammar is
+        return time.perf_counter() - t_start
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run_mode(mode, tokenizer_info):
+    per_turn = [[] for _ in range(TURNS)]
+    stats = None
+    for _ in range(SESSIONS):
+        pipeline = MockPipeline(mode, tokenizer_info)
+        for turn in range(TURNS):
+            request = {"messages": [], "tools": json.loads(json.dumps(TOOL_DEFS))}  # fresh request body per turn
+            per_turn[turn].append(pipeline.handle(request))
+        stats = Glm47MoeDetector.grammar_cache.stats()
+    return [median(t) for t in per_turn], stats
+
+def main():
+    os.makedirs("results", exist_ok=True)
+    tokenizer_info = xgr.TokenizerInfo(synthetic_vocab()) if xgr else None
+
+    print("=" * 88)
+    print(f"  Parser Test: glm47 grammar cache, mocked TTFT over a {TURNS}-turn session (same tools each turn)")
+    print(f"  median of {SESSIONS} sessions; compile step: "
+          f"{f'xgrammar, {VOCAB_SIZE:,}-token synthetic vocab' if xgr else 'skipped (xgrammar not installed)'}")
+    print("=" * 88)
+
+    original_cache = Glm47MoeDetector.grammar_cache
+    results = []
+    try:
+        for mode in ("none", "string", "tool_hash"):
+            turns, stats = run_mode(mode, tokenizer_info)
+            warm = sum(turns[1:]) / (TURNS - 1)
+            results.append({
+                "mode": mode,
+                "turn1_ms": round(turns[0] * 1e3, 3),
+                "turns2_10_ms": round(warm * 1e3, 3),
+                "session_ms": round(sum(turns) * 1e3, 3),
+                "cache_hits": stats["hits"],
+                "cache_misses": stats["misses"],
+            })
+    finally:
+        Glm47MoeDetector.grammar_cache = original_cache
+
+    baseline = results[0]
+    print(f"\n{'Cache':>10} | {'Turn 1 ms':>10} | {'Turns 2-10 ms':>13} | {'Session ms':>10} | {'vs none':>8} | {'Hits':>5} | {'Misses':>6}")
+    print("-" * 88)
+    for r in results:
+        speedup = baseline["turns2_10_ms"] / r["turns2_10_ms"] if r["turns2_10_ms"] else float("inf")
+        print(f"{r['mode']:>10} | {r['turn1_ms']:>10.3f} | {r['turns2_10_ms']:>13.3f} | {r['session_ms']:>10.3f} | {speedup:>7.1f}x | {r['cache_hits']:>5} | {r['cache_misses']:>6}")
+    print("\nTTFT here is only the request-side grammar work (the mocked prefill is instant);")
+    print("add it to the measured TTFT in RESULTS.md (Test 2) for the end-to-end effect. Hits/misses are per session.")
+
+    csv_path = "results/parser_grammar_cache.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_grammar_cache.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
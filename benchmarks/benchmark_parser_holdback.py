@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Parser Test: normal-text release latency for code-heavy replies full of '<' — whole-buffer holdback (before) vs exact-suffix holdback (after)"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import DECODE_TOKS, load_baseline, to_deltas  # noqa: E402
+
+TOKENS_PER_DELTA = 3  # EAGLE-style chunks: a few tokens per streamed delta
+
+RESPONSES = {
+    "cpp_templates": "Here is the fix:\n```cpp\n" + "std::vector<std::pair<int, std::string>> v; if (a < b && c<d) { out << v.size() << '\\n'; }\n" * 40 + "```\n",
+    "html_table": "Updated template:\n```html\n" + '<table><thead><tr><th>Name</th></tr></thead><tbody><tr><td>{{ name }}</td></tr></tbody></table>\n' * 40 + "```\n",
+    "python_compare": "The loop should be:\n```python\n" + "while i < n and arr[i] <= target:\n    i += 1 if arr[i]<limit else 2\n" * 40 + "```\n",
+    "prose": "The quick brown fox jumps over the lazy dog, then rests under the old oak tree. " * 60,
+}
+
+class NormalText:
+    """normal_text a detector releases per delta (no tools, so only the holdback path runs)"""
+
+    def __init__(self, detector_cls):
+        self._detector = detector_cls()
+
+    def feed(self, new_text):
+        return self._detector.parse_streaming_increment(new_text, []).normal_text
+
+def measure(detector_cls, text):
+    """Stream text and record, per character, how many deltas it waited before becoming visible"""
+    parser = NormalText(detector_cls)
+    deltas = to_deltas(text, TOKENS_PER_DELTA)
+    arrival = []  # delta index each not-yet-released char arrived in
+    lags = []
+    max_held = 0
+    first_visible = None
+    elapsed = 0.0
+    for idx, delta in enumerate(deltas):
+        arrival.extend([idx] * len(delta))
+        t0 = time.perf_counter()
+        released = parser.feed(delta)
+        elapsed += time.perf_counter() - t0
+        if released and first_visible is None:
+            first_visible = idx
+        for _ in range(len(released)):
+            lags.append(idx - arrival.pop(0))
+        max_held = max(max_held, len(arrival))
+    lags.sort()
+    return {
+        "deltas": len(deltas),
+        "first_visible_delta": first_visible,
+        "mean_lag_deltas": round(sum(lags) / len(lags), 3) if lags else 0,
+        "p99_lag_deltas": lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0,
+        "max_lag_deltas": lags[-1] if lags else 0,
+        "max_held_chars": max_held,
+        "us_per_delta": round(elapsed * 1e6 / len(deltas), 2),
+    }
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    ms_per_delta = 1000 * TOKENS_PER_DELTA / DECODE_TOKS
+    print("=" * 100)
+    print("  Parser Test: normal-text holdback latency on code-heavy output")
+    print(f"  {TOKENS_PER_DELTA} tokens per delta, lag converted at {DECODE_TOKS} tok/s ({ms_per_delta:.0f} ms/delta)")
+    print("=" * 100)
+
+    results = []
+    for name, text in RESPONSES.items():
+        for label, detector_cls in (("before", load_baseline().Glm47MoeDetector), ("after", Glm47MoeDetector)):
+            r = measure(detector_cls, text)
+            r.update({"response": name, "impl": label, "lt_chars": text.count("<"),
+                      "p99_lag_ms": round(r["p99_lag_deltas"] * ms_per_delta, 1),
+                      "max_lag_ms": round(r["max_lag_deltas"] * ms_per_delta, 1)})
+            results.append(r)
+
+    print(f"\n{'Response':>15} | {'Impl':>6} | {'<':>4} | {'1st vis':>7} | {'Mean lag':>8} | {'p99 lag':>7} | {'Max lag':>7} | {'Max ms':>7} | {'Held':>5} | {'µs/delta':>8}")
+    print("-" * 100)
+    for r in results:
+        print(f"{r['response']:>15} | {r['impl']:>6} | {r['lt_chars']:>4} | {r['first_visible_delta']:>7} | {r['mean_lag_deltas']:>8.3f} | {r['p99_lag_deltas']:>7} | {r['max_lag_deltas']:>7} | {r['max_lag_ms']:>7.0f} | {r['max_held_chars']:>5} | {r['us_per_delta']:>8.2f}")
+    print("\nLag = deltas a character waits between arriving and being released as normal_text.")
+
+    csv_path = "results/parser_holdback.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_holdback.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
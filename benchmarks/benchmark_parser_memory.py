@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Parser Test: memory and construction cost of 10,000 idle glm47 parsers — dict-based detector state (before) vs __slots__ stream state (after)"""
+import csv
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector, _Glm47Stream  # noqa: E402
+from parser_bench.scenarios import load_baseline  # noqa: E402
+
+IDLE_PARSERS = 10_000  # open agent sessions that have not produced a tool call yet
+REPEATS = 3
+
+# (label, what one instance allocates, factory)
+PARSERS = [
+    ("detector (before)", "detector + dict", load_baseline().Glm47MoeDetector),
+    ("detector (after)", "slotted detector + 3-key dict", Glm47MoeDetector),
+    ("batch stream", "_Glm47Stream", _Glm47Stream),
+]
+
+def measure_bytes(factory):
+    """Bytes allocated while holding IDLE_PARSERS live instances"""
+    gc.collect()
+    tracemalloc.start()
+    instances = [factory() for _ in range(IDLE_PARSERS)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return current
+
+def measure_construction(factory):
+    best = None
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        instances = [factory() for _ in range(IDLE_PARSERS)]
+        elapsed = time.perf_counter() - t_start
+        del instances
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 105)
+    print(f"  Parser Test: {IDLE_PARSERS:,} idle parsers — memory and construction")
+    print(f"  tracemalloc for bytes, best of {REPEATS} for construction time")
+    print("=" * 105)
+
+    results = []
+    for label, holds, factory in PARSERS:
+        total_bytes = measure_bytes(factory)
+        construct_s = measure_construction(factory)
+        results.append({
+            "parser": label,
+            "holds": holds,
+            "instances": IDLE_PARSERS,
+            "total_kb": round(total_bytes / 1024),
+            "bytes_per_parser": total_bytes // IDLE_PARSERS,
+            "construct_us": round(construct_s * 1e6 / IDLE_PARSERS, 2),
+        })
+
+    baseline = results[0]
+    print(f"\n{'Parser':>18} | {'Holds':>30} | {'Total KB':>9} | {'B/parser':>9} | {'vs before':>9} | {'Construct µs':>12}")
+    print("-" * 105)
+    for r in results:
+        ratio = r["bytes_per_parser"] / baseline["bytes_per_parser"]
+        print(f"{r['parser']:>18} | {r['holds']:>30} | {r['total_kb']:>9,} | {r['bytes_per_parser']:>9} | {ratio:>8.2f}x | {r['construct_us']:>12.2f}")
+
+    print("\nB/parser is everything one instance keeps alive (tracemalloc), including the lists and dicts it holds.")
+    print("The dict of the detector (after) is the 3 attributes BaseFormatDetector.__init__ sets; its state is in slots.")
+    print("The baseline compiles two regexes per instance: re's cache returns shared patterns, so that costs time, not memory.")
+
+    csv_path = "results/parser_memory.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_memory.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
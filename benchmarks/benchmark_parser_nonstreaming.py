@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 non-streaming detect_and_parse — multi-scan regex (before) vs single pass (after)"""
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import code_of, default_tools, load_baseline  # noqa: E402
+
+tools = default_tools("read_file", "write_file", "list_directory")
+
+CALL_COUNTS = [1, 10, 100]
+REPEATS = 5
+
+CONTENT = code_of(500)
+
+def build_completion(n_calls):
+    """Normal text interleaved with n parallel tool calls, cycling through the three tools"""
+    parts = ["I'll inspect the workspace and update the files.\n"]
+    for i in range(n_calls):
+        kind = i % 3
+        if kind == 0:
+            parts.append(f"<tool_call>read_file\n<arg_key>path</arg_key>\n<arg_value>/src/mod_{i}.py</arg_value>\n</tool_call>")
+        elif kind == 1:
+            parts.append(f"<tool_call>write_file<arg_key>path</arg_key><arg_value>/src/out_{i}.py</arg_value>"
+                         f"<arg_key>content</arg_key><arg_value>{CONTENT}</arg_value></tool_call>")
+        else:
+            parts.append("<tool_call>list_directory</tool_call>")
+        parts.append("\n")
+    return "".join(parts)
+
+def kept_in_order(before, after):
+    """True if every call the baseline parsed comes out of the rewrite unchanged and in order"""
+    remaining = iter([(c.name, c.parameters) for c in after])
+    return all((c.name, c.parameters) in remaining for c in before)
+
+def time_parse(detector_cls, text):
+    """Best-of-REPEATS seconds for one parse of text, plus the result"""
+    detector = detector_cls()
+    best = None
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        result = detector.detect_and_parse(text, tools)
+        elapsed = time.perf_counter() - t_start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 92)
+    print("  Parser Test: non-streaming detect_and_parse vs number of parallel tool calls")
+    print("=" * 92)
+    logging.disable(logging.WARNING)  # the baseline warns once per call it cannot resolve
+
+    results = []
+    for n_calls in CALL_COUNTS:
+        text = build_completion(n_calls)
+        before_s, before = time_parse(load_baseline().Glm47MoeDetector, text)
+        after_s, after = time_parse(Glm47MoeDetector, text)
+        same = before.normal_text == after.normal_text and kept_in_order(before.calls, after.calls)
+        results.append({
+            "tool_calls": n_calls,
+            "completion_chars": len(text),
+            "before_parsed_calls": len(before.calls),
+            "parsed_calls": len(after.calls),
+            "before_us": round(before_s * 1e6, 1),
+            "after_us": round(after_s * 1e6, 1),
+            "after_us_per_call": round(after_s * 1e6 / n_calls, 1),
+            "speedup": round(before_s / after_s, 2),
+            "identical_output": same,
+        })
+
+    print(f"\n{'Calls':>6} | {'Chars':>8} | {'Parsed old→new':>14} | {'Before µs':>10} | {'After µs':>9} | {'µs/call':>8} | {'Speedup':>8} | {'Same':>5}")
+    print("-" * 92)
+    for r in results:
+        icon = "✅" if r["identical_output"] else "❌"
+        parsed = f"{r['before_parsed_calls']} → {r['parsed_calls']}"
+        print(f"{r['tool_calls']:>6} | {r['completion_chars']:>8} | {parsed:>14} | {r['before_us']:>10.1f} | {r['after_us']:>9.1f} | {r['after_us_per_call']:>8.1f} | {r['speedup']:>7.2f}x | {icon:>5}")
+
+    print("\nSame = identical normal text, and every call the baseline parsed is returned unchanged; the baseline")
+    print("drops calls whose name is followed by a newline (read_file\\n), which the single pass strips.")
+
+    csv_path = "results/parser_nonstreaming.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_nonstreaming.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 streaming cost vs tool-call size — per-delta cost must stay flat up to 100 KB arguments"""
+import csv
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import DELTA_CHARS, chunks, code_of, default_tools  # noqa: E402
+from sample_stats import percentile  # noqa: E402
+
+tools = default_tools("write_file")
+
+ARG_SIZES = [1_000, 4_000, 16_000, 64_000, 100_000]  # bytes of write_file.content
+REPEATS = 3
+
+def build_tool_call(size):
+    content = code_of(size)
+    text = (
+        "<tool_call>write_file<arg_key>path</arg_key><arg_value>/tmp/out.py</arg_value>"
+        f"<arg_key>content</arg_key><arg_value>{content}</arg_value></tool_call>"
+    )
+    return content, chunks(text)
+
+def stream_once(deltas):
+    """Feed all deltas through a fresh detector, return (elapsed_s, per-delta µs list, streamed args)"""
+    detector = Glm47MoeDetector()
+    per_delta_us = []
+    args = ""
+    t_start = time.perf_counter()
+    for delta in deltas:
+        t0 = time.perf_counter()
+        result = detector.parse_streaming_increment(delta, tools)
+        per_delta_us.append((time.perf_counter() - t0) * 1e6)
+        for call in result.calls:
+            args += call.parameters or ""
+    return time.perf_counter() - t_start, per_delta_us, args
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 80)
+    print("  Parser Test: glm47 streaming scan cost vs argument size")
+    print(f"  Delta size: {DELTA_CHARS} chars, sizes: {', '.join(str(s) for s in ARG_SIZES)} bytes")
+    print("=" * 80)
+
+    results = []
+    for size in ARG_SIZES:
+        content, deltas = build_tool_call(size)
+        best = None
+        for _ in range(REPEATS):
+            elapsed, per_delta_us, args = stream_once(deltas)
+            if best is None or elapsed < best[0]:
+                best = (elapsed, per_delta_us, args)
+        elapsed, per_delta_us, args = best
+        per_delta_us.sort()
+        # Sanity check: the streamed JSON must round-trip to the original content
+        ok = json.loads(args).get("content") == content
+        results.append({
+            "arg_bytes": size,
+            "deltas": len(deltas),
+            "total_ms": round(elapsed * 1000, 2),
+            "us_per_delta": round(elapsed * 1e6 / len(deltas), 2),
+            "p50_us": round(percentile(per_delta_us, 50), 2),
+            "p99_us": round(percentile(per_delta_us, 99), 2),
+            "us_per_kb": round(elapsed * 1e6 / (size / 1000), 1),
+            "args_ok": ok,
+        })
+
+    # Linear scaling => log-log slope of total time vs size close to 1.0 (quadratic => ~2.0)
+    first, last = results[0], results[-1]
+    slope = math.log(last["total_ms"] / first["total_ms"]) / math.log(last["arg_bytes"] / first["arg_bytes"])
+
+    print(f"\n{'Bytes':>8} | {'Deltas':>7} | {'Total (ms)':>11} | {'µs/delta':>9} | {'p50 µs':>7} | {'p99 µs':>7} | {'µs/KB':>8} | {'OK':>3}")
+    print("-" * 80)
+    for r in results:
+        icon = "✅" if r["args_ok"] else "❌"
+        print(f"{r['arg_bytes']:>8} | {r['deltas']:>7} | {r['total_ms']:>11.2f} | {r['us_per_delta']:>9.2f} | {r['p50_us']:>7.2f} | {r['p99_us']:>7.2f} | {r['us_per_kb']:>8.1f} | {icon:>3}")
+    print(f"\nScaling exponent (log-log slope): {slope:.2f}  (1.0 = linear, 2.0 = quadratic)")
+
+    csv_path = "results/parser_streaming_scaling.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_streaming_scaling.json", "w") as f:
+        json.dump({"delta_chars": DELTA_CHARS, "scaling_exponent": round(slope, 3), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Parser Test: streaming argument validation — how early invalid tool calls are flagged, and what it costs on valid ones"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+import glm47_moe_detector  # noqa: E402
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from parser_bench.scenarios import DECODE_TOKS, DELTA_CHARS, chunks, code_of, default_tools  # noqa: E402
+
+tools = default_tools("write_file", "read_file")
+
+REPEATS = 5
+
+CONTENT = code_of(3_000)
+
+# (label, response, should be flagged)
+CASES = [
+    ("valid write", "<tool_call>write_file<arg_key>path</arg_key><arg_value>src/a.py</arg_value>"
+     f"<arg_key>mode</arg_key><arg_value>overwrite</arg_value><arg_key>content</arg_key><arg_value>{CONTENT}</arg_value></tool_call>", False),
+    ("valid read (null)", "<tool_call>read_file<arg_key>path</arg_key><arg_value>src/a.py</arg_value>"
+     "<arg_key>offset</arg_key><arg_value>40</arg_value><arg_key>limit</arg_key><arg_value>null</arg_value></tool_call>", False),
+    ("bad enum", "<tool_call>write_file<arg_key>path</arg_key><arg_value>src/a.py</arg_value>"
+     f"<arg_key>mode</arg_key><arg_value>replace</arg_value><arg_key>content</arg_key><arg_value>{CONTENT}</arg_value></tool_call>", True),
+    ("bad integer", "<tool_call>read_file<arg_key>offset</arg_key><arg_value>line 40</arg_value>"
+     f"<arg_key>path</arg_key><arg_value>{'very/deep/' * 30}a.py</arg_value></tool_call>", True),
+    ("missing required", "<tool_call>write_file<arg_key>mode</arg_key><arg_value>append</arg_value>"
+     f"<arg_key>content</arg_key><arg_value>{CONTENT}</arg_value></tool_call>", True),
+]
+
+def stream(text):
+    """Return (deltas, index of the delta that first produced a validation error or None, elapsed_s)"""
+    detector = Glm47MoeDetector()
+    deltas = chunks(text)
+    flagged_at = None
+    t_start = time.perf_counter()
+    for idx, delta in enumerate(deltas):
+        detector.parse_streaming_increment(delta, tools)
+        if flagged_at is None and detector.validation_errors:
+            flagged_at = idx
+    return deltas, flagged_at, time.perf_counter() - t_start
+
+def best_time(text):
+    return min(stream(text)[2] for _ in range(REPEATS))
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 96)
+    print("  Parser Test: streaming argument validation (enum / type / required)")
+    print(f"  {DELTA_CHARS}-char deltas (~1 token), saved time at {DECODE_TOKS} tok/s")
+    print("=" * 96)
+
+    results = []
+    for label, text, expect_flag in CASES:
+        deltas, flagged_at, _ = stream(text)
+        with_validation_s = best_time(text)
+        # Same stream with the per-argument check disabled, to isolate its cost
+        check = glm47_moe_detector._check_decoded_argument
+        glm47_moe_detector._check_decoded_argument = lambda *args: None
+        try:
+            without_validation_s = best_time(text)
+        finally:
+            glm47_moe_detector._check_decoded_argument = check
+        saved = len(deltas) - 1 - flagged_at if flagged_at is not None else 0
+        results.append({
+            "case": label,
+            "deltas": len(deltas),
+            "flagged_at_delta": flagged_at,
+            "tokens_saved": saved,
+            "seconds_saved": round(saved / DECODE_TOKS, 1),
+            "overhead_pct": round((with_validation_s / without_validation_s - 1) * 100, 1),
+            "correct": (flagged_at is not None) == expect_flag,
+        })
+
+    print(f"\n{'Case':>18} | {'Deltas':>6} | {'Flagged at':>10} | {'Tokens saved':>12} | {'Saved s':>7} | {'Overhead':>8} | {'OK':>3}")
+    print("-" * 96)
+    for r in results:
+        icon = "✅" if r["correct"] else "❌"
+        flagged = "-" if r["flagged_at_delta"] is None else r["flagged_at_delta"]
+        print(f"{r['case']:>18} | {r['deltas']:>6} | {flagged:>10} | {r['tokens_saved']:>12} | {r['seconds_saved']:>7.1f} | {r['overhead_pct']:>7.1f}% | {icon:>3}")
+    print("\nTokens saved = deltas the model would still decode after the error is visible in validation_errors.")
+    print("Missing required arguments can only be known at </tool_call>, so nothing is saved there.")
+
+    csv_path = "results/parser_validation.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_validation.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
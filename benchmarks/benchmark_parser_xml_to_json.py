@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Parser Test: glm47 XML→JSON argument conversion — chars/sec, per-character (before) vs chunk-level (after)"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import _Glm47Stream  # noqa: E402
+from parser_bench.scenarios import DELTA_CHARS, chunks, code_of, default_tools, load_baseline  # noqa: E402
+
+tools = default_tools("write_file", "run_command")
+
+VALUE_BYTES = 20_000
+REPEATS = 3
+
+def build_cases():
+    """(function, raw argument XML that follows its name) for each value type, ~VALUE_BYTES of value text"""
+    string_xml = f"<arg_key>content</arg_key><arg_value>{code_of(VALUE_BYTES)}</arg_value>"
+    # Numbers are short, so use many number arguments to reach the same volume
+    number_xml = "".join(
+        f"<arg_key>timeout</arg_key><arg_value>{i * 1.5}</arg_value>" for i in range(VALUE_BYTES // 8)
+    )
+    env = json.dumps({f"KEY_{i}": {"path": f"/tmp/file_{i}.py", "lines": [i, i + 1]} for i in range(VALUE_BYTES // 50)})
+    object_xml = f"<arg_key>env</arg_key><arg_value>{env}</arg_value>"
+    return {"string": ("write_file", string_xml), "number": ("run_command", number_xml),
+            "object": ("run_command", object_xml)}
+
+def new_stream():
+    stream = _Glm47Stream()
+    stream._arguments = {}
+    return stream
+
+def convert(func_name, raw_xml, factory):
+    """Stream raw_xml in DELTA_CHARS deltas through a fresh parser's converter, return (elapsed_s, json_text)"""
+    parser = factory()
+    parts = []
+    t_start = time.perf_counter()
+    for delta in chunks(raw_xml):
+        parts.append(parser._process_xml_to_json_streaming(delta, func_name, tools))
+    elapsed = time.perf_counter() - t_start
+    return elapsed, "".join(parts) + "}"
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 80)
+    print("  Parser Test: XML→JSON argument conversion throughput")
+    print(f"  ~{VALUE_BYTES} value bytes per case, {DELTA_CHARS}-char deltas, best of {REPEATS}")
+    print("=" * 80)
+
+    impls = {
+        "before": load_baseline().Glm47MoeDetector,
+        "after": new_stream,
+    }
+    results = []
+    for value_type, (func_name, raw_xml) in build_cases().items():
+        timings = {}
+        outputs = {}
+        for name, factory in impls.items():
+            runs = [convert(func_name, raw_xml, factory) for _ in range(REPEATS)]
+            timings[name] = min(r[0] for r in runs)
+            outputs[name] = runs[0][1]
+        # Both implementations must produce identical JSON
+        same = outputs["before"] == outputs["after"]
+        json.loads(outputs["after"])
+        before_cps = len(raw_xml) / timings["before"]
+        after_cps = len(raw_xml) / timings["after"]
+        results.append({
+            "value_type": value_type,
+            "xml_chars": len(raw_xml),
+            "before_chars_per_s": round(before_cps),
+            "after_chars_per_s": round(after_cps),
+            "speedup": round(after_cps / before_cps, 2),
+            "identical_output": same,
+        })
+
+    print(f"\n{'Type':>8} | {'XML chars':>10} | {'Before chars/s':>15} | {'After chars/s':>14} | {'Speedup':>8} | {'Same':>5}")
+    print("-" * 80)
+    for r in results:
+        icon = "✅" if r["identical_output"] else "❌"
+        print(f"{r['value_type']:>8} | {r['xml_chars']:>10} | {r['before_chars_per_s']:>15,} | {r['after_chars_per_s']:>14,} | {r['speedup']:>7.2f}x | {icon:>5}")
+
+    csv_path = "results/parser_xml_to_json.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/parser_xml_to_json.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Parser Test: argument type inference over large $ref-heavy tool schemas (MCP-style)"""
+import ast
+import copy
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from parser_bench.scenarios import baseline_source  # noqa: E402
+from patch_utils import FUNC_CODE  # noqa: E402
+
+# Run the exact code that patch_utils.py injects into sglang's utils.py, now and as of the baseline
+patched = {}
+exec(FUNC_CODE, patched)
+infer_type_from_json_schema = patched["infer_type_from_json_schema"]
+schema_resolvers = patched["_schema_resolvers"]
+# The baseline patch_utils.py patches on import, so take FUNC_CODE from its source
+legacy = {}
+exec(next(ast.literal_eval(node.value) for node in ast.parse(baseline_source("patch_utils.py")).body
+          if isinstance(node, ast.Assign) and node.targets[0].id == "FUNC_CODE"), legacy)
+legacy_infer_type_from_json_schema = legacy["infer_type_from_json_schema"]
+
+REPEATS = 5
+
+# ---------------------------------------------------------------------------
+# Schema corpus
+# ---------------------------------------------------------------------------
+
+def github_like_schema(n_models=60):
+    """pydantic v2 style: $defs + anyOf [$ref, null] optionals, like a GitHub MCP server"""
+    defs = {}
+    for i in range(n_models):
+        defs[f"Model{i}"] = {
+            "type": "object",
+            "properties": {
+                "id": {"type": "integer"},
+                "login": {"type": "string"},
+                "state": {"$ref": "#/$defs/State"},
+                "owner": {"anyOf": [{"$ref": f"#/$defs/Model{(i + 1) % n_models}"}, {"type": "null"}]},
+            },
+        }
+    defs["State"] = {"enum": ["open", "closed", "merged"]}
+    properties = {}
+    for i in range(n_models):
+        properties[f"model_{i}"] = {"anyOf": [{"$ref": f"#/$defs/Model{i}"}, {"type": "null"}], "default": None}
+        properties[f"state_{i}"] = {"$ref": "#/$defs/State"}
+        properties[f"count_{i}"] = {"type": ["integer", "null"]}
+    return {"type": "object", "$defs": defs, "properties": properties}
+
+def k8s_like_schema(chain=25, n_props=80):
+    """pydantic v1 / OpenAPI style: 'definitions', allOf [$ref] wrappers and long $ref chains"""
+    definitions = {}
+    for i in range(chain):
+        name = f"io.k8s.api.core.v1.Level{i}"
+        if i == chain - 1:
+            definitions[name] = {"type": "object", "properties": {"name": {"type": "string"}}}
+        else:
+            definitions[name] = {"allOf": [{"$ref": f"#/definitions/io.k8s.api.core.v1.Level{i + 1}"}]}
+    definitions["Quantity"] = {"oneOf": [{"type": "string"}, {"type": "number"}]}
+    properties = {}
+    for i in range(n_props):
+        properties[f"spec_{i}"] = {"allOf": [{"$ref": f"#/definitions/io.k8s.api.core.v1.Level{i % chain}"}], "description": "x" * 200}
+        properties[f"limit_{i}"] = {"$ref": "#/definitions/Quantity"}
+    return {"type": "object", "definitions": definitions, "properties": properties}
+
+def recursive_schema(n_props=100):
+    """Self-referential JSON value schema plus a pure $ref cycle that must not recurse forever"""
+    defs = {
+        "JsonValue": {"anyOf": [
+            {"type": "string"}, {"type": "number"}, {"type": "boolean"},
+            {"type": "array", "items": {"$ref": "#/$defs/JsonValue"}},
+            {"type": "object", "additionalProperties": {"$ref": "#/$defs/JsonValue"}},
+        ]},
+        "Tree": {"type": "object", "properties": {"children": {"type": "array", "items": {"$ref": "#/$defs/Tree"}}}},
+        "CycleA": {"$ref": "#/$defs/CycleB"},
+        "CycleB": {"$ref": "#/$defs/CycleA"},
+    }
+    properties = {}
+    for i in range(n_props):
+        properties[f"value_{i}"] = {"$ref": "#/$defs/JsonValue"}
+        properties[f"tree_{i}"] = {"$ref": "#/$defs/Tree"}
+        properties[f"cycle_{i}"] = {"$ref": "#/$defs/CycleA"}
+    return {"type": "object", "$defs": defs, "properties": properties}
+
+def wide_enum_schema(n_props=150, n_enums=40):
+    """Many arguments, each a union over shared enum definitions"""
+    defs = {f"Enum{i}": {"enum": [f"v{i}_{j}" for j in range(30)]} for i in range(n_enums)}
+    properties = {
+        f"arg_{i}": {"oneOf": [{"$ref": f"#/$defs/Enum{(i + k) % n_enums}"} for k in range(5)]}
+        for i in range(n_props)
+    }
+    return {"type": "object", "$defs": defs, "properties": properties}
+
+CORPUS = {
+    "github_like": github_like_schema,
+    "k8s_like": k8s_like_schema,
+    "recursive": recursive_schema,
+    "wide_enum": wide_enum_schema,
+}
+
+def time_pass(params, infer):
+    """One lookup per argument, return (elapsed_s, inferred types)"""
+    types = {}
+    t_start = time.perf_counter()
+    for key, spec in params["properties"].items():
+        types[key] = infer(spec)
+    return time.perf_counter() - t_start, types
+
+def main():
+    os.makedirs("results", exist_ok=True)
+
+    print("=" * 90)
+    print("  Parser Test: argument type inference over $ref-heavy tool schemas")
+    print(f"  best of {REPEATS} passes, one lookup per argument")
+    print("=" * 90)
+
+    results = []
+    for name, builder in CORPUS.items():
+        params = builder()
+        n_args = len(params["properties"])
+
+        legacy_s = min(time_pass(params, legacy_infer_type_from_json_schema)[0] for _ in range(REPEATS))
+        _, legacy_types = time_pass(params, legacy_infer_type_from_json_schema)
+
+        cold = []
+        for _ in range(REPEATS):
+            # A fresh copy defeats the per-root memo, as for a never-seen tools list
+            fresh = copy.deepcopy(params)
+            schema_resolvers.clear()
+            cold.append(time_pass(fresh, lambda spec: infer_type_from_json_schema(spec, root=fresh)))
+        cold_s = min(c[0] for c in cold)
+        new_types = cold[0][1]
+        warm_s = min(time_pass(params, lambda spec: infer_type_from_json_schema(spec, root=params))[0] for _ in range(REPEATS + 1))
+
+        results.append({
+            "schema": name,
+            "arguments": n_args,
+            "schema_kb": round(len(json.dumps(params)) / 1024, 1),
+            "legacy_us_per_arg": round(legacy_s * 1e6 / n_args, 2),
+            "cold_us_per_arg": round(cold_s * 1e6 / n_args, 2),
+            "warm_us_per_arg": round(warm_s * 1e6 / n_args, 2),
+            "legacy_unresolved": sum(1 for t in legacy_types.values() if t is None),
+            "unresolved": sum(1 for t in new_types.values() if t is None),
+        })
+
+    print(f"\n{'Schema':>12} | {'Args':>5} | {'KB':>6} | {'Legacy µs/arg':>13} | {'Cold µs/arg':>11} | {'Warm µs/arg':>11} | {'Unresolved (old→new)':>20}")
+    print("-" * 90)
+    for r in results:
+        unresolved = f"{r['legacy_unresolved']} → {r['unresolved']}"
+        print(f"{r['schema']:>12} | {r['arguments']:>5} | {r['schema_kb']:>6.1f} | {r['legacy_us_per_arg']:>13.2f} | {r['cold_us_per_arg']:>11.2f} | {r['warm_us_per_arg']:>11.2f} | {unresolved:>20}")
+    print("\nUnresolved = arguments typed as None (falls back to value sniffing); pure $ref cycles stay None by design.")
+
+    csv_path = "results/schema_inference.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {csv_path}")
+
+    with open("results/schema_inference.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
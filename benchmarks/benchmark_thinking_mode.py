@@ -3,11 +3,16 @@
 import time
 import json
 import csv
+import itertools
 import os
+import statistics
 from openai import OpenAI
+from sample_stats import describe, repeat_until_tight
+from token_counting import STREAM_OPTIONS, StreamTokenCounter, count_tokens, load_tokenizer
 
-client = OpenAI(base_url="http://localhost:30000/v1", api_key="none")
+client = OpenAI(base_url=os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1"), api_key="none")
 MODEL = "zai-org/GLM-4.7-FP8"
+TOKENIZER = load_tokenizer()  # optional: GLM_TOKENIZER=/path/to/model for per-chunk and reasoning counts
 
 tools = [
     {"type": "function", "function": {
@@ -44,9 +49,7 @@ def measure_mode(mode_config):
     ]
     
     t_start = time.perf_counter()
-    first_token_time = None
-    last_token_time = None
-    token_count = 0
+    counter = StreamTokenCounter(TOKENIZER)
     tool_calls_acc = {}
     content_acc = ""
     reasoning_acc = ""
@@ -54,7 +57,7 @@ def measure_mode(mode_config):
     try:
         kwargs = dict(
             model=MODEL, messages=messages, tools=tools, tool_choice="auto",
-            max_tokens=1024, stream=True, temperature=0.7,
+            max_tokens=1024, stream=True, stream_options=STREAM_OPTIONS, temperature=0.7,
         )
         if mode_config.get("extra_body"):
             kwargs["extra_body"] = mode_config["extra_body"]
@@ -62,25 +65,14 @@ def measure_mode(mode_config):
         stream = client.chat.completions.create(**kwargs)
         
         for chunk in stream:
-            now = time.perf_counter()
+            counter.add_chunk(time.perf_counter(), chunk)
             if chunk.choices and chunk.choices[0].delta:
                 delta = chunk.choices[0].delta
                 if delta.content:
-                    if first_token_time is None:
-                        first_token_time = now
-                    last_token_time = now
-                    token_count += 1
                     content_acc += delta.content
                 if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                    if first_token_time is None:
-                        first_token_time = now
-                    last_token_time = now
-                    token_count += 1
                     reasoning_acc += delta.reasoning_content
                 if delta.tool_calls:
-                    if first_token_time is None:
-                        first_token_time = now
-                    last_token_time = now
                     for tc in delta.tool_calls:
                         idx = tc.index
                         if idx not in tool_calls_acc:
@@ -89,19 +81,14 @@ def measure_mode(mode_config):
                             tool_calls_acc[idx]["name"] = tc.function.name
                         if tc.function.arguments:
                             tool_calls_acc[idx]["arguments"] += tc.function.arguments
-                        token_count += 1
         
         t_end = time.perf_counter()
         
-        if first_token_time is None:
-            return {"ttft_ms": 0, "total_ms": 0, "decode_toks": 0, "tool_calls": 0, "correct": False, "reasoning_tokens": 0}
+        m = counter.summary(t_start)
+        if m is None:
+            return {"ttft_ms": 0, "total_ms": 0, "decode_toks": 0, "output_tokens": 0, "tool_calls": 0, "correct": False, "reasoning_tokens": 0}
         
-        ttft_ms = (first_token_time - t_start) * 1000
         total_ms = (t_end - t_start) * 1000
-        if token_count > 1 and last_token_time > first_token_time:
-            decode_toks = (token_count - 1) / (last_token_time - first_token_time)
-        else:
-            decode_toks = 0
         
         # Check correctness: should call read_file with /etc/hostname
         correct = False
@@ -111,18 +98,20 @@ def measure_mode(mode_config):
                 break
         
         return {
-            "ttft_ms": round(ttft_ms, 1),
+            "ttft_ms": round(m["ttft_ms"], 1),
             "total_ms": round(total_ms, 1),
-            "decode_toks": round(decode_toks, 2),
+            "decode_toks": round(m["decode_toks"], 2),
+            "output_tokens": m["output_tokens"],
             "tool_calls": len(tool_calls_acc),
             "correct": correct,
-            "reasoning_tokens": len(reasoning_acc) // 4,  # rough estimate
+            # exact with a tokenizer, rough estimate otherwise
+            "reasoning_tokens": count_tokens(TOKENIZER, reasoning_acc) if TOKENIZER else len(reasoning_acc) // 4,
             "tools": tool_calls_acc,
             "content": content_acc[:200],
         }
     except Exception as e:
         print(f"  ERROR: {e}")
-        return {"ttft_ms": 0, "total_ms": 0, "decode_toks": 0, "tool_calls": 0, "correct": False, "reasoning_tokens": 0}
+        return {"ttft_ms": 0, "total_ms": 0, "decode_toks": 0, "output_tokens": 0, "tool_calls": 0, "correct": False, "reasoning_tokens": 0}
 
 def main():
     os.makedirs("results", exist_ok=True)
@@ -135,41 +124,59 @@ def main():
     
     for mode in MODES:
         print(f"\n--- {mode['name']} ---")
-        result = measure_mode(mode)
+        rounds = itertools.count(1)
         
-        icon = "✅" if result["correct"] else "❌"
-        print(f"  TTFT={result['ttft_ms']:.0f}ms, Total={result['total_ms']:.0f}ms, Decode={result['decode_toks']:.1f} tok/s")
-        print(f"  Tool calls: {result['tool_calls']}, Correct: {icon}")
-        if result.get("tools"):
-            for idx, tc in result["tools"].items():
-                print(f"    [{idx}] {tc['name']}({tc['arguments'][:60]})")
-        if result["reasoning_tokens"] > 0:
-            print(f"  Reasoning tokens: ~{result['reasoning_tokens']}")
-        if result.get("content"):
-            print(f"  Content: {result['content'][:100]}...")
+        def measure_round():
+            print(f"  Round {next(rounds)}:")
+            result = measure_mode(mode)
+            if result["total_ms"] == 0:
+                return None
+            icon = "✅" if result["correct"] else "❌"
+            print(f"  TTFT={result['ttft_ms']:.0f}ms, Total={result['total_ms']:.0f}ms, Decode={result['decode_toks']:.1f} tok/s")
+            print(f"  Tool calls: {result['tool_calls']}, Correct: {icon}")
+            if result.get("tools"):
+                for idx, tc in result["tools"].items():
+                    print(f"    [{idx}] {tc['name']}({tc['arguments'][:60]})")
+            if result["reasoning_tokens"] > 0:
+                print(f"  Reasoning tokens: {'' if TOKENIZER else '~'}{result['reasoning_tokens']}")
+            if result.get("content"):
+                print(f"  Content: {result['content'][:100]}...")
+            return result
+        
+        # Repeat until the median total time is known to ±5% (3 to 10 rounds)
+        rounds_ok = repeat_until_tight(measure_round, key=lambda r: r["total_ms"])
+        
+        def median_of(key, digits=1):
+            return round(statistics.median(r[key] for r in rounds_ok), digits) if rounds_ok else 0
         
         results.append({
             "mode": mode["name"],
-            "ttft_ms": result["ttft_ms"],
-            "total_ms": result["total_ms"],
-            "decode_toks": result["decode_toks"],
-            "tool_calls": result["tool_calls"],
-            "correct": result["correct"],
-            "reasoning_tokens": result.get("reasoning_tokens", 0),
+            "ttft_ms": median_of("ttft_ms"),
+            "total_ms": median_of("total_ms"),
+            "decode_toks": median_of("decode_toks", 2),
+            "output_tokens": median_of("output_tokens", 0),
+            "tool_calls": median_of("tool_calls", 0),
+            # a mode is correct only if every round called the right tool
+            "correct": bool(rounds_ok) and all(r["correct"] for r in rounds_ok),
+            "reasoning_tokens": median_of("reasoning_tokens", 0),
+            "repeats": len(rounds_ok),
+            "stats": {key: describe([r[key] for r in rounds_ok], 1)
+                      for key in ("ttft_ms", "total_ms", "decode_toks", "output_tokens", "reasoning_tokens")},
         })
     
     # Summary
     print("\n" + "=" * 90)
-    print(f"{'Mode':>22} | {'TTFT (ms)':>10} | {'Total (ms)':>11} | {'Decode tok/s':>13} | {'Tools':>6} | {'OK':>4}")
-    print("-" * 80)
+    print(f"{'Mode':>22} | {'TTFT (ms)':>10} | {'Total (ms)':>11} | {'Total p90':>10} | {'Decode tok/s':>13} | {'Tools':>6} | {'OK':>4} | {'N':>3}")
+    print("-" * 100)
     for r in results:
         icon = "✅" if r["correct"] else "❌"
-        print(f"{r['mode']:>22} | {r['ttft_ms']:>10.1f} | {r['total_ms']:>11.1f} | {r['decode_toks']:>13.2f} | {r['tool_calls']:>6} | {icon:>4}")
+        total_p90 = r["stats"]["total_ms"]["p90"] if r["stats"]["total_ms"] else 0
+        print(f"{r['mode']:>22} | {r['ttft_ms']:>10.1f} | {r['total_ms']:>11.1f} | {total_p90:>10.1f} | {r['decode_toks']:>13.2f} | {r['tool_calls']:>6} | {icon:>4} | {r['repeats']:>3}")
     
     # Save
     csv_path = "results/test4_thinking_mode.csv"
     with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer = csv.DictWriter(f, fieldnames=[k for k in results[0] if k != "stats"], extrasaction="ignore")
         writer.writeheader()
         writer.writerows(results)
     print(f"\nSaved to {csv_path}")
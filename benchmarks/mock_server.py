@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Mock Server: OpenAI-compatible stand-in for the sglang cluster, for running the benchmarks offline
+
+Serves /v1/chat/completions (streaming and not) and /v1/models with no GPU
+and only the standard library. Responses look like GLM-4.7 behind
+`--tool-call-parser glm47 --reasoning-parser glm45`:
+  - reasoning_content first unless chat_template_kwargs.enable_thinking is false
+  - with tools, a <tool_call>name<arg_key>..</arg_key><arg_value>..</arg_value></tool_call>
+    call for the tool whose name best matches the last user message, run
+    through the glm47 detector from patches/ when sglang is importable
+    (otherwise a built-in streamer), so the parser is part of the load
+  - after a tool result, or without tools, plain text up to --output-tokens
+
+Timing follows bandwidth_model.py: TTFT = --ttft-overhead-ms + uncached
+prompt tokens / --prefill-toks (prefills run one at a time, as in sglang),
+then every decode step takes (W + Σ KV of all running requests) / (β×TP×η),
+so context length and concurrency slow decode the way Test 1 and Test 5
+expect. --accept-len > 1 emits that many tokens per step on average, like
+EAGLE. A prefix cache keyed on the serialized tools + messages skips the
+prefill of a repeated prefix; --enable-cache-report adds
+usage.prompt_tokens_details.cached_tokens like sglang's flag of that name;
+--enable-metrics serves sglang's prompt/cached/generation token counters.
+
+Usage:
+  python mock_server.py --port 30000 --time-scale 0.1
+  BENCH_BASE_URL=http://localhost:30000/v1 python benchmark_agentic_workflow.py
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bandwidth_model import MEASURED_EFFICIENCY, decode_step_s
+from token_counting import count_tokens, load_tokenizer
+
+MODEL = "zai-org/GLM-4.7-FP8"
+PORT = 30000
+TTFT_OVERHEAD_MS = 120  # Test 1 TTFT at 512 tokens (RESULTS.md)
+PREFILL_TOKS = 4000  # placeholder: set from a Test 1 run with PROMPT_CACHE_MODE=unique
+OUTPUT_TOKENS = 256  # length of a plain-text answer, capped by max_tokens
+REASONING_TOKENS = 48
+TOOL_CONTENT_TOKENS = 200  # generated file content for "content"-like string arguments
+CACHE_ENTRIES = 256
+CHARS_PER_TOKEN = 4  # prompt estimate without GLM_TOKENIZER
+METRIC_COUNTERS = ("prompt_tokens_total", "cached_tokens_total", "generation_tokens_total")
+
+REASONING_TEXT = ("The user wants this done step by step. I should check what is being asked, "
+                  "pick the right tool if one fits, and keep the answer short. ")
+ANSWER_TEXT = ("The memory bandwidth of each node bounds the decode rate, so every step reads the active "
+               "weights once and then the cached keys and values of each sequence in the batch. ")
+# Special tokens are one token each; other text splits into short word pieces
+_TOKEN_REGEX = re.compile(r"</?\w+>|\s?\w{1,8}|\s?[^\w\s]|\s+")
+
+def split_tokens(text):
+    return _TOKEN_REGEX.findall(text)
+
+def repeat_tokens(text, n):
+    """The first n tokens of text repeated"""
+    pieces = split_tokens(text)
+    return "".join(itertools.islice(itertools.cycle(pieces), n))
+
+class PrefixCache:
+    """Longest shared prefix with recent prompts, in characters (a radix cache without the tree)"""
+
+    def __init__(self, maxsize=CACHE_ENTRIES):
+        self._entries = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+
+    def match_and_insert(self, text):
+        with self._lock:
+            best = max((len(os.path.commonprefix([text, e])) for e in self._entries), default=0)
+            self._entries.append(text)
+        return best
+
+class Engine:
+    """Shared scheduler state: one prefill at a time, decode steps batched over running requests"""
+
+    def __init__(self, args):
+        self.args = args
+        self.tokenizer = load_tokenizer()
+        self.cache = None if args.disable_radix_cache else PrefixCache()
+        self._prefill_lock = threading.Lock()
+        self._running = {}  # request id -> current context length
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(METRIC_COUNTERS, 0)
+
+    def prompt_tokens(self, text):
+        if self.tokenizer is not None:
+            return count_tokens(self.tokenizer, text)
+        return max(1, len(text) // CHARS_PER_TOKEN)
+
+    def prefill(self, body):
+        """Sleep for the prefill; return (prompt_tokens, cached_tokens)"""
+        # Tools are rendered before the conversation, so a growing history keeps its prefix
+        text = json.dumps(body.get("tools") or []) + "".join(json.dumps(m, sort_keys=True) for m in body["messages"])
+        total = self.prompt_tokens(text)
+        cached = 0
+        if self.cache is not None:
+            cached = total * self.cache.match_and_insert(text) // len(text)
+        time.sleep(self.args.ttft_overhead_ms / 1000 * self.args.time_scale)
+        with self._prefill_lock:
+            time.sleep((total - cached) / self.args.prefill_toks * self.args.time_scale)
+        self.count(prompt_tokens_total=total, cached_tokens_total=cached)
+        return total, cached
+
+    def count(self, **increments):
+        with self._lock:
+            for name, n in increments.items():
+                self.counters[name] += n
+
+    def metrics_text(self):
+        """Prometheus text in the shape of sglang's --enable-metrics counters"""
+        with self._lock:
+            return "".join(f'sglang:{name}{{model_name="{MODEL}"}} {value}\n' for name, value in self.counters.items())
+
+    def decode_steps(self, request_id, context_len, n_tokens):
+        """Yield the number of tokens produced by each decode step, sleeping for the step first"""
+        emitted, credit = 0, 0.0
+        try:
+            while emitted < n_tokens:
+                with self._lock:
+                    self._running[request_id] = context_len + emitted
+                    step = decode_step_s(self._running.values(), self.args.efficiency)
+                time.sleep(step * self.args.time_scale)
+                credit += self.args.accept_len
+                k = min(n_tokens - emitted, max(1, int(credit)))
+                credit -= k
+                emitted += k
+                self.count(generation_tokens_total=k)
+                yield k
+        finally:
+            with self._lock:
+                self._running.pop(request_id, None)
+
+def extract_path(text):
+    match = re.search(r"(/[\w.\-/]+|[\w\-]+\.\w+)", text)
+    return match.group(1).rstrip(".") if match else "README.md"
+
+def argument_value(key, spec, user_text):
+    """A plausible value for one argument, as it appears between <arg_value> tags"""
+    if spec.get("enum"):
+        value = spec["enum"][0]
+        return value if isinstance(value, str) else json.dumps(value)
+    arg_type = spec.get("type", "string")
+    if arg_type in ("integer", "number"):
+        return "10"
+    if arg_type == "boolean":
+        return "true"
+    if arg_type == "array":
+        return '["a", "b"]'
+    if arg_type == "object":
+        return "{}"
+    if "path" in key or "file" in key:
+        return extract_path(user_text)
+    if "command" in key:
+        return f"python3 {extract_path(user_text)}"
+    if "content" in key or "code" in key:
+        return "".join(f'print("line {i}")\n' for i in range(TOOL_CONTENT_TOKENS // 6))
+    words = re.findall(r"\b[A-Z][a-z]+\b", user_text)
+    return words[-1] if words else "example"
+
+def pick_tool(tools, user_text):
+    """The tool sharing most words with the message (name parts like read/file); ties go to the first"""
+    words = set(re.findall(r"[a-z]+", user_text.lower()))
+    return max(tools, key=lambda t: len(words & set(t["function"]["name"].split("_"))))["function"]
+
+def tool_call_text(function, user_text):
+    params = function.get("parameters") or {}
+    properties = params.get("properties") or {}
+    keys = params.get("required") or []
+    args = "".join(
+        f"<arg_key>{key}</arg_key><arg_value>{argument_value(key, properties.get(key, {}), user_text)}</arg_value>"
+        for key in keys
+    )
+    return f"<tool_call>{function['name']}{args}</tool_call>"
+
+def message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):  # content parts
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+def plan_output(body, args):
+    """(reasoning text, raw assistant text) the mock model will generate for this request"""
+    kwargs = body.get("chat_template_kwargs") or {}
+    reasoning = repeat_tokens(REASONING_TEXT, args.reasoning_tokens) if kwargs.get("enable_thinking", True) else ""
+    last = body["messages"][-1]
+    tools = body.get("tools") or []
+    if tools and body.get("tool_choice", "auto") != "none" and last.get("role") == "user":
+        return reasoning, tool_call_text(pick_tool(tools, message_text(last)), message_text(last))
+    return reasoning, repeat_tokens(ANSWER_TEXT, args.output_tokens)
+
+class BuiltinToolStreamer:
+    """Stands in for the glm47 detector when sglang is not installed
+
+    Streams the name once it is complete, then the JSON arguments spread
+    evenly over the remaining tokens of the call.
+    """
+
+    _CALL_REGEX = re.compile(r"<tool_call>(\w+)(.*?)</tool_call>", re.DOTALL)
+    _ARG_REGEX = re.compile(r"<arg_key>(.*?)</arg_key><arg_value>(.*?)</arg_value>", re.DOTALL)
+
+    def __init__(self, tools, text):
+        self.tools = {t["function"]["name"]: t["function"] for t in tools}
+        self.calls = [(m.start(), m.end(), m.group(1), self._arguments(m.group(1), m.group(2)))
+                      for m in self._CALL_REGEX.finditer(text)]
+        self._pos = 0
+        self._sent = {}  # call index -> characters of arguments sent
+
+    def _arguments(self, name, body):
+        properties = ((self.tools.get(name) or {}).get("parameters") or {}).get("properties") or {}
+        arguments = {}
+        for key, value in self._ARG_REGEX.findall(body):
+            if properties.get(key, {}).get("type", "string") == "string":
+                arguments[key] = value
+            else:
+                arguments[key] = json.loads(value)
+        return json.dumps(arguments, ensure_ascii=False)
+
+    def feed(self, piece):
+        """(normal text, [(index, name or None, arguments delta)]) for the next piece of raw text"""
+        start_pos, self._pos = self._pos, self._pos + len(piece)
+        normal, deltas = "", []
+        for i, (start, end, name, arguments) in enumerate(self.calls):
+            name_end = start + len("<tool_call>") + len(name)
+            if self._pos < name_end:
+                continue
+            if i not in self._sent:
+                deltas.append((i, name, ""))
+                self._sent[i] = 0
+            share = len(arguments) if self._pos >= end else \
+                len(arguments) * (self._pos - name_end) // max(1, end - name_end)
+            if share > self._sent[i]:
+                deltas.append((i, None, arguments[self._sent[i]:share]))
+                self._sent[i] = share
+        for pos, ch in enumerate(piece, start_pos):
+            if not any(start <= pos < end for start, end, _, _ in self.calls):
+                normal += ch
+        return normal, deltas
+
+def make_tool_streamer(args, tools, text):
+    """Callable turning raw text pieces into (normal text, tool call deltas), per --tool-call-parser"""
+    if not tools or args.tool_call_parser == "none":
+        return lambda piece: (piece, [])
+    if args.tool_call_parser == "glm47":
+        from glm47_moe_detector import Glm47MoeDetector
+        from sglang.srt.entrypoints.openai.protocol import Tool
+        detector, sgl_tools = Glm47MoeDetector(), [Tool(**t) for t in tools]
+
+        def feed(piece):
+            result = detector.parse_streaming_increment(piece, sgl_tools)
+            return result.normal_text, [(c.tool_index, c.name, c.parameters) for c in result.calls]
+        return feed
+    return BuiltinToolStreamer(tools, text).feed
+
+def chunk_json(request_id, delta, finish_reason=None):
+    return {"id": request_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": MODEL,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+def usage_json(prompt_tokens, cached_tokens, completion_tokens, cache_report):
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens}
+    if cache_report:
+        usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+    return usage
+
+def generate(engine, body):
+    """Yield ("delta", delta dict) per decode step, then ("done", finish_reason, usage)"""
+    args = engine.args
+    request_id = f"chatcmpl-{uuid.uuid4().hex}"
+    reasoning, text = plan_output(body, args)
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or 4096
+    reasoning_pieces = split_tokens(reasoning)[:max_tokens]
+    text_pieces = split_tokens(text)[:max_tokens - len(reasoning_pieces)]
+    truncated = len(reasoning_pieces) + len(text_pieces) < len(split_tokens(reasoning)) + len(split_tokens(text))
+    tools = body.get("tools") or []
+    feed = make_tool_streamer(args, tools, text)
+    call_ids = {}
+
+    prompt_tokens, cached_tokens = engine.prefill(body)
+    pieces = [("reasoning_content", p) for p in reasoning_pieces] + [("content", p) for p in text_pieces]
+    pos = 0
+    for k in engine.decode_steps(request_id, prompt_tokens, len(pieces)):
+        step, pos = pieces[pos:pos + k], pos + k
+        delta = {"role": "assistant"} if pos == k else {}
+        reasoning_part = "".join(p for field, p in step if field == "reasoning_content")
+        if reasoning_part:
+            delta["reasoning_content"] = reasoning_part
+        normal, calls = feed("".join(p for field, p in step if field == "content"))
+        if normal:
+            delta["content"] = normal
+        for index, name, arguments in calls:
+            tool_call = {"index": index, "function": {"arguments": arguments}}
+            if name:
+                call_ids[index] = tool_call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+                tool_call["type"] = "function"
+                tool_call["function"]["name"] = name
+            delta.setdefault("tool_calls", []).append(tool_call)
+        yield request_id, "delta", delta
+    finish_reason = "tool_calls" if call_ids else "length" if truncated else "stop"
+    yield request_id, "done", finish_reason, usage_json(prompt_tokens, cached_tokens, len(pieces), args.enable_cache_report)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    engine = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, obj):
+        data = f"data: {obj if isinstance(obj, str) else json.dumps(obj)}\n\n".encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": MODEL, "object": "model", "owned_by": "mock"}]})
+        elif self.path == "/metrics" and self.engine.args.enable_metrics:
+            data = self.engine.metrics_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path == "/health":
+            self._send_json(200, {})
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not body.get("messages"):
+            self._send_json(400, {"error": {"message": "messages is required"}})
+            return
+        try:
+            if body.get("stream"):
+                self._stream(body)
+            else:
+                self._complete(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away; decode_steps has already released the slot
+
+    def _stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        for event in generate(self.engine, body):
+            if event[1] == "delta":
+                if event[2]:
+                    self._send_event(chunk_json(event[0], event[2]))
+                continue
+            request_id, _, finish_reason, usage = event
+            self._send_event(chunk_json(request_id, {}, finish_reason))
+            if include_usage:
+                self._send_event({**chunk_json(request_id, {}), "choices": [], "usage": usage})
+        self._send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _complete(self, body):
+        message = {"role": "assistant", "content": "", "reasoning_content": None, "tool_calls": None}
+        calls = {}
+        for event in generate(self.engine, body):
+            if event[1] == "done":
+                request_id, _, finish_reason, usage = event
+                break
+            delta = event[2]
+            message["content"] += delta.get("content", "")
+            if delta.get("reasoning_content"):
+                message["reasoning_content"] = (message["reasoning_content"] or "") + delta["reasoning_content"]
+            for tc in delta.get("tool_calls", []):
+                call = calls.setdefault(tc["index"], {"id": tc.get("id"), "type": "function",
+                                                      "function": {"name": "", "arguments": ""}})
+                call["function"]["name"] += tc["function"].get("name") or ""
+                call["function"]["arguments"] += tc["function"]["arguments"] or ""
+        if calls:
+            message["tool_calls"] = [calls[i] for i in sorted(calls)]
+        message["content"] = message["content"] or None
+        self._send_json(200, {"id": request_id, "object": "chat.completion", "created": int(time.time()), "model": MODEL,
+                              "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                              "usage": usage})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--prefill-toks", type=float, default=PREFILL_TOKS, help="uncached prompt tokens per second")
+    parser.add_argument("--ttft-overhead-ms", type=float, default=TTFT_OVERHEAD_MS)
+    parser.add_argument("--efficiency", type=float, default=MEASURED_EFFICIENCY,
+                        help="η: fraction of the theoretical decode bandwidth reached (default: %(default)s)")
+    parser.add_argument("--accept-len", type=float, default=1.0, help="mean tokens per decode step (EAGLE: >1)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply every delay, e.g. 0.1 for a 10x faster run")
+    parser.add_argument("--output-tokens", type=int, default=OUTPUT_TOKENS)
+    parser.add_argument("--reasoning-tokens", type=int, default=REASONING_TOKENS)
+    parser.add_argument("--tool-call-parser", choices=["glm47", "builtin", "none"], default="glm47",
+                        help="glm47 runs patches/glm47_moe_detector.py (needs sglang); none returns raw XML as content")
+    parser.add_argument("--enable-cache-report", action="store_true", help="report usage.prompt_tokens_details.cached_tokens")
+    parser.add_argument("--enable-metrics", action="store_true", help="serve sglang-style token counters on /metrics")
+    parser.add_argument("--disable-radix-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.tool_call_parser == "glm47":
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+        try:
+            import glm47_moe_detector  # noqa: F401
+        except ImportError as e:
+            print(f"  WARNING: glm47 detector unavailable ({e}); using the built-in tool call streamer")
+            args.tool_call_parser = "builtin"
+
+    Handler.engine = Engine(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print("=" * 70)
+    print(f"  Mock Server: {MODEL} on http://{args.host}:{args.port}/v1")
+    print(f"  prefill {args.prefill_toks:.0f} tok/s + {args.ttft_overhead_ms:.0f} ms, decode η={args.efficiency}, "
+          f"accept len {args.accept_len}, time scale {args.time_scale}")
+    print(f"  tool call parser: {args.tool_call_parser}, radix cache: {'off' if args.disable_radix_cache else 'on'}, "
+          f"prompt tokens: {'GLM_TOKENIZER' if Handler.engine.tokenizer else f'~{CHARS_PER_TOKEN} chars/token'}")
+    print("=" * 70, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Fused MoE kernel config files for GLM-4.7-FP8 on GB10: shapes, loading, launch-parameter checks
+
+A config file maps batch sizes ("1" .. "4096") to Triton launch parameters
+for SGLang's fused_moe_kernel. SGLang loads two per model: the up
+projection (w13) file and a _down.json for the down projection (w2), and
+picks the entry whose key is nearest to the number of tokens M. Nothing
+here needs torch or a GPU, so configs can be checked on any machine.
+
+shared_memory_bytes() is a static estimate of what Triton allocates for
+one program: the software pipeline keeps num_stages - 1 A and B tiles in
+flight (the README's 147,456 bytes is the fp8 default, 128x256x128 with 4
+stages: 3 x (128x128 + 128x256) x 1 byte). Entries over the device limit
+fail to compile with OutOfResources when the server first sees that M.
+"""
+import glob
+import json
+import os
+import re
+
+REPO_CONFIGS = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "configs"))
+CONFIG_FILE = "E=160,N=384,device_name=NVIDIA_GB10,dtype=fp8_w8a8.json"
+DOWN_SUFFIX = "_down.json"
+
+# GLM-4.7-FP8 at TP=4: 160 routed experts, top-8, moe_intermediate_size 1536 / 4
+NUM_EXPERTS = 160
+TOP_K = 8
+INTERMEDIATE = 384  # N in the file name
+HIDDEN = 5120
+# (output dim, reduction dim) of each GEMM: up writes gate+up (2N), down reads N
+GEMM_SHAPES = {"up": (2 * INTERMEDIATE, HIDDEN), "down": (HIDDEN, INTERMEDIATE)}
+
+# Batch sizes the SGLang tuner writes
+BATCH_SIZES = [1, 2, 4, 8, 16, 24, 32, 48, 64, 96, 128, 256, 512, 1024, 1536, 2048, 3072, 4096]
+LAUNCH_KEYS = ("BLOCK_SIZE_M", "BLOCK_SIZE_N", "BLOCK_SIZE_K", "GROUP_SIZE_M", "num_warps", "num_stages")
+OPTIONAL_KEYS = {"down": ("USE_TMA",), "up": ()}
+MIN_BLOCK = 16  # tl.dot needs every block dimension >= 16
+MAX_WARPS = 32
+MAX_GRID_X = 2 ** 31 - 1
+
+# Largest shared memory allocation one program may use (opt-in limit), by the device_name in file names
+DEVICE_PROFILES = {
+    "NVIDIA_GB10": {"shared_memory_bytes": 101376},
+    "NVIDIA_GeForce_RTX_4090": {"shared_memory_bytes": 101376},
+    "NVIDIA_A100-SXM4-80GB": {"shared_memory_bytes": 166912},
+    "NVIDIA_H100_80GB_HBM3": {"shared_memory_bytes": 232448},
+    "NVIDIA_H200": {"shared_memory_bytes": 232448},
+}
+DEFAULT_DEVICE = "NVIDIA_GB10"
+# (activation bytes, weight bytes) of the tiles staged in shared memory, by the dtype in file names
+ELEMENT_BYTES = {"fp8_w8a8": (1, 1), "int8_w8a8": (1, 1), "int8_w8a16": (2, 1), None: (2, 2)}
+OUTPUT_BYTES = 2  # bf16 accumulator written back through shared memory in the epilogue
+MAX_REGISTERS_PER_THREAD = 255
+REGISTER_OVERHEAD = 40  # pointers, masks, offsets and scales besides the tiles
+
+def default_config_dir():
+    """configs/triton_<installed triton> (the newest set if there is none for it)"""
+    dirs = sorted(d for d in os.listdir(REPO_CONFIGS) if d.startswith("triton_"))
+    try:
+        import triton
+        installed = "triton_" + "_".join(triton.__version__.split("+")[0].split(".")[:3])
+    except ImportError:
+        installed = None
+    return os.path.join(REPO_CONFIGS, installed if installed in dirs else dirs[-1])
+
+def down_path(path):
+    return path[:-len(".json")] + DOWN_SUFFIX
+
+def parse_name(path):
+    """{"E", "N", "device_name", "dtype", "down"} from a config file name"""
+    name = os.path.basename(path)
+    fields = dict(re.findall(r"([A-Za-z_]+)=([^,]+?)(?=,|_down\.json$|\.json$)", name))
+    return {"E": int(fields["E"]), "N": int(fields["N"]), "device_name": fields.get("device_name"),
+            "dtype": fields.get("dtype"), "down": name.endswith(DOWN_SUFFIX)}
+
+def load_table(path):
+    """{M: launch parameters} from one config file"""
+    with open(path) as f:
+        return {int(key): value for key, value in json.load(f).items()}
+
+def save_table(path, table):
+    """Write {M: launch parameters} in the layout of the files under configs/"""
+    with open(path, "w") as f:
+        json.dump({str(m): table[m] for m in sorted(table)}, f, indent=4)
+        f.write("\n")
+
+def load_pair(path):
+    """(up table, down table or None) for an up-projection config file"""
+    down = down_path(path)
+    return load_table(path), load_table(down) if os.path.isfile(down) else None
+
+def find_config_files(root):
+    """Every up-projection config file under root (a file, a triton_* dir or configs/)"""
+    if os.path.isfile(root):
+        return [root]
+    return sorted(p for p in glob.glob(os.path.join(root, "**", "E=*.json"), recursive=True)
+                  if not p.endswith(DOWN_SUFFIX))
+
+def nearest(table, m):
+    """The entry SGLang uses for M tokens"""
+    return table[min(table, key=lambda key: abs(key - m))]
+
+def default_config(m):
+    """SGLang's get_default_config() for per-tensor fp8_w8a8 (used when no file matches)"""
+    if m <= NUM_EXPERTS:
+        return {"BLOCK_SIZE_M": 64, "BLOCK_SIZE_N": 128, "BLOCK_SIZE_K": 128, "GROUP_SIZE_M": 1,
+                "num_warps": 4, "num_stages": 4}
+    return {"BLOCK_SIZE_M": 128, "BLOCK_SIZE_N": 256, "BLOCK_SIZE_K": 128, "GROUP_SIZE_M": 32,
+            "num_warps": 8, "num_stages": 4}
+
+def grid_size(config, m, gemm):
+    """Programs launched by fused_moe_kernel for M tokens (worst-case padding of moe_align_block_size)"""
+    block_m, block_n = config["BLOCK_SIZE_M"], config["BLOCK_SIZE_N"]
+    padded_tokens = m * TOP_K + (NUM_EXPERTS + 1) * (block_m - 1)
+    return -(-padded_tokens // block_m) * -(-GEMM_SHAPES[gemm][0] // block_n)
+
+def shared_memory_bytes(config, dtype="fp8_w8a8"):
+    """Estimated shared memory of one fused_moe_kernel program for a config entry"""
+    a_bytes, b_bytes = ELEMENT_BYTES.get(dtype, ELEMENT_BYTES[None])
+    block_m, block_n, block_k = config["BLOCK_SIZE_M"], config["BLOCK_SIZE_N"], config["BLOCK_SIZE_K"]
+    pipeline = max(1, config["num_stages"] - 1) * (block_m * block_k * a_bytes + block_k * block_n * b_bytes)
+    return max(pipeline, block_m * block_n * OUTPUT_BYTES)
+
+def registers_per_thread(config, dtype="fp8_w8a8"):
+    """Estimated registers per thread: the fp32 accumulator plus one A and B tile spread over the warps
+
+    Beyond MAX_REGISTERS_PER_THREAD the kernel spills to local memory.
+    """
+    a_bytes, b_bytes = ELEMENT_BYTES.get(dtype, ELEMENT_BYTES[None])
+    block_m, block_n, block_k = config["BLOCK_SIZE_M"], config["BLOCK_SIZE_N"], config["BLOCK_SIZE_K"]
+    threads = config["num_warps"] * 32
+    tiles = (block_m * block_k * a_bytes + block_k * block_n * b_bytes) // 4
+    return -(-(block_m * block_n + tiles) // threads) + REGISTER_OVERHEAD
+
+def check_shared_memory(config, device=DEFAULT_DEVICE, dtype="fp8_w8a8"):
+    """[problem] if the entry overflows the device's shared memory, else []"""
+    limit = DEVICE_PROFILES[device]["shared_memory_bytes"]
+    needed = shared_memory_bytes(config, dtype)
+    return [f"shared memory {needed:,} > {limit:,} bytes"] if needed > limit else []
+
+def check_launch(config, m, gemm, device=None, dtype="fp8_w8a8"):
+    """Problems that would stop fused_moe_kernel from compiling or launching; [] if none
+
+    With a device, entries are also checked against its shared memory limit.
+    """
+    problems = []
+    missing = [key for key in LAUNCH_KEYS if key not in config]
+    unknown = [key for key in config if key not in LAUNCH_KEYS + OPTIONAL_KEYS[gemm]]
+    if missing:
+        problems.append(f"missing {', '.join(missing)}")
+    if unknown:
+        problems.append(f"unknown {', '.join(unknown)}")
+    if missing:
+        return problems
+    if not all(isinstance(config[key], int) and not isinstance(config[key], bool) for key in LAUNCH_KEYS):
+        return problems + ["launch parameters must be integers"]
+    for key in ("BLOCK_SIZE_M", "BLOCK_SIZE_N", "BLOCK_SIZE_K"):
+        value = config[key]
+        if value < MIN_BLOCK or value & (value - 1):
+            problems.append(f"{key}={value} is not a power of two >= {MIN_BLOCK}")
+    warps = config["num_warps"]
+    if warps < 1 or warps > MAX_WARPS or warps & (warps - 1):
+        problems.append(f"num_warps={warps} is not a power of two <= {MAX_WARPS}")
+    if config["num_stages"] < 1:
+        problems.append(f"num_stages={config['num_stages']} < 1")
+    if config["GROUP_SIZE_M"] < 1:
+        problems.append(f"GROUP_SIZE_M={config['GROUP_SIZE_M']} < 1")
+    if not problems and grid_size(config, m, gemm) > MAX_GRID_X:
+        problems.append(f"grid of {grid_size(config, m, gemm)} programs exceeds {MAX_GRID_X}")
+    if not problems and device is not None:
+        problems += check_shared_memory(config, device, dtype)
+    return problems
+
+def check_pair(up, down, batch_sizes=BATCH_SIZES, device=DEFAULT_DEVICE, dtype="fp8_w8a8"):
+    """{M: [problems]} for the entries SGLang would pick at each batch size"""
+    report = {}
+    for m in batch_sizes:
+        problems = [] if m in up else [f"no key {m} (uses {min(up, key=lambda key: abs(key - m))})"]
+        problems += [f"up: {p}" for p in check_launch(nearest(up, m), m, "up", device, dtype)]
+        if down is not None:
+            down_config = nearest(down, m)
+            problems += [f"down: {p}" for p in check_launch(down_config, m, "down", device, dtype)]
+            if down_config.get("BLOCK_SIZE_M") != nearest(up, m).get("BLOCK_SIZE_M"):
+                problems.append("up and down BLOCK_SIZE_M differ (SGLang asserts they match)")
+        report[m] = problems
+    return report
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Parser Bench: offline glm47 parser throughput on replayed GLM-4.7 delta streams
+
+Replays every scenario (see scenarios.py) through Glm47MoeDetector in
+streaming mode (one parse_streaming_increment per delta) and non-streaming
+mode (detect_and_parse on the full text). No server or GPU needed. The
+report goes to benchmarks/results/ wherever it is run from.
+
+Usage:
+  python benchmarks/parser_bench/run.py                       # all scenarios
+  python benchmarks/parser_bench/run.py --compare old.json    # regression check
+  python benchmarks/parser_bench/run.py --recordings DIR      # add recorded streams (none are shipped)
+  python benchmarks/parser_bench/run.py --tokens-per-delta 1  # fixed delta size
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "patches"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from sample_stats import percentile  # noqa: E402
+from scenarios import load_scenarios  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results")
+REPEATS = 5
+MIN_SAMPLES = {"streaming": 2000, "non_streaming": 100}  # per repeat: short scenarios are replayed several times
+REGRESSION_PCT = 10  # flag a scenario when its best-repeat time gets this much slower
+
+def replay_streaming(deltas, tools, timings):
+    """Feed every delta; append per-delta seconds to timings (if given), return tool calls seen"""
+    detector = Glm47MoeDetector()
+    calls = 0
+    for delta in deltas:
+        t0 = time.perf_counter()
+        result = detector.parse_streaming_increment(delta, tools)
+        if timings is not None:
+            timings.append(time.perf_counter() - t0)
+        calls += sum(1 for c in result.calls if c.name)
+    return calls
+
+def replay_non_streaming(text, tools, timings):
+    t0 = time.perf_counter()
+    result = Glm47MoeDetector().detect_and_parse(text, tools)
+    if timings is not None:
+        timings.append(time.perf_counter() - t0)
+    return len(result.calls)
+
+def peak_memory_kb(fn, *args):
+    """Peak traced allocation of one untimed replay"""
+    tracemalloc.start()
+    fn(*args, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+def bench(scenario, mode, repeats):
+    deltas, tools = scenario["deltas"], scenario["tools"]
+    text = "".join(deltas)
+    if mode == "streaming":
+        fn, args = replay_streaming, (deltas, tools)
+    else:
+        fn, args = replay_non_streaming, (text, tools)
+    units = len(deltas) if mode == "streaming" else 1
+    replays = -(-MIN_SAMPLES[mode] // units)
+    fn(*args, None)  # warmup: schema index, regex and automaton caches
+    samples = []
+    best_s = None  # fastest repeat per delta/response: the noise-robust figure for --compare
+    for _ in range(repeats):
+        start = len(samples)
+        for _ in range(replays):
+            calls = fn(*args, samples)
+        repeat_s = sum(samples[start:]) / (len(samples) - start)
+        best_s = repeat_s if best_s is None else min(best_s, repeat_s)
+    total_s = sum(samples)
+    samples.sort()
+    return {
+        "scenario": scenario["name"],
+        "source": scenario["source"],
+        "mode": mode,
+        "chars": len(text),
+        "deltas": len(deltas),
+        "tool_calls": calls,
+        "deltas_per_s": round(len(samples) / total_s) if mode == "streaming" else None,
+        "responses_per_s": round(len(samples) / total_s, 1) if mode == "non_streaming" else None,
+        "p50_us": round(percentile(samples, 50) * 1e6, 2),
+        "p99_us": round(percentile(samples, 99) * 1e6, 2),
+        "max_us": round(samples[-1] * 1e6, 2),
+        "best_mean_us": round(best_s * 1e6, 3),
+        "peak_kb": peak_memory_kb(fn, *args),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline_path, threshold_pct):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["scenario"], r["mode"]): r for r in baseline["results"]}
+    print(f"\n  Regression check vs {baseline_path} (commit {baseline.get('commit') or '?'})")
+    print(f"{'Scenario':>16} | {'Mode':>13} | {'Best mean old→new µs':>22} | {'Change':>8} | {'Peak KB old→new':>18} |")
+    print("-" * 96)
+    regressions = 0
+    for r in results:
+        prev = old.get((r["scenario"], r["mode"]))
+        if prev is None:
+            continue
+        change = (r["best_mean_us"] / prev["best_mean_us"] - 1) * 100 if prev["best_mean_us"] else 0.0
+        icon = "❌" if change > threshold_pct else "✅"
+        regressions += change > threshold_pct
+        best = f"{prev['best_mean_us']:.2f} → {r['best_mean_us']:.2f}"
+        mem = f"{prev['peak_kb']} → {r['peak_kb']}"
+        print(f"{r['scenario']:>16} | {r['mode']:>13} | {best:>22} | {change:>+7.1f}% | {mem:>18} | {icon}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--tokens-per-delta", type=int, default=None, help="fixed delta size (default: 1-4 tokens, seeded)")
+    parser.add_argument("--recordings", default=None, help="directory of recorded delta streams (*.json)")
+    parser.add_argument("--scenario", action="append", help="only run these scenarios (repeatable)")
+    parser.add_argument("--compare", default=None, help="previous parser_bench.json to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_PCT, help="regression threshold in %% (default: %(default)s)")
+    parser.add_argument("--output", default=os.path.normpath(os.path.join(RESULTS_DIR, "parser_bench.json")),
+                        help="JSON report; a .csv is written next to it (default: benchmarks/results/parser_bench.json)")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.tokens_per_delta, args.recordings)
+    if args.scenario:
+        known = [s["name"] for s in scenarios]
+        unknown = [name for name in args.scenario if name not in known]
+        if unknown:
+            parser.error(f"unknown scenario {', '.join(unknown)} (choose from {', '.join(known)})")
+        scenarios = [s for s in scenarios if s["name"] in args.scenario]
+
+    print("=" * 96)
+    print("  Parser Bench: glm47 replay (streaming + non-streaming)")
+    print(f"  {len(scenarios)} scenarios, {args.repeats} repeats, "
+          f"{args.tokens_per_delta or '1-4'} tokens per delta")
+    print("=" * 96)
+
+    results = [bench(s, mode, args.repeats) for s in scenarios for mode in ("streaming", "non_streaming")]
+
+    print(f"\n{'Scenario':>16} | {'Mode':>13} | {'Chars':>7} | {'Deltas':>6} | {'Calls':>5} | {'Rate':>12} | {'p50 µs':>8} | {'p99 µs':>8} | {'Peak KB':>8}")
+    print("-" * 104)
+    for r in results:
+        rate = f"{r['deltas_per_s']:,} d/s" if r["mode"] == "streaming" else f"{r['responses_per_s']:,} r/s"
+        print(f"{r['scenario']:>16} | {r['mode']:>13} | {r['chars']:>7} | {r['deltas']:>6} | {r['tool_calls']:>5} | {rate:>12} | {r['p50_us']:>8.2f} | {r['p99_us']:>8.2f} | {r['peak_kb']:>8.1f}")
+    print("\np50/p99 are per delta (streaming) or per response (non_streaming); peak KB from one tracemalloc pass.")
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else 0
+
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeats": args.repeats,
+            "tokens_per_delta": args.tokens_per_delta,
+            "results": results,
+        }, f, indent=2)
+    csv_path = os.path.splitext(args.output)[0] + ".csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=results[0].keys())
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSaved to {args.output}")
+
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Replay scenarios and shared fixtures for the glm47 parser benchmarks.
+
+Synthetic GLM-4.7 responses are split into token-like pieces (the tool call
+tags are single special tokens, CJK text is 1-2 characters per token) and
+grouped into streamed deltas of 1-4 tokens, like EAGLE speculative decoding
+emits them. No captured streams ship with the repository; recordings from a
+live server can be added as JSON files and passed with run.py --recordings:
+
+    {"name": "my_capture", "deltas": ["I'll", " check", "<tool_call>", ...],
+     "tools": [{"type": "function", "function": {...}}]}   # tools optional
+
+The benchmarks/benchmark_parser_*.py tests import their tools, filler code
+and constants from here, and measure their "before" arm against the patches
+as of BASELINE_REV (load_baseline) rather than a copy of the old code.
+"""
+import functools
+import glob
+import json
+import os
+import random
+import re
+import subprocess
+import types
+
+from sglang.srt.entrypoints.openai.protocol import Tool
+
+SEED = 47
+DELTA_CHARS = 4  # fixed-size deltas of the single-scenario parser tests: ~1 token each
+DECODE_TOKS = 7.5  # measured decode tok/s (RESULTS.md, Test 1) to turn deltas and tokens into wall time
+BASELINE_REV = "f2cc49b"  # the upstream patches this repository started from
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+TOOL_DEFS = [
+    {"type": "function", "function": {
+        "name": "write_file", "description": "Write content to a file",
+        "parameters": {"type": "object", "properties": {
+            "path": {"type": "string"}, "content": {"type": "string"},
+            "mode": {"enum": ["overwrite", "append"]},
+        }, "required": ["path", "content"]}
+    }},
+    {"type": "function", "function": {
+        "name": "read_file", "description": "Read contents of a file",
+        "parameters": {"type": "object", "properties": {
+            "path": {"type": "string"}, "offset": {"type": "integer"}, "limit": {"type": ["integer", "null"]},
+        }, "required": ["path"]}
+    }},
+    {"type": "function", "function": {
+        "name": "run_command", "description": "Run a shell command",
+        "parameters": {"type": "object", "properties": {
+            "command": {"type": "string"}, "timeout": {"type": "number"}, "env": {"type": "object"},
+        }, "required": ["command"]}
+    }},
+    {"type": "function", "function": {
+        "name": "get_weather", "description": "Get weather for a city",
+        "parameters": {"type": "object", "properties": {
+            "city": {"type": "string"}, "unit": {"enum": ["celsius", "fahrenheit"]}, "days": {"type": "integer"},
+        }, "required": ["city"]}
+    }},
+    {"type": "function", "function": {
+        "name": "list_directory", "description": "List the current directory",
+        "parameters": {"type": "object", "properties": {}}
+    }},
+]
+
+# GLM-4.7 special tokens first, then CJK pairs, whitespace runs, words, single symbols
+TOKEN_REGEX = re.compile(
+    r"</?tool_call>|</?arg_key>|</?arg_value>|[一-鿿]{1,2}|\s+|\w+|[^\w\s]"
+)
+
+# Source code like our agents push through write_file.content: '<', both quote
+# styles, braces, a tab and newlines, so every escaping and holdback path runs
+CODE_BLOCK = '''def merge(a: list[int], b: list[int]) -> list[int]:
+    """Merge two sorted lists."""
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        if a[i] <= b[j]:
+            out.append(a[i]); i += 1
+        else:
+            out.append(b[j]); j += 1
+    return out + a[i:] + b[j:]
+
+def summary(xs):
+\treturn {"n": len(xs), 'sorted': merge(xs, []) == xs}
+
+'''
+
+def code_of(size):
+    """size characters of CODE_BLOCK filler"""
+    return (CODE_BLOCK * (size // len(CODE_BLOCK) + 1))[:size]
+
+def chunks(text, size=DELTA_CHARS):
+    """Split text into fixed-size streamed deltas"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def tool_call(name, **arguments):
+    args = "".join(f"<arg_key>{k}</arg_key><arg_value>{v}</arg_value>" for k, v in arguments.items())
+    return f"<tool_call>{name}{args}</tool_call>"
+
+def synthetic_responses():
+    """name -> full response text"""
+    return {
+        "single_tool": "Let me read that file first.\n" + tool_call("read_file", path="/etc/hostname"),
+        "parallel_tools": "Checking all three cities.\n" + "".join(
+            tool_call("get_weather", city=city, unit="celsius", days=3) for city in ("Istanbul", "Berlin", "Tokyo", "Lima")
+        ),
+        "no_arg_tools": "Listing it.\n" + tool_call("list_directory") + tool_call("list_directory"),
+        "huge_string": "Writing the module.\n" + tool_call(
+            "write_file", path="src/merge.py", mode="overwrite", content=CODE_BLOCK * 800
+        ),
+        "chinese_text": "好的，我先查一下北京和上海的天气，然后给你一个出行建议。\n"
+                        + tool_call("get_weather", city="北京", unit="celsius")
+                        + "北京明天有小雨，建议带伞。上海的情况我也查一下。\n"
+                        + tool_call("get_weather", city="上海市浦东新区", days=2),
+        "interleaved": "".join(
+            f"Step {i}: the loop condition `i < n` needs fixing in part {i}.\n"
+            + tool_call("write_file", path=f"src/part_{i}.py", content=CODE_BLOCK)
+            + f"\nDone with part {i}; the comparison `a[i] <= b[j]` stays.\n"
+            for i in range(8)
+        ),
+    }
+
+def to_deltas(text, tokens_per_delta=None, seed=SEED):
+    """Split text into streamed deltas; None = 1-4 tokens per delta (seeded)"""
+    rng = random.Random(seed)
+    tokens = TOKEN_REGEX.findall(text)
+    assert "".join(tokens) == text
+    deltas, i = [], 0
+    while i < len(tokens):
+        n = tokens_per_delta or rng.randint(1, 4)
+        deltas.append("".join(tokens[i:i + n]))
+        i += n
+    return deltas
+
+def default_tools(*names):
+    """Tool objects for TOOL_DEFS, or only the named functions"""
+    return [Tool(**t) for t in TOOL_DEFS if not names or t["function"]["name"] in names]
+
+@functools.lru_cache(maxsize=None)
+def baseline_source(filename="glm47_moe_detector.py", rev=BASELINE_REV):
+    """Text of patches/<filename> as of rev (needs a git checkout)"""
+    return subprocess.run(["git", "show", f"{rev}:patches/{filename}"], capture_output=True, text=True,
+                          check=True, cwd=REPO_ROOT).stdout
+
+@functools.lru_cache(maxsize=None)
+def load_baseline(filename="glm47_moe_detector.py", rev=BASELINE_REV):
+    """patches/<filename> as of rev, imported as a module"""
+    module = types.ModuleType(f"baseline_{os.path.splitext(filename)[0]}")
+    exec(compile(baseline_source(filename, rev), f"{rev}:patches/{filename}", "exec"), module.__dict__)
+    return module
+
+def load_scenarios(tokens_per_delta=None, recordings_dir=None):
+    """Return [{name, deltas, tools, source}]"""
+    tools = default_tools()
+    scenarios = [
+        {"name": name, "deltas": to_deltas(text, tokens_per_delta), "tools": tools, "source": "synthetic"}
+        for name, text in synthetic_responses().items()
+    ]
+    if recordings_dir:
+        for path in sorted(glob.glob(os.path.join(recordings_dir, "*.json"))):
+            with open(path) as f:
+                rec = json.load(f)
+            rec_tools = [Tool(**t) for t in rec["tools"]] if rec.get("tools") else tools
+            scenarios.append({
+                "name": rec.get("name") or os.path.splitext(os.path.basename(path))[0],
+                "deltas": rec["deltas"],
+                "tools": rec_tools,
+                "source": "recorded",
+            })
+    return scenarios
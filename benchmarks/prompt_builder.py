@@ -0,0 +1,113 @@
+"""Context-length sweep prompts with exact token counts and a realistic, varied corpus.
+
+The sweeps used to repeat one English sentence at an assumed 4 chars per
+token. That misses the target length, and the repeats of one context point
+send identical prompts, so every repeat after the first is a radix cache hit.
+
+PromptBuilder fills the user message from a corpus of real paragraphs (this
+repo's docs and Python sources, or the .md/.txt/.py files under
+PROMPT_CORPUS=/some/dir), shuffled per pass. With the model tokenizer
+(GLM_TOKENIZER=/path/to/GLM-4.7-FP8, loaded offline) the whole chat-templated
+prompt is exactly target_tokens long; without it the old 4 chars/token
+estimate is used and the result is marked approximate.
+
+Cache modes (PROMPT_CACHE_MODE=unique|shared):
+  unique  every prompt starts with a fresh header and a random corpus offset,
+          so nothing is served from the prefix cache (default)
+  shared  prompts are deterministic and longer ones extend shorter ones, so
+          repeats and larger context points reuse the cached prefix
+"""
+import glob
+import os
+import random
+
+CORPUS_ENV = "PROMPT_CORPUS"
+CACHE_MODE_ENV = "PROMPT_CACHE_MODE"
+CACHE_MODES = ("unique", "shared")
+CHARS_PER_TOKEN = 4  # fallback estimate without a tokenizer
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MIN_PARAGRAPH_CHARS = 80
+FIT_ATTEMPTS = 8
+
+def load_paragraphs(corpus_dir=None):
+    """Blank-line separated paragraphs from the corpus files"""
+    corpus_dir = corpus_dir or os.environ.get(CORPUS_ENV)
+    if corpus_dir:
+        paths = [p for ext in ("md", "txt", "py") for p in glob.glob(os.path.join(corpus_dir, "**", f"*.{ext}"), recursive=True)]
+    else:
+        paths = glob.glob(os.path.join(REPO_DIR, "*.md")) + glob.glob(os.path.join(REPO_DIR, "patches", "*.py")) \
+            + glob.glob(os.path.join(REPO_DIR, "benchmarks", "*.py"))
+    paragraphs = []
+    for path in sorted(paths):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            paragraphs.extend(p.strip() for p in f.read().split("\n\n") if len(p.strip()) >= MIN_PARAGRAPH_CHARS)
+    if not paragraphs:
+        raise ValueError(f"no paragraphs of {MIN_PARAGRAPH_CHARS}+ chars found in {corpus_dir or REPO_DIR}")
+    return paragraphs
+
+class PromptBuilder:
+    def __init__(self, tokenizer=None, cache_mode=None, corpus_dir=None, seed=None):
+        cache_mode = cache_mode or os.environ.get(CACHE_MODE_ENV, "unique")
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"cache_mode must be one of {CACHE_MODES}, got {cache_mode!r}")
+        self.tokenizer = tokenizer
+        self.cache_mode = cache_mode
+        self.paragraphs = load_paragraphs(corpus_dir)
+        self.rng = random.Random(seed)
+        self._text = ""  # corpus stream: reshuffled passes appended as needed
+        self._ids = []
+        self._passes = 0
+
+    def _extend_corpus(self, min_chars):
+        if len(self._text) >= min_chars:
+            return
+        while len(self._text) < min_chars:
+            order = self.paragraphs[:]
+            random.Random(self._passes).shuffle(order)
+            self._text += "\n\n".join(order) + "\n\n"
+            self._passes += 1
+        if self.tokenizer is not None:
+            self._ids = self.tokenizer.encode(self._text, add_special_tokens=False)
+
+    def _prompt_tokens(self, messages):
+        return len(self.tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True))
+
+    def messages(self, target_tokens, system, instruction):
+        """Return (messages, prompt_tokens, exact) for a chat prompt of target_tokens tokens"""
+        if self.cache_mode == "unique":
+            header = f"Session {self.rng.getrandbits(64):016x}. Reference material:\n\n"
+        else:
+            header = "Reference material:\n\n"
+
+        def build(filler):
+            return [
+                {"role": "system", "content": system},
+                {"role": "user", "content": header + filler + "\n\n" + instruction},
+            ]
+
+        if self.tokenizer is None:
+            n_chars = target_tokens * CHARS_PER_TOKEN
+            self._extend_corpus(2 * n_chars)
+            start = self.rng.randrange(len(self._text) - n_chars) if self.cache_mode == "unique" else 0
+            return build(self._text[start:start + n_chars]), target_tokens, False
+
+        self._extend_corpus(2 * target_tokens * CHARS_PER_TOKEN)
+        while len(self._ids) < 2 * target_tokens:
+            self._extend_corpus(2 * len(self._text))
+        start = self.rng.randrange(len(self._ids) - target_tokens) if self.cache_mode == "unique" else 0
+        # Decoding a token slice and re-tokenizing it inside the chat template
+        # can merge or split tokens at the edges, so correct the slice length
+        # until the templated prompt lands on the target (or the closest miss)
+        n = max(0, target_tokens - self._prompt_tokens(build("")))
+        tried = {}
+        for _ in range(FIT_ATTEMPTS):
+            messages = build(self.tokenizer.decode(self._ids[start:start + n]))
+            tried[n] = (messages, self._prompt_tokens(messages))
+            if tried[n][1] == target_tokens:
+                break
+            step = target_tokens - tried[n][1]
+            n = max(0, n + step)
+            while n in tried:  # oscillating around the target: walk one token at a time
+                n = max(0, n + (1 if step > 0 else -1))
+        messages, count = min(tried.values(), key=lambda t: abs(t[1] - target_tokens))
+        return messages, count, count == target_tokens
@@ -0,0 +1,103 @@
+"""Sample statistics for the benchmarks: percentiles, spread, bootstrap confidence intervals, adaptive repeats
+
+A median of 3 repeats cannot resolve a 6% difference (the MoE config delta
+in RESULTS.md) from run-to-run noise. describe() keeps the raw samples next
+to p50/p90/p99, the standard deviation and a bootstrap CI of the median,
+and the scripts write that into their results/*.json. repeat_until_tight()
+keeps measuring until the CI is narrow enough (or a cap is reached) instead
+of a fixed number of repeats.
+"""
+import random
+import statistics
+
+CONFIDENCE = 0.95
+RESAMPLES = 2000
+MIN_REPEATS = 3
+MAX_REPEATS = 10
+TARGET_REL_CI = 0.05  # stop once the CI half-width is within ±5% of the median
+SEED = 0  # bootstrap resampling is deterministic for a given set of samples
+MAX_BOOTSTRAP_N = 1000  # larger sample sets (pooled ITLs) use the order-statistic CI of the median
+Z_95 = 1.96
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+def bootstrap_ci(samples, stat=statistics.median, confidence=CONFIDENCE, resamples=RESAMPLES):
+    """(low, high) percentile-bootstrap interval of stat(samples); a single sample gives a zero-width interval"""
+    if len(samples) < 2:
+        return (stat(samples), stat(samples)) if samples else (0.0, 0.0)
+    if len(samples) > MAX_BOOTSTRAP_N and stat is statistics.median and confidence == CONFIDENCE:
+        values, n = sorted(samples), len(samples)
+        half = Z_95 * n ** 0.5 / 2
+        return values[max(0, int(n / 2 - half))], values[min(n - 1, int(n / 2 + half))]
+    rng = random.Random(SEED)
+    estimates = sorted(stat(rng.choices(samples, k=len(samples))) for _ in range(resamples))
+    tail = (1 - confidence) / 2 * 100
+    return percentile(estimates, tail), percentile(estimates, 100 - tail)
+
+def rel_ci_half_width(samples):
+    """CI half-width of the median as a fraction of the median (inf with fewer than 2 samples)"""
+    if len(samples) < 2:
+        return float("inf")
+    low, high = bootstrap_ci(samples)
+    center = statistics.median(samples)
+    return (high - low) / 2 / abs(center) if center else float("inf")
+
+def describe(samples, digits=2):
+    """Summary of raw samples for results JSON; None for no samples"""
+    if not samples:
+        return None
+    values = sorted(samples)
+    low, high = bootstrap_ci(values)
+    return {
+        "n": len(values),
+        "mean": round(statistics.fmean(values), digits),
+        "std": round(statistics.stdev(values), digits) if len(values) > 1 else 0.0,
+        "min": round(values[0], digits),
+        "p50": round(statistics.median(values), digits),
+        "p90": round(percentile(values, 90), digits),
+        "p99": round(percentile(values, 99), digits),
+        "max": round(values[-1], digits),
+        "ci_low": round(low, digits),
+        "ci_high": round(high, digits),
+        "confidence": CONFIDENCE,
+        "samples": [round(v, digits) for v in samples],
+    }
+
+def bootstrap_diff(a, b, stat=statistics.median, confidence=CONFIDENCE, resamples=RESAMPLES):
+    """Relative change of stat from a to b, (stat(b) - stat(a)) / stat(a), with its bootstrap CI
+
+    Returns {"diff_pct", "ci_low_pct", "ci_high_pct", "significant"}; significant
+    means the interval excludes zero.
+    """
+    rng = random.Random(SEED)
+    base = stat(a)
+    diff = (stat(b) - base) / base * 100 if base else 0.0
+    estimates = []
+    for _ in range(resamples):
+        ra = stat(rng.choices(a, k=len(a)))
+        if ra:
+            estimates.append((stat(rng.choices(b, k=len(b))) - ra) / ra * 100)
+    estimates.sort()
+    tail = (1 - confidence) / 2 * 100
+    low, high = percentile(estimates, tail), percentile(estimates, 100 - tail)
+    return {"diff_pct": round(diff, 2), "ci_low_pct": round(low, 2), "ci_high_pct": round(high, 2),
+            "significant": low > 0 or high < 0}
+
+def repeat_until_tight(measure, key, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS, target=TARGET_REL_CI):
+    """Call measure() until the CI of key(result) is within ±target of its median
+
+    measure() returns a result or None for a failed attempt; failures count
+    towards max_repeats. Returns the successful results.
+    """
+    results = []
+    for _ in range(max_repeats):
+        result = measure()
+        if result is not None:
+            results.append(result)
+        if len(results) >= min_repeats and rel_ci_half_width([key(r) for r in results]) <= target:
+            break
+    return results
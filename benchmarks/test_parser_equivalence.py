@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test glm47 parser: arguments accumulated while streaming must equal detect_and_parse on the full text"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from sglang.srt.entrypoints.openai.protocol import Tool  # noqa: E402
+
+tools = [
+    Tool(**{"type": "function", "function": {
+        "name": "write_file", "description": "Write content to a file",
+        "parameters": {"type": "object", "properties": {
+            "path": {"type": "string"},
+            "content": {"type": "string"},
+            "mode": {"enum": ["overwrite", "append"]},
+        }, "required": ["path", "content"]}
+    }}),
+    Tool(**{"type": "function", "function": {
+        "name": "search", "description": "Search the codebase",
+        "parameters": {"type": "object", "$defs": {"Scope": {"type": "object", "properties": {"dir": {"type": "string"}}}}, "properties": {
+            "query": {"type": "string"},
+            "limit": {"type": "integer"},
+            "threshold": {"type": "number"},
+            "regex": {"type": "boolean"},
+            "globs": {"type": "array"},
+            "scope": {"$ref": "#/$defs/Scope"},
+            "extra": {},
+        }}
+    }}),
+    Tool(**{"type": "function", "function": {
+        "name": "list_directory", "description": "List the current directory",
+        "parameters": {"type": "object", "properties": {}}
+    }}),
+]
+
+CODE = 'def f(a, b):\n    """Compare."""\n    if a < b:\n        return {"ok": True, "msg": \'a<b\'}\n    return None\n'
+
+RESPONSES = {
+    "single string arg": "<tool_call>write_file<arg_key>path</arg_key><arg_value>/tmp/a.py</arg_value>"
+                         f"<arg_key>content</arg_key><arg_value>{CODE}</arg_value></tool_call>",
+    "all value types": "Searching now.\n<tool_call>search<arg_key>query</arg_key><arg_value> todo </arg_value>"
+                       "<arg_key>limit</arg_key><arg_value>20</arg_value><arg_key>threshold</arg_key><arg_value>0.5</arg_value>"
+                       "<arg_key>regex</arg_key><arg_value>false</arg_value><arg_key>globs</arg_key><arg_value>[\"*.py\", \"*.md\"]</arg_value>"
+                       "<arg_key>scope</arg_key><arg_value>{\"dir\": \"src\"}</arg_value></tool_call>",
+    "untyped values": "<tool_call>search<arg_key>extra</arg_key><arg_value>{'a': [1, 2], 'b': None}</arg_value>"
+                      "<arg_key>unknown</arg_key><arg_value>42</arg_value><arg_key>query</arg_key><arg_value>x</arg_value></tool_call>",
+    "bad typed values": "<tool_call>search<arg_key>limit</arg_key><arg_value>twenty</arg_value>"
+                        "<arg_key>regex</arg_key><arg_value>True</arg_value><arg_key>threshold</arg_key><arg_value>1e-3</arg_value></tool_call>",
+    "whitespace between tags": "<tool_call>write_file\n<arg_key>path</arg_key>\n<arg_value>b.txt</arg_value>\n"
+                               "<arg_key> mode </arg_key>\n<arg_value>append</arg_value>\n"
+                               "<arg_key>content</arg_key>\n<arg_value>\n  indented\n</arg_value>\n</tool_call>",
+    "no arguments": "Listing.<tool_call>list_directory</tool_call>",
+    "multiple calls": "<tool_call>write_file<arg_key>path</arg_key><arg_value>a</arg_value><arg_key>content</arg_key><arg_value>1</arg_value></tool_call>"
+                      "<tool_call>search<arg_key>query</arg_key><arg_value>a</arg_value><arg_key>limit</arg_key><arg_value>3</arg_value></tool_call>"
+                      "Done.<tool_call>list_directory</tool_call>",
+    "duplicate key": "<tool_call>search<arg_key>limit</arg_key><arg_value>1</arg_value><arg_key>limit</arg_key><arg_value>2</arg_value></tool_call>",
+    "string that looks like json": "<tool_call>write_file<arg_key>path</arg_key><arg_value>c.json</arg_value>"
+                                   "<arg_key>content</arg_key><arg_value>{\"k\": [1, 2, 3]}</arg_value></tool_call>",
+    "large argument": "<tool_call>write_file<arg_key>path</arg_key><arg_value>big.py</arg_value>"
+                      f"<arg_key>content</arg_key><arg_value>{CODE * 500}</arg_value></tool_call>",
+}
+
+DELTA_SIZES = [1, 3, 7, 64, None]  # None = whole response in one delta
+
+def non_streaming(text):
+    result = Glm47MoeDetector().detect_and_parse(text, tools)
+    return [{"name": call.name, "arguments": json.loads(call.parameters)} for call in result.calls]
+
+def streaming(text, delta_size):
+    detector = Glm47MoeDetector()
+    size = delta_size or len(text)
+    for i in range(0, len(text), size):
+        detector.parse_streaming_increment(text[i:i + size], tools)
+    return [call for call in detector.prev_tool_call_arr if call]
+
+results = []
+for name, text in RESPONSES.items():
+    expected = non_streaming(text)
+    mismatches = []
+    for delta_size in DELTA_SIZES:
+        actual = streaming(text, delta_size)
+        if actual != expected:
+            mismatches.append((delta_size, actual))
+    if mismatches:
+        print(f"  ❌ {name}")
+        print(f"     detect_and_parse: {json.dumps(expected)[:300]}")
+        for delta_size, actual in mismatches:
+            print(f"     delta={delta_size or 'all'}: {json.dumps(actual)[:300]}")
+        results.append(("FAIL", name))
+    else:
+        results.append(("PASS", name))
+
+print(f"\n{'='*60}")
+print("  SUMMARY: streaming prev_tool_call_arr vs detect_and_parse")
+print(f"  delta sizes: {', '.join(str(d or 'whole') for d in DELTA_SIZES)}")
+print(f"{'='*60}")
+for status, name in results:
+    icon = "✅" if status == "PASS" else "❌"
+    print(f"  {icon} {name}")
+
+sys.exit(0 if all(status == "PASS" for status, _ in results) else 1)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test glm47 structural tag: compiles with xgrammar on CPU, accepts valid GLM-4.7 outputs, rejects invalid ones"""
+import json
+import os
+import sys
+from importlib.metadata import version
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patches"))
+from glm47_moe_detector import Glm47MoeDetector  # noqa: E402
+from sglang.srt.entrypoints.openai.protocol import Tool  # noqa: E402
+
+try:
+    import xgrammar as xgr
+    from xgrammar.testing import _is_grammar_accept_string
+except ImportError:
+    print("  ⏭️  xgrammar not installed, skipping (pip install xgrammar)")
+    sys.exit(0)
+
+tools = [
+    Tool(**{"type": "function", "function": {
+        "name": "write_file", "description": "Write content to a file", "strict": True,
+        "parameters": {"type": "object", "properties": {
+            "path": {"type": "string"},
+            "content": {"type": "string"},
+            "mode": {"enum": ["overwrite", "append"]},
+        }, "required": ["path", "content"]}
+    }}),
+    Tool(**{"type": "function", "function": {
+        "name": "search", "description": "Search the codebase", "strict": True,
+        "parameters": {"type": "object", "$defs": {"Scope": {"type": "object", "properties": {"dir": {"type": "string"}}}}, "properties": {
+            "query": {"type": "string"},
+            "limit": {"type": "integer"},
+            "regex": {"type": "boolean"},
+            "globs": {"type": "array", "items": {"type": "string"}},
+            "scope": {"$ref": "#/$defs/Scope"},
+        }}
+    }}),
+    Tool(**{"type": "function", "function": {
+        "name": "list_directory", "description": "List the current directory", "strict": True,
+        "parameters": {"type": "object", "properties": {}}
+    }}),
+    Tool(**{"type": "function", "function": {
+        "name": "run_shell", "description": "Run a shell command (not strict)",
+        "parameters": {"type": "object", "properties": {"command": {"type": "string"}}}
+    }}),
+]
+
+CODE = 'def f(a, b):\n    if a < b:\n        return {"ok": True}\n    return None\n'
+
+# (label, model output, should be accepted)
+SAMPLES = [
+    ("plain text only", "No tool needed, the answer is 42.", True),
+    ("single call", "Writing it.\n<tool_call>write_file<arg_key>path</arg_key><arg_value>src/a.py</arg_value>"
+     f"<arg_key>content</arg_key><arg_value>{CODE}</arg_value></tool_call>", True),
+    ("enum value", "<tool_call>write_file<arg_key>path</arg_key><arg_value>a.txt</arg_value>"
+     "<arg_key>mode</arg_key><arg_value>append</arg_value><arg_key>content</arg_key><arg_value>x</arg_value></tool_call>", True),
+    ("typed values", "<tool_call>search<arg_key>query</arg_key><arg_value>todo</arg_value>"
+     "<arg_key>limit</arg_key><arg_value>20</arg_value><arg_key>regex</arg_key><arg_value>false</arg_value>"
+     "<arg_key>globs</arg_key><arg_value>[\"*.py\", \"*.md\"]</arg_value>"
+     "<arg_key>scope</arg_key><arg_value>{\"dir\": \"src\"}</arg_value></tool_call>", True),
+    ("no arguments", "Listing.<tool_call>list_directory</tool_call>", True),
+    ("text between calls", "<tool_call>search<arg_key>query</arg_key><arg_value>a</arg_value></tool_call>"
+     "Now the listing.<tool_call>list_directory</tool_call>Done.", True),
+    ("non-strict tool", "<tool_call>run_shell<arg_key>command</arg_key><arg_value>ls -la</arg_value></tool_call>", True),
+    ("bad enum", "<tool_call>write_file<arg_key>path</arg_key><arg_value>a.txt</arg_value>"
+     "<arg_key>mode</arg_key><arg_value>replace</arg_value></tool_call>", False),
+    ("string for integer", "<tool_call>search<arg_key>limit</arg_key><arg_value>twenty</arg_value></tool_call>", False),
+    ("unknown argument", "<tool_call>search<arg_key>dir</arg_key><arg_value>src</arg_value></tool_call>", False),
+    ("unknown tool", "<tool_call>delete_file<arg_key>path</arg_key><arg_value>a</arg_value></tool_call>", False),
+    ("missing required", "<tool_call>write_file</tool_call>", False),
+    ("JSON arguments", "<tool_call>search{\"query\": \"todo\"}</tool_call>", False),
+]
+
+def main():
+    detector = Glm47MoeDetector()
+    structural_tag = detector.build_structural_tag(tools)
+    grammar = xgr.Grammar.from_structural_tag(structural_tag)
+
+    results = []
+    for label, text, expect_accept in SAMPLES:
+        accepted = _is_grammar_accept_string(grammar, text)
+        # Accepted tool calls must also parse back to the same tool names
+        if accepted and "<tool_call>" in text:
+            names = [call.name for call in Glm47MoeDetector().detect_and_parse(text, tools).calls]
+            accepted = names == [part.split("<", 1)[0] for part in text.split("<tool_call>")[1:]]
+        results.append(("PASS" if accepted == expect_accept else "FAIL", label, expect_accept))
+
+    print(f"\n{'='*60}")
+    print(f"  SUMMARY: glm47 structural tag (xgrammar {version('xgrammar')})")
+    print(f"  triggers: {json.dumps(structural_tag.format.triggers)}, {len(structural_tag.format.tags)} tool tags")
+    print(f"{'='*60}")
+    for status, label, expect_accept in results:
+        icon = "✅" if status == "PASS" else "❌"
+        print(f"  {icon} {label} ({'accept' if expect_accept else 'reject'})")
+
+    sys.exit(0 if all(status == "PASS" for status, _, _ in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 """Test GLM-4.7 tool calling"""
 import json
+import os
 import sys
 import time
 
 from openai import OpenAI
 
-client = OpenAI(base_url="http://localhost:30000/v1", api_key="none")
+client = OpenAI(base_url=os.environ.get("BENCH_BASE_URL", "http://localhost:30000/v1"), api_key="none")
 
 tools = [
     {
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Test tune_moe_distributed: interrupted runs resume from the checkpoint and merge to the same configs (fake timing, CPU)"""
+import glob
+import os
+import sys
+import tempfile
+from moe_config import check_pair, load_table, save_table
+from tune_moe import SEARCH_SPACE, config_key, load_seed_tables, plan
+from tune_moe_distributed import fake_measure, fake_measure_factory, load_checkpoint, orchestrate
+
+BATCH_SIZES = [1, 24, 256, 4096]
+WORKERS = 3
+FAIL_AFTER = 25  # timings per worker process before it "loses its node"
+
+class NodeLost(Exception):
+    pass
+
+def failing_measure_factory():
+    calls = 0
+
+    def measure(m, gemm, config):
+        nonlocal calls
+        calls += 1
+        if calls > FAIL_AFTER:
+            raise NodeLost(f"worker {os.getpid()} gone after {FAIL_AFTER} timings")
+        return fake_measure(m, gemm, config)
+
+    return measure
+
+def checkpoint_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "*.jsonl")))
+
+def checkpoint_lines(directory):
+    return sum(1 for path in checkpoint_files(directory) for _ in open(path))
+
+def tune(directory, factory=fake_measure_factory, exhaustive=False, batch_sizes=BATCH_SIZES, timing="fake"):
+    seeds, _ = load_seed_tables(None) if exhaustive else load_seed_tables(os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), "..", "configs", "triton_3_5_0"))
+    return orchestrate(batch_sizes, seeds, directory, factory, WORKERS, exhaustive=exhaustive, pin_gpus=False,
+                       log=lambda *args: None, timing=timing)
+
+def main():
+    results = []
+
+    def check(name, ok):
+        results.append(("PASS" if ok else "FAIL", name))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_dir, resumed_dir = os.path.join(tmp, "reference"), os.path.join(tmp, "resumed")
+        reference, _ = tune(reference_dir)
+        reference_timings = checkpoint_lines(reference_dir)
+        check("uninterrupted run passes check_pair", not any(check_pair(reference["up"], reference["down"], BATCH_SIZES).values()))
+
+        try:
+            tune(resumed_dir, failing_measure_factory)
+            check("interrupted run reports failed tasks", False)
+        except RuntimeError as e:
+            check("interrupted run reports failed tasks", "rerun to resume" in str(e))
+        partial = checkpoint_lines(resumed_dir)
+        check(f"interrupted run checkpointed its timings ({partial} of {reference_timings})", 0 < partial < reference_timings)
+
+        with open(checkpoint_files(resumed_dir)[0], "a") as f:
+            f.write('{"m": 1, "gemm": "up", "config": {"BLOCK_')  # killed mid-write
+        resumed, _ = tune(resumed_dir)
+        check("resumed run merges to the same configs", resumed == reference)
+        timings = load_checkpoint(resumed_dir)
+        unique = sum(len(t) for t in timings.values())
+        check(f"no config timed twice across runs ({unique} unique timings)",
+              unique == reference_timings and checkpoint_lines(resumed_dir) == reference_timings + 1)  # + the torn line
+
+        before = checkpoint_lines(resumed_dir)
+        again, _ = tune(resumed_dir, failing_measure_factory)  # would fail if it timed anything
+        check("finished run replays entirely from the checkpoint", again == reference and checkpoint_lines(resumed_dir) == before)
+        try:
+            tune(resumed_dir, failing_measure_factory, timing="kernel")
+            refused = False
+        except ValueError:
+            refused = True
+        check("fake-timed checkpoint refuses a kernel-timed resume", refused and checkpoint_lines(resumed_dir) == before)
+
+        exhaustive_dir = os.path.join(tmp, "exhaustive")
+        try:
+            tune(exhaustive_dir, failing_measure_factory, exhaustive=True, batch_sizes=[64])
+        except RuntimeError:
+            pass
+        tables, _ = tune(exhaustive_dir, exhaustive=True, batch_sizes=[64])
+        kept, _ = plan(64, "up")
+        best_up = min(kept, key=lambda c: fake_measure(64, "up", c))
+        check("exhaustive shards merge to the brute-force optimum",
+              config_key(tables["up"][64]) == config_key(best_up) and tables["down"][64]["BLOCK_SIZE_M"] == best_up["BLOCK_SIZE_M"])
+        path = os.path.join(tmp, "E=160,N=384,device_name=NVIDIA_GB10,dtype=fp8_w8a8.json")
+        save_table(path, tables["up"])
+        check("merged entries round-trip through the config file layout",
+              load_table(path) == tables["up"] and list(tables["up"][64]) == list(SEARCH_SPACE))
+
+    print(f"\n{'='*60}")
+    print(f"  SUMMARY: tune_moe_distributed resume ({WORKERS} local workers, fake timing)")
+    print(f"{'='*60}")
+    for status, name in results:
+        icon = "✅" if status == "PASS" else "❌"
+        print(f"  {icon} {name}")
+
+    sys.exit(0 if all(status == "PASS" for status, _ in results) else 1)
+
+if __name__ == "__main__":
+    main()
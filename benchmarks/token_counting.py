@@ -0,0 +1,117 @@
+"""Exact output token counts and inter-token latency for streamed chat completions.
+
+The benchmarks used to count one token per SSE chunk. With EAGLE speculative
+decoding a chunk carries every token accepted in that step, so chunk counts
+undercount tokens and make EAGLE look slower than it is.
+
+Totals come from, in order of preference:
+  usage      the server's completion_tokens (requested with STREAM_OPTIONS)
+  tokenizer  the model tokenizer over the streamed text (GLM_TOKENIZER=/path/to/GLM-4.7-FP8)
+  chunks     one token per chunk (the old approximation)
+Per-chunk counts come from the tokenizer when one is loaded. Without one the
+first chunk (the prefill token) counts as 1 and the rest of the exact total is
+spread evenly over the later chunks.
+"""
+import os
+
+from sample_stats import percentile
+
+STREAM_OPTIONS = {"include_usage": True}
+TOKENIZER_ENV = "GLM_TOKENIZER"
+
+def load_tokenizer(path=None):
+    """Model tokenizer from a local directory (no downloads), or None if not configured"""
+    path = path or os.environ.get(TOKENIZER_ENV)
+    if not path:
+        return None
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        print(f"  WARNING: {TOKENIZER_ENV} is set but transformers is not installed; using server usage counts")
+        return None
+    return AutoTokenizer.from_pretrained(path, local_files_only=True, trust_remote_code=True)
+
+def count_tokens(tokenizer, text):
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+class StreamTokenCounter:
+    """Collects the arrival time and text of every streamed chunk, then turns them into token metrics"""
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.chunk_times = []
+        self.chunk_texts = []
+        self.usage_tokens = None
+        self.cached_tokens = None
+        self.prompt_tokens = None
+
+    def add_chunk(self, now, chunk):
+        """Record one ChatCompletionChunk; return True if it carried output (content, reasoning or tool call)"""
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self.usage_tokens = usage.completion_tokens
+            self.prompt_tokens = usage.prompt_tokens
+            details = getattr(usage, "prompt_tokens_details", None)
+            if details is not None and getattr(details, "cached_tokens", None) is not None:
+                self.cached_tokens = details.cached_tokens
+        if not chunk.choices or not chunk.choices[0].delta:
+            return False
+        delta = chunk.choices[0].delta
+        text = (delta.content or "") + (getattr(delta, "reasoning_content", None) or "")
+        for tc in delta.tool_calls or []:
+            if tc.function:
+                text += (tc.function.name or "") + (tc.function.arguments or "")
+        if not text:
+            return False
+        self.chunk_times.append(now)
+        self.chunk_texts.append(text)
+        return True
+
+    def per_chunk_tokens(self):
+        """(tokens per chunk, total output tokens, source of the total)"""
+        n = len(self.chunk_texts)
+        if self.tokenizer is not None:
+            counts, text, prev = [], "", 0
+            for piece in self.chunk_texts:
+                text += piece
+                total = count_tokens(self.tokenizer, text)
+                counts.append(max(0, total - prev))
+                prev = total
+            if self.usage_tokens is not None:
+                return counts, self.usage_tokens, "usage"
+            return counts, prev, "tokenizer"
+        if self.usage_tokens is not None and n > 0:
+            rest = max(0, self.usage_tokens - 1)
+            counts = [1] + [rest / (n - 1)] * (n - 1) if n > 1 else [self.usage_tokens]
+            return counts, self.usage_tokens, "usage"
+        return [1] * n, n, "chunks"
+
+    def summary(self, t_start):
+        """Token metrics for a stream that started at t_start (perf_counter); None if nothing was streamed"""
+        if not self.chunk_times:
+            return None
+        counts, total, source = self.per_chunk_tokens()
+        first, last = self.chunk_times[0], self.chunk_times[-1]
+        decode_tokens = total - counts[0]
+        # Per-token ITL: a chunk's gap is shared by the tokens it carried;
+        # gaps of chunks that decoded to no new token roll into the next one
+        itl, pending = [], 0.0
+        for prev_t, t, k in zip(self.chunk_times, self.chunk_times[1:], counts[1:]):
+            pending += t - prev_t
+            if k > 0:
+                itl.extend([pending / k * 1000] * max(1, round(k)))
+                pending = 0.0
+        itl.sort()
+        return {
+            "ttft_ms": (first - t_start) * 1000,
+            "output_tokens": total,
+            "token_source": source,
+            "chunks": len(self.chunk_times),
+            "tokens_per_chunk": total / len(self.chunk_times),
+            "decode_toks": decode_tokens / (last - first) if decode_tokens > 0 and last > first else 0,
+            "itl_p50_ms": percentile(itl, 50),
+            "itl_p99_ms": percentile(itl, 99),
+            "itl_ms": itl,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+        }
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Tuner: fused MoE kernel configs for GLM-4.7-FP8 on GB10, pruned and seeded
+
+SGLang's tuning_fused_moe_triton.py compiles and times all 1,920 configs
+of its search space at every batch size, ~9 hours on 4 nodes (TUNING.md),
+though most of them cannot run on GB10. This driver:
+  1. prunes the same space before launching anything: shared memory over
+     the device limit, estimated registers per thread over 255 (spills),
+     and BLOCK_SIZE_M larger than the tokens one expert can get (M)
+     (moe_config.py)
+  2. seeds each batch size with the winners of its own and the neighbouring
+     keys in an existing config file (configs/triton_<installed triton>)
+     and with the previous batch size's winner from this run
+  3. hill-climbs from the best seed, one parameter step at a time, until no
+     neighbour is faster (--exhaustive times every surviving candidate)
+The up projection is tuned first; the down projection then searches only
+its BLOCK_SIZE_M, which SGLang requires to match. Timing is
+benchmark_moe_kernel.MoeKernel (CUDA graphs, median of adaptive repeats).
+Output files use SGLang's names and layout, so they can go straight into
+validate_moe_configs.py, benchmark_moe_kernel.py and configs/.
+
+--plan prints the candidate counts and the estimated time without a GPU.
+
+Usage:
+  python tune_moe.py --plan                          # candidates per batch size, time estimate
+  python tune_moe.py                                 # tune all batch sizes -> results/tuned_configs/
+  python tune_moe.py --batch-sizes 1,2,4 --exhaustive
+  python tune_moe.py --seed-from ../configs/triton_3_3_0 --output-dir /tmp/new_configs
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from moe_config import (BATCH_SIZES, CONFIG_FILE, DEFAULT_DEVICE, DEVICE_PROFILES, GEMM_SHAPES, down_path,
+                        default_config_dir, load_pair, registers_per_thread, save_table, shared_memory_bytes,
+                        MAX_REGISTERS_PER_THREAD)
+
+# SGLang's tuning space (get_configs_compute_bound in tuning_fused_moe_triton.py)
+SEARCH_SPACE = {
+    "BLOCK_SIZE_M": [16, 32, 64, 128, 256],
+    "BLOCK_SIZE_N": [32, 64, 128, 256],
+    "BLOCK_SIZE_K": [64, 128, 256],
+    "GROUP_SIZE_M": [1, 16, 32, 64],
+    "num_warps": [4, 8],
+    "num_stages": [2, 3, 4, 5],
+}
+DTYPE = "fp8_w8a8"
+# TUNING.md: ~9 h on 4 nodes for the full space, both projections, every batch size
+SECONDS_PER_CANDIDATE = 9 * 3600 * 4 / (2 * len(BATCH_SIZES) * 1920)
+MAX_EVALS = 200  # per batch size and projection, hill climbing only
+OUTPUT_DIR = "results/tuned_configs"
+
+def next_pow2(n):
+    return 1 << max(0, n - 1).bit_length()
+
+def candidates():
+    keys = list(SEARCH_SPACE)
+    return [dict(zip(keys, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+
+def prune_reason(config, m, gemm, device=DEFAULT_DEVICE, dtype=DTYPE):
+    """Why config cannot win at M tokens for this projection, or None if it must be timed"""
+    if shared_memory_bytes(config, dtype) > DEVICE_PROFILES[device]["shared_memory_bytes"]:
+        return "shared memory"
+    if registers_per_thread(config, dtype) > MAX_REGISTERS_PER_THREAD:
+        return "registers"
+    # An expert gets at most M of the M x top-k routed rows: larger blocks only add padding
+    if config["BLOCK_SIZE_M"] > max(SEARCH_SPACE["BLOCK_SIZE_M"][0], next_pow2(m)):
+        return "BLOCK_SIZE_M > M"
+    n, k = GEMM_SHAPES[gemm]
+    if config["BLOCK_SIZE_N"] > next_pow2(n) or config["BLOCK_SIZE_K"] > next_pow2(k):
+        return "tile > GEMM"
+    return None
+
+def plan(m, gemm, device=DEFAULT_DEVICE, block_m=None):
+    """(surviving candidates, {reason: count}) for one batch size and projection"""
+    kept, pruned = [], {}
+    for config in candidates():
+        if block_m is not None and config["BLOCK_SIZE_M"] != block_m:
+            pruned["BLOCK_SIZE_M != up"] = pruned.get("BLOCK_SIZE_M != up", 0) + 1
+            continue
+        reason = prune_reason(config, m, gemm, device)
+        if reason:
+            pruned[reason] = pruned.get(reason, 0) + 1
+        else:
+            kept.append(config)
+    return kept, pruned
+
+def config_key(config):
+    return tuple(config[key] for key in SEARCH_SPACE)
+
+def neighbours(config):
+    """Configs one step away in one parameter of SEARCH_SPACE"""
+    for key, values in SEARCH_SPACE.items():
+        i = values.index(config[key]) if config[key] in values else None
+        for j in (i - 1, i + 1) if i is not None else ():
+            if 0 <= j < len(values):
+                yield {**config, key: values[j]}
+
+def seeds_for(m, table, previous=None):
+    """Entries of an existing table at M and its neighbouring keys, then the last winner"""
+    seeds = []
+    if table:
+        keys = sorted(table)
+        i = min(range(len(keys)), key=lambda i: abs(keys[i] - m))
+        seeds += [table[keys[j]] for j in (i, i - 1, i + 1) if 0 <= j < len(keys)]
+    if previous:
+        seeds.append(previous)
+    return [{key: seed[key] for key in SEARCH_SPACE} for seed in seeds if all(key in seed for key in SEARCH_SPACE)]
+
+def search(m, gemm, measure, seeds, device=DEFAULT_DEVICE, block_m=None, exhaustive=False, max_evals=MAX_EVALS):
+    """Fastest config for one batch size and projection
+
+    measure(m, gemm, config) returns µs or None if the config fails. Returns
+    (best config or None, best µs, {config_key: µs} of everything timed).
+    """
+    kept, _ = plan(m, gemm, device, block_m)
+    allowed = {config_key(c) for c in kept}
+    timings = {}
+
+    def timed(config):
+        key = config_key(config)
+        if key not in timings:
+            timings[key] = measure(m, gemm, config)
+        return timings[key]
+
+    if exhaustive:
+        for config in kept:
+            timed(config)
+    else:
+        start = [s for s in seeds if config_key(s) in allowed] or kept[:1]
+        for config in start:
+            timed(config)
+        improved = True
+        while improved and len(timings) < max_evals:
+            improved = False
+            best_key = min((k for k, us in timings.items() if us is not None), key=timings.get, default=None)
+            if best_key is None:
+                break
+            best = dict(zip(SEARCH_SPACE, best_key))
+            for config in neighbours(best):
+                if config_key(config) in allowed and config_key(config) not in timings and len(timings) < max_evals:
+                    us = timed(config)
+                    if us is not None and us < timings[best_key]:
+                        improved = True
+    ok = {k: us for k, us in timings.items() if us is not None}
+    if not ok:
+        return None, None, timings
+    best_key = min(ok, key=ok.get)
+    return dict(zip(SEARCH_SPACE, best_key)), ok[best_key], timings
+
+def kernel_measure():
+    """measure() backed by the GPU: median µs of one projection, None if it does not compile/launch"""
+    from benchmark_moe_kernel import MoeKernel
+    kernel = MoeKernel()
+
+    def measure(m, gemm, config):
+        try:
+            samples = kernel.time_us(m, config if gemm == "up" else None, config if gemm == "down" else None)
+        except Exception:
+            return None
+        return statistics.median(samples) if samples else None
+
+    return measure
+
+def tune(batch_sizes, measure, seed_tables, device=DEFAULT_DEVICE, exhaustive=False, log=print):
+    """{"up": {M: config}, "down": {M: config}} and per-batch-size search records"""
+    tables, records, previous = {"up": {}, "down": {}}, [], {"up": None, "down": None}
+    for m in batch_sizes:
+        for gemm in ("up", "down"):
+            block_m = tables["up"][m]["BLOCK_SIZE_M"] if gemm == "down" else None
+            seeds = seeds_for(m, seed_tables[gemm], previous[gemm])
+            t_start = time.perf_counter()
+            best, best_us, timings = search(m, gemm, measure, seeds, device, block_m, exhaustive)
+            if best is None:
+                raise SystemExit(f"M={m} {gemm}: no candidate compiled")
+            seed_us = min((timings[config_key(s)] for s in seeds if timings.get(config_key(s)) is not None), default=None)
+            tables[gemm][m] = previous[gemm] = best
+            records.append({"m": m, "gemm": gemm, "timed": len(timings),
+                            "failed": sum(1 for us in timings.values() if us is None),
+                            "best": best, "best_us": round(best_us, 2),
+                            "best_seed_us": round(seed_us, 2) if seed_us is not None else None,
+                            "search_s": round(time.perf_counter() - t_start, 1)})
+            log(f"  M={m:<5} {gemm:<4} {len(timings):>4} timed, best {best_us:.1f} µs"
+                f"{f' (seed {seed_us:.1f} µs)' if seed_us is not None else ''}")
+    return tables, records
+
+def load_seed_tables(seed_path):
+    """({"up": table, "down": table}, path) from a config file or directory; empty tables for None"""
+    if seed_path is None:
+        return {"up": None, "down": None}, None
+    if os.path.isdir(seed_path):
+        seed_path = os.path.join(seed_path, CONFIG_FILE)
+    up, down = load_pair(seed_path)
+    return {"up": up, "down": down}, seed_path
+
+def save_results(output_dir, device, tables, summary):
+    """Write the tuned config pair and results/moe_tuning.json; returns the up-projection path"""
+    os.makedirs(output_dir, exist_ok=True)
+    up_path = os.path.join(output_dir, CONFIG_FILE.replace(DEFAULT_DEVICE, device))
+    save_table(up_path, tables["up"])
+    save_table(down_path(up_path), tables["down"])
+    os.makedirs("results", exist_ok=True)
+    with open("results/moe_tuning.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return up_path
+
+def print_plan(batch_sizes, seed_tables, device):
+    total = len(candidates())
+    print(f"{'M':>5} | {'Up':>5} | {'Down':>5} | Pruned (up)")
+    print("-" * 100)
+    kept_total = 0
+    for m in batch_sizes:
+        up_kept, up_pruned = plan(m, "up", device)
+        seeds = seeds_for(m, seed_tables["up"])
+        block_m = seeds[0]["BLOCK_SIZE_M"] if seeds else min(c["BLOCK_SIZE_M"] for c in up_kept)
+        down_kept, _ = plan(m, "down", device, block_m)
+        kept_total += len(up_kept) + len(down_kept)
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(up_pruned.items(), key=lambda kv: -kv[1]))
+        print(f"{m:>5} | {len(up_kept):>5} | {len(down_kept):>5} | {reasons}")
+    full = total * 2 * len(batch_sizes)
+    print(f"\nSearch space: {total} configs per batch size and projection, {full} in all")
+    print(f"After pruning: {kept_total} ({kept_total / full * 100:.1f}%), "
+          f"~{kept_total * SECONDS_PER_CANDIDATE / 3600:.1f} h on one GPU with --exhaustive "
+          f"(at {SECONDS_PER_CANDIDATE:.1f} s per candidate, TUNING.md's 9 h x 4 nodes)")
+    print(f"Hill climbing stops at the first config no neighbour beats (at most {MAX_EVALS} per batch size and projection)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=BATCH_SIZES,
+                        help="comma-separated M values (default: the SGLang tuner's 18)")
+    parser.add_argument("--seed-from", default=None,
+                        help="config file or directory to seed from (default: configs/triton_<installed triton>)")
+    parser.add_argument("--no-seed", action="store_true", help="start from the first surviving candidate")
+    parser.add_argument("--device", choices=sorted(DEVICE_PROFILES), default=DEFAULT_DEVICE)
+    parser.add_argument("--exhaustive", action="store_true", help="time every candidate that survives pruning")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--plan", action="store_true", help="print candidate counts and a time estimate, no GPU needed")
+    args = parser.parse_args()
+
+    seed_tables, seed_path = load_seed_tables(None if args.no_seed else args.seed_from or default_config_dir())
+
+    print("=" * 100)
+    print(f"  Tuner: fused MoE configs, {args.device}, {DTYPE}, {len(args.batch_sizes)} batch sizes")
+    print(f"  seeds: {seed_path or 'none'}")
+    print("=" * 100)
+    if args.plan:
+        print_plan(args.batch_sizes, seed_tables, args.device)
+        return
+
+    t_start = time.perf_counter()
+    tables, records = tune(args.batch_sizes, kernel_measure(), seed_tables, args.device, args.exhaustive)
+    elapsed = time.perf_counter() - t_start
+
+    up_path = save_results(args.output_dir, args.device, tables, {
+        "device": args.device, "exhaustive": args.exhaustive, "seed_from": seed_path,
+        "elapsed_s": round(elapsed, 1), "searches": records})
+
+    print(f"\nTuned {len(args.batch_sizes)} batch sizes in {elapsed / 60:.1f} min, "
+          f"{sum(r['timed'] for r in records)} candidates timed")
+    print(f"Saved {up_path} (+ _down.json) and results/moe_tuning.json")
+    print(f"Check: python benchmark_moe_kernel.py {up_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""Tuner (distributed): tune_moe.py across the Ray cluster or a local process pool, checkpointed and resumable
+
+The Ray procedure in TUNING.md is one job: if a node drops, everything it
+timed is lost. Here the search is split into tasks, one per batch size and
+projection (or, with --exhaustive, chunks of CHUNK_SIZE candidates). The
+up projections run first; the down projections then run with the up
+winner's BLOCK_SIZE_M. Every timing is appended to
+<checkpoint dir>/<task>.jsonl the moment it is measured. A rerun of the same
+command loads those files and replays them instead of timing again, so an
+interrupted run resumes where it stopped and a finished task costs nothing.
+On Ray the checkpoint lives only on the head node: workers send each timing
+to a CheckpointWriter actor pinned there, and a task (or its retry after a
+lost node) starts from what the writer holds at that moment, so nothing a
+lost node measured has to be timed again. The checkpoint directory also
+holds a manifest of what its timings are (timing source, device, dtype,
+search space); a run that does not match it stops instead of resuming, and
+--fake-timing checkpoints to a directory of its own.
+Results from all shards are merged per batch size (fastest timing wins)
+into the usual config pair.
+
+Tasks run as Ray tasks with one GPU each when Ray is installed and a
+cluster is reachable (ray start ..., see TUNING.md); Ray retries tasks of a
+lost node. Otherwise they run in a local process pool, worker i on GPU i.
+Hill climbing in parallel seeds each batch size from the existing configs
+only (not from the previous batch size's winner, as tune_moe.py does).
+
+--fake-timing replaces the kernel with a synthetic cost model, so the
+orchestration can be tried on any machine (test_tune_resume.py does).
+
+Usage:
+  python tune_moe_distributed.py                           # Ray if available, else local pool
+  python tune_moe_distributed.py --exhaustive --workers 4  # local pool of 4 GPUs
+  python tune_moe_distributed.py --fake-timing --no-ray --workers 4 --output-dir /tmp/fake  # checkpoint: results/tuning_checkpoint_fake
+  (interrupt and rerun the same command to resume; --fresh discards the checkpoint)
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import time
+from moe_config import BATCH_SIZES, DEFAULT_DEVICE, DEVICE_PROFILES, default_config_dir
+from tune_moe import (DTYPE, OUTPUT_DIR, SEARCH_SPACE, config_key, kernel_measure, load_seed_tables, plan,
+                      save_results, search, seeds_for)
+
+CHECKPOINT_DIR = "results/tuning_checkpoint"
+FAKE_CHECKPOINT_DIR = "results/tuning_checkpoint_fake"  # synthetic µs must never be resumed by a real run
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 64  # candidates per task with --exhaustive (~2 min at TUNING.md's pace)
+GEMMS = ("up", "down")
+
+def fake_measure(m, gemm, config):
+    """Deterministic synthetic µs: smooth in every parameter, optimum moving with M"""
+    cost = abs(math.log2(config["BLOCK_SIZE_M"]) - math.log2(min(128, max(16, m))))
+    cost += abs(math.log2(config["BLOCK_SIZE_N"]) - (6 if gemm == "up" else 7))
+    cost += abs(math.log2(config["BLOCK_SIZE_K"]) - 7) + 0.3 * abs(config["num_stages"] - 3)
+    cost += 0.2 * (config["num_warps"] == 4) + 0.05 * math.log2(config["GROUP_SIZE_M"] + 1)
+    return round(10 + m / 40 + cost, 3)
+
+def fake_measure_factory():
+    return fake_measure
+
+def load_checkpoint(directory):
+    """{(m, gemm): {config_key: µs or None}} from every task file; a torn last line is skipped"""
+    timings = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                timings.setdefault((record["m"], record["gemm"]), {})[config_key(record["config"])] = record["us"]
+    return timings
+
+def checkpoint_manifest(timing, device, dtype=DTYPE):
+    """What a checkpoint's timings were measured with (timing: "kernel" or "fake")"""
+    return {"timing": timing, "device": device, "dtype": dtype, "search_space": SEARCH_SPACE}
+
+def claim_checkpoint(directory, manifest):
+    """Write the manifest into a new checkpoint; ValueError if the directory holds timings of anything else"""
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        differ = [key for key in manifest if existing.get(key) != manifest[key]]
+        if differ:
+            raise ValueError(f"{directory} holds timings for a different {', '.join(differ)} "
+                             f"({', '.join(f'{key}={existing.get(key)}' for key in differ if key != 'search_space')}); "
+                             f"pass --fresh to discard them or use another --checkpoint-dir")
+        return
+    if glob.glob(os.path.join(directory, "*.jsonl")):
+        raise ValueError(f"{directory} holds timings without a {MANIFEST}, so their source is unknown; "
+                         f"pass --fresh to discard them or use another --checkpoint-dir")
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+def open_checkpoint(directory, task_id):
+    path = os.path.join(directory, task_id + ".jsonl")
+    torn = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read() != b"\n"
+    f = open(path, "a")
+    if torn:
+        f.write("\n")
+    return f
+
+def append_record(f, m, gemm, config, us):
+    f.write(json.dumps({"m": m, "gemm": gemm, "config": dict(zip(SEARCH_SPACE, config_key(config))), "us": us}) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def make_tasks(phase, batch_sizes, seed_tables, device, exhaustive, block_ms=None):
+    tasks = []
+    for m in batch_sizes:
+        block_m = block_ms[m] if phase == "down" else None
+        task = {"m": m, "gemm": phase, "block_m": block_m}
+        if exhaustive:
+            kept, _ = plan(m, phase, device, block_m)
+            for part, i in enumerate(range(0, len(kept), CHUNK_SIZE)):
+                tasks.append({**task, "id": f"M={m},{phase},part={part}", "candidates": kept[i:i + CHUNK_SIZE]})
+        else:
+            tasks.append({**task, "id": f"M={m},{phase}", "seeds": seeds_for(m, seed_tables[phase])})
+    return tasks
+
+def run_task(task, cached, record, measure, device):
+    """Time one task, replaying cached timings and passing new ones to record(m, gemm, config, µs)
+
+    Returns (task id, {config_key: µs}, newly timed).
+    """
+    m, gemm = task["m"], task["gemm"]
+    timed = 0
+
+    def checkpointed(m, gemm, config):
+        nonlocal timed
+        key = config_key(config)
+        if key not in cached:
+            cached[key] = measure(m, gemm, config)
+            record(m, gemm, config, cached[key])
+            timed += 1
+        return cached[key]
+
+    if "candidates" in task:
+        timings = {config_key(c): checkpointed(m, gemm, c) for c in task["candidates"]}
+    else:
+        _, _, timings = search(m, gemm, checkpointed, task["seeds"], device, task["block_m"])
+    return task["id"], timings, timed
+
+class CheckpointWriter:
+    """The checkpoint on the head node, written for Ray workers (run as an actor pinned to the head)"""
+
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        self.timings = load_checkpoint(checkpoint_dir)
+        self.files = {}
+
+    def cached(self, m, gemm):
+        return dict(self.timings.get((m, gemm), {}))
+
+    def append(self, task_id, m, gemm, config, us):
+        if task_id not in self.files:
+            self.files[task_id] = open_checkpoint(self.checkpoint_dir, task_id)
+        append_record(self.files[task_id], m, gemm, config, us)
+        self.timings.setdefault((m, gemm), {})[config_key(config)] = us
+
+_worker_measure = None
+
+def _init_pool_worker(measure_factory, gpu_ids):
+    global _worker_measure
+    if gpu_ids is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_ids.get())
+    _worker_measure = measure_factory()
+
+def _pool_task(task, cached, checkpoint_dir, device):
+    with open_checkpoint(checkpoint_dir, task["id"]) as f:
+        return run_task(task, cached, lambda *timing: append_record(f, *timing), _worker_measure, device)
+
+def _ray_task(task, writer, device, measure_factory):
+    import ray
+    cached = ray.get(writer.cached.remote(task["m"], task["gemm"]))  # up to date on a retry too
+    record = lambda *timing: ray.get(writer.append.remote(task["id"], *timing))  # durable on the head before going on
+    return run_task(task, cached, record, measure_factory(), device)
+
+def connect_ray():
+    """The ray module if a cluster is reachable, else None"""
+    try:
+        import ray
+    except ImportError:
+        return None
+    try:
+        ray.init(address=os.environ.get("RAY_ADDRESS", "auto"), ignore_reinit_error=True)
+    except ConnectionError:
+        return None
+    return ray
+
+def run_phase(tasks, checkpoint, checkpoint_dir, device, measure_factory, workers, ray=None, pin_gpus=True, log=print):
+    """Run tasks; returns ({task id: timings}, {task id: error}) and folds new timings into checkpoint"""
+    results, errors = {}, {}
+
+    def done(task, outcome):
+        task_id, timings, timed = outcome
+        checkpoint.setdefault((task["m"], task["gemm"]), {}).update(timings)
+        results[task_id] = timings
+        log(f"  {task_id:<24} {len(timings):>4} configs, {timed:>4} timed, "
+            f"{len(timings) - timed:>4} from checkpoint ({len(results)}/{len(tasks)})")
+
+    if ray is not None:
+        from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+        head = NodeAffinitySchedulingStrategy(ray.get_runtime_context().get_node_id(), soft=False)
+        writer = ray.remote(num_cpus=0, scheduling_strategy=head)(CheckpointWriter).remote(os.path.abspath(checkpoint_dir))
+        remote = ray.remote(num_gpus=0 if measure_factory is fake_measure_factory else 1, max_retries=3)(_ray_task)
+        pending = {remote.remote(t, writer, device, measure_factory): t for t in tasks}
+        while pending:
+            ready, _ = ray.wait(list(pending), num_returns=1)
+            task = pending.pop(ready[0])
+            try:
+                outcome = ray.get(ready[0])
+            except Exception as e:  # retries exhausted (node lost for good) or worker error
+                errors[task["id"]] = f"{type(e).__name__}: {e}"
+                log(f"  {task['id']:<24} ❌ {errors[task['id']]}")
+                continue
+            done(task, outcome)
+        return results, errors
+
+    gpu_ids = None
+    if pin_gpus:
+        gpu_ids = multiprocessing.Queue()
+        for i in range(workers):
+            gpu_ids.put(i)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_pool_worker,
+                                                initargs=(measure_factory, gpu_ids)) as pool:
+        futures = {pool.submit(_pool_task, t, dict(checkpoint.get((t["m"], t["gemm"]), {})), checkpoint_dir, device): t
+                   for t in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            task = futures[future]
+            try:
+                done(task, future.result())
+            except Exception as e:
+                errors[task["id"]] = f"{type(e).__name__}: {e}"
+                log(f"  {task['id']:<24} ❌ {errors[task['id']]}")
+    return results, errors
+
+def merge(checkpoint, batch_sizes, gemm, block_ms=None):
+    """{M: (best config, µs)} over every timing of every shard; down entries only with the up BLOCK_SIZE_M"""
+    best = {}
+    for m in batch_sizes:
+        ok = {key: us for key, us in checkpoint.get((m, gemm), {}).items()
+              if us is not None and (block_ms is None or key[0] == block_ms[m])}
+        if ok:
+            key = min(ok, key=ok.get)
+            best[m] = (dict(zip(SEARCH_SPACE, key)), ok[key])
+    return best
+
+def orchestrate(batch_sizes, seed_tables, checkpoint_dir, measure_factory, workers=1, device=DEFAULT_DEVICE,
+                exhaustive=False, ray=None, pin_gpus=True, log=print, timing="kernel"):
+    """Tune every batch size; returns (tables, records)
+
+    Raises ValueError if checkpoint_dir holds timings of another timing
+    source, device, dtype or search space, and RuntimeError naming the
+    failed tasks.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    claim_checkpoint(checkpoint_dir, checkpoint_manifest(timing, device))
+    checkpoint = load_checkpoint(checkpoint_dir)
+    if checkpoint:
+        log(f"Resuming: {sum(len(t) for t in checkpoint.values())} timings in {checkpoint_dir}")
+    tables, winners, block_ms = {}, {}, None
+    for gemm in GEMMS:
+        tasks = make_tasks(gemm, batch_sizes, seed_tables, device, exhaustive, block_ms)
+        log(f"\n--- {gemm} projection: {len(tasks)} tasks on {'Ray' if ray else f'{workers} local workers'} ---")
+        results, errors = run_phase(tasks, checkpoint, checkpoint_dir, device, measure_factory, workers, ray,
+                                    pin_gpus, log)
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(tasks)} {gemm} tasks failed ({', '.join(sorted(errors))}); "
+                               f"rerun to resume from {checkpoint_dir}")
+        winners[gemm] = merge(checkpoint, batch_sizes, gemm, block_ms)
+        missing = [m for m in batch_sizes if m not in winners[gemm]]
+        if missing:
+            raise RuntimeError(f"no {gemm} candidate compiled for M={', '.join(map(str, missing))}")
+        tables[gemm] = {m: config for m, (config, _) in winners[gemm].items()}
+        block_ms = {m: config["BLOCK_SIZE_M"] for m, config in tables["up"].items()}
+    records = [{"m": m, "gemm": gemm, "timed": len(checkpoint.get((m, gemm), {})),
+                "best": winners[gemm][m][0], "best_us": winners[gemm][m][1]}
+               for m in batch_sizes for gemm in GEMMS]
+    return tables, records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=BATCH_SIZES,
+                        help="comma-separated M values (default: the SGLang tuner's 18)")
+    parser.add_argument("--seed-from", default=None,
+                        help="config file or directory to seed from (default: configs/triton_<installed triton>)")
+    parser.add_argument("--no-seed", action="store_true", help="start from the first surviving candidate")
+    parser.add_argument("--device", choices=sorted(DEVICE_PROFILES), default=DEFAULT_DEVICE)
+    parser.add_argument("--exhaustive", action="store_true", help="time every candidate that survives pruning")
+    parser.add_argument("--workers", type=int, default=1, help="local pool size (one per GPU) when Ray is not used")
+    parser.add_argument("--no-ray", action="store_true", help="use the local pool even if Ray is available")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help=f"default: {CHECKPOINT_DIR} ({FAKE_CHECKPOINT_DIR} with --fake-timing)")
+    parser.add_argument("--fresh", action="store_true", help="discard the checkpoint and start over")
+    parser.add_argument("--fake-timing", action="store_true", help="synthetic timings instead of the GPU kernel")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+    args.checkpoint_dir = args.checkpoint_dir or (FAKE_CHECKPOINT_DIR if args.fake_timing else CHECKPOINT_DIR)
+
+    seed_tables, seed_path = load_seed_tables(None if args.no_seed else args.seed_from or default_config_dir())
+    if args.fresh and os.path.isdir(args.checkpoint_dir):
+        shutil.rmtree(args.checkpoint_dir)
+    ray = None if args.no_ray else connect_ray()
+    measure_factory = fake_measure_factory if args.fake_timing else kernel_measure
+
+    print("=" * 100)
+    print(f"  Tuner (distributed): fused MoE configs, {args.device}, {DTYPE}, {len(args.batch_sizes)} batch sizes")
+    print(f"  {'Ray cluster: ' + str(int(ray.cluster_resources().get('GPU', 0))) + ' GPUs' if ray else f'local pool: {args.workers} workers'}"
+          f"{', fake timing' if args.fake_timing else ''}")
+    print(f"  seeds: {seed_path or 'none'}, checkpoint: {args.checkpoint_dir}")
+    print("=" * 100)
+
+    t_start = time.perf_counter()
+    try:
+        tables, records = orchestrate(args.batch_sizes, seed_tables, args.checkpoint_dir, measure_factory, args.workers,
+                                      args.device, args.exhaustive, ray, pin_gpus=not args.fake_timing,
+                                      timing="fake" if args.fake_timing else "kernel")
+    except ValueError as e:
+        raise SystemExit(f"\nNot resuming: {e}")
+    except (RuntimeError, KeyboardInterrupt) as e:
+        raise SystemExit(f"\nStopped: {e or 'interrupted'}. Timings so far are in {args.checkpoint_dir}; "
+                         f"rerun the same command to resume.")
+    elapsed = time.perf_counter() - t_start
+    up_path = save_results(args.output_dir, args.device, tables, {
+        "device": args.device, "exhaustive": args.exhaustive, "seed_from": seed_path, "distributed": bool(ray),
+        "fake_timing": args.fake_timing, "elapsed_s": round(elapsed, 1), "searches": records})
+
+    print(f"\nTuned {len(args.batch_sizes)} batch sizes in {elapsed / 60:.1f} min, "
+          f"{sum(r['timed'] for r in records)} timings in {args.checkpoint_dir}")
+    print(f"Saved {up_path} (+ _down.json) and results/moe_tuning.json")
+    print(f"Check: python validate_moe_configs.py {args.output_dir} && python benchmark_moe_kernel.py {up_path}")
+
+if __name__ == "__main__":
+    main()
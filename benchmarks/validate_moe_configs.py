@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Config Check: shared memory of every fused MoE config entry vs the device limit
+
+A config entry that needs more shared memory than the GPU has (GB10:
+101,376 bytes per program) only fails when the server first runs that
+batch size, with OutOfResources. This checks every entry of every config
+file offline, without torch or a GPU: the estimated shared memory
+(moe_config.shared_memory_bytes: BLOCK_SIZE_M/N/K, num_stages and the
+element size of the file's dtype), the launch parameters, and that the up
+and _down.json files agree on BLOCK_SIZE_M. The device comes from the
+device_name in the file name (see moe_config.DEVICE_PROFILES) unless
+--device is given. Exits non-zero if any entry fails; build-and-deploy.sh
+runs it before building the image.
+
+Usage:
+  python validate_moe_configs.py                     # every file under configs/
+  python validate_moe_configs.py ../configs/triton_3_5_0 --failures-only
+  python validate_moe_configs.py /tmp/variant.json --device NVIDIA_GB10
+"""
+import argparse
+import os
+import sys
+from moe_config import (DEVICE_PROFILES, REPO_CONFIGS, check_launch, down_path, find_config_files, load_table,
+                        parse_name, shared_memory_bytes)
+
+def validate_file(path, device=None):
+    """(device, [row per entry]) for one config file; rows carry the entry's problems"""
+    info = parse_name(path)
+    device = device or info["device_name"]
+    if device not in DEVICE_PROFILES:
+        raise SystemExit(f"{path}: no shared memory profile for device {device!r} "
+                         f"(known: {', '.join(DEVICE_PROFILES)}); pass --device")
+    limit = DEVICE_PROFILES[device]["shared_memory_bytes"]
+    gemm = "down" if info["down"] else "up"
+    rows = []
+    for m, config in sorted(load_table(path).items()):
+        problems = check_launch(config, m, gemm, device, info["dtype"])
+        try:
+            needed = shared_memory_bytes(config, info["dtype"])
+        except (KeyError, TypeError):
+            needed = None
+        rows.append({"m": m, "config": config, "shared_memory": needed,
+                     "pct": round(needed / limit * 100, 1) if needed is not None else None, "problems": problems})
+    return device, rows
+
+def check_block_m(up_path):
+    """[(M, problem)] where the up file and its _down.json pick a different BLOCK_SIZE_M"""
+    if not os.path.isfile(down_path(up_path)):
+        return []
+    up, down = load_table(up_path), load_table(down_path(up_path))
+    return [(m, f"BLOCK_SIZE_M {up[m].get('BLOCK_SIZE_M')} (up) != {down[m].get('BLOCK_SIZE_M')} (down)")
+            for m in sorted(set(up) & set(down)) if up[m].get("BLOCK_SIZE_M") != down[m].get("BLOCK_SIZE_M")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[REPO_CONFIGS], help="config files or directories (default: configs/)")
+    parser.add_argument("--device", choices=sorted(DEVICE_PROFILES), default=None,
+                        help="check against this device instead of the one in each file name")
+    parser.add_argument("--failures-only", action="store_true", help="print only entries with problems")
+    args = parser.parse_args()
+
+    up_files = [p for root in args.paths for p in find_config_files(root)]
+    files = [f for p in up_files for f in (p, down_path(p)) if os.path.isfile(f)]
+    if not files:
+        sys.exit(f"no config files under {', '.join(args.paths)}")
+
+    failed = checked = 0
+    print("=" * 100)
+    print(f"  Config Check: shared memory and launch parameters, {len(files)} files")
+    print("=" * 100)
+    for path in files:
+        device, rows = validate_file(path, args.device)
+        if not parse_name(path)["down"]:
+            for m, problem in check_block_m(path):
+                next(r for r in rows if r["m"] == m)["problems"].append(problem)
+        bad = [r for r in rows if r["problems"]]
+        failed += len(bad)
+        checked += len(rows)
+        limit = DEVICE_PROFILES[device]["shared_memory_bytes"]
+        print(f"\n{'✅' if not bad else '❌'} {path}  ({device}, {limit:,} bytes, {len(bad)}/{len(rows)} entries fail)")
+        if args.failures_only and not bad:
+            continue
+        print(f"{'M':>6} | {'BM x BN x BK':>15} | {'Stages':>6} | {'Shared mem':>10} | {'Of limit':>8} | Status")
+        print("-" * 100)
+        for r in (bad if args.failures_only else rows):
+            c = r["config"]
+            tile = f"{c.get('BLOCK_SIZE_M')}x{c.get('BLOCK_SIZE_N')}x{c.get('BLOCK_SIZE_K')}"
+            needed = f"{r['shared_memory']:,}" if r["shared_memory"] is not None else "-"
+            pct = f"{r['pct']:.0f}%" if r["pct"] is not None else "-"
+            status = "✅" if not r["problems"] else "❌ " + "; ".join(r["problems"])
+            print(f"{r['m']:>6} | {tile:>15} | {str(c.get('num_stages')):>6} | {needed:>10} | {pct:>8} | {status}")
+
+    print("\n" + "=" * 100)
+    print(f"{checked - failed}/{checked} entries OK in {len(files)} files")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -72,6 +72,13 @@ if [ "$BUILD" = true ]; then
         exit 1
     fi
 
+    # Reject MoE configs that would overflow GB10 shared memory (OutOfResources at runtime)
+    log_info "Validating MoE kernel configs"
+    if ! python3 benchmarks/validate_moe_configs.py configs --failures-only; then
+        log_error "MoE config validation failed"
+        exit 1
+    fi
+
     docker build -t ${IMAGE_NAME}:${IMAGE_TAG} .
     log_success "Image built successfully"
 
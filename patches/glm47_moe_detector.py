@@ -1,14 +1,28 @@
 import ast
+import hashlib
 import json
 import logging
 import re
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from json.encoder import encode_basestring
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from sglang.srt.entrypoints.openai.protocol import Tool
 from sglang.srt.function_call.base_format_detector import BaseFormatDetector
 from sglang.srt.function_call.core_types import (
     StreamingParseResult,
+    StructureInfo,
     ToolCallItem,
     _GetInfoFunc,
 )
@@ -16,6 +30,16 @@ from sglang.srt.function_call.utils import infer_type_from_json_schema
 
 logger = logging.getLogger(__name__)
 
+# End of the function name inside <tool_call>: either the first argument or the
+# closing tag. The overlap keeps a partially received marker in the next search.
+_NAME_END_REGEX = re.compile(r"<arg_key|</tool_call>")
+_NAME_END_OVERLAP = len("</tool_call>") - 1
+
+_FUNC_ARG_REGEX = re.compile(
+    r"<arg_key>(.*?)</arg_key>(?:\\n|\s)*<arg_value>(.*?)</arg_value>",
+    re.DOTALL,
+)
+
 
 class StreamState(str, Enum):
     """State machine states for XML to JSON streaming conversion."""
@@ -27,23 +51,249 @@ class StreamState(str, Enum):
     IN_VALUE = "IN_VALUE"
 
 
+_ARG_VALUE_END = "</arg_value>"
+
+# Tag that ends each state of the XML to JSON state machine.
+_STATE_END_TAGS = {
+    StreamState.INIT: "<arg_key>",
+    StreamState.BETWEEN: "<arg_key>",
+    StreamState.IN_KEY: "</arg_key>",
+    StreamState.WAITING_VALUE: "<arg_value>",
+    StreamState.IN_VALUE: _ARG_VALUE_END,
+}
+
+
+_MAX_REF_HOPS = 8
+
+
+def _resolve_local_ref(spec: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    """Follow ``#/...`` ``$ref`` pointers from ``spec`` within ``root``."""
+    for _ in range(_MAX_REF_HOPS):
+        ref = spec.get("$ref")
+        if not isinstance(ref, str) or not ref.startswith("#/"):
+            return spec
+        node: Any = root
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            if not isinstance(node, dict) or part not in node:
+                return spec
+            node = node[part]
+        if not isinstance(node, dict):
+            return spec
+        spec = node
+    return spec
+
+
+# with_strict -> (tools list, key) of the last list hashed. The serving layer
+# passes the same list object for every call of a request, so an identity
+# check skips re-serializing it per argument.
+_LAST_TOOLS_KEYS: Dict[bool, Tuple[List[Tool], str]] = {}
+
+
+def _tools_key(tools: List[Tool], with_strict: bool = False) -> str:
+    """Canonical hash of the tool names and parameter schemas (and ``strict`` flags)."""
+    last = _LAST_TOOLS_KEYS.get(with_strict)
+    if last is not None and last[0] is tools:
+        return last[1]
+    canonical = json.dumps(
+        [
+            [tool.function.name, getattr(tool.function, "parameters", None)]
+            + ([bool(getattr(tool.function, "strict", False))] if with_strict else [])
+            for tool in tools
+        ],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    _LAST_TOOLS_KEYS[with_strict] = (tools, key)
+    return key
+
+
+class ToolSchemaIndex:
+    """Inferred argument types, constraints and tool indices for one tools list.
+
+    Maps ``(func_name, arg_key)`` to the type returned by
+    ``infer_type_from_json_schema`` and to the argument's ``enum`` (or
+    ``const``), and each function to its required arguments. Indexes are
+    shared through a small LRU keyed by a hash of the tool names and
+    parameter schemas, so requests that send an identical tools list reuse
+    the same index.
+    """
+
+    _cache: "OrderedDict[str, ToolSchemaIndex]" = OrderedDict()
+    _cache_size = 64
+
+    def __init__(self, tools: List[Tool]):
+        # Same mapping as BaseFormatDetector._get_tool_indices
+        self.tool_indices: Dict[str, int] = {
+            tool.function.name: i for i, tool in enumerate(tools) if tool.function.name
+        }
+        self._arg_types: Dict[Tuple[str, str], Optional[str]] = {}
+        self._arg_enums: Dict[Tuple[str, str], List[Any]] = {}
+        self._required: Dict[str, Tuple[str, ...]] = {}
+        for tool in tools:
+            params = getattr(tool.function, "parameters", None)
+            if not isinstance(params, dict):
+                continue
+            required = params.get("required")
+            if isinstance(required, list):
+                self._required[tool.function.name] = tuple(
+                    key for key in required if isinstance(key, str)
+                )
+            properties = params.get("properties")
+            if not isinstance(properties, dict):
+                continue
+            for arg_key, arg_spec in properties.items():
+                if isinstance(arg_spec, dict):
+                    self._arg_types[(tool.function.name, arg_key)] = (
+                        infer_type_from_json_schema(arg_spec, root=params)
+                    )
+                    resolved = _resolve_local_ref(arg_spec, params)
+                    if isinstance(resolved.get("enum"), list):
+                        self._arg_enums[(tool.function.name, arg_key)] = resolved["enum"]
+                    elif "const" in resolved:
+                        self._arg_enums[(tool.function.name, arg_key)] = [resolved["const"]]
+
+    @staticmethod
+    def tools_key(tools: List[Tool]) -> str:
+        return _tools_key(tools)
+
+    @classmethod
+    def for_tools(cls, tools: List[Tool]) -> "ToolSchemaIndex":
+        key = _tools_key(tools)
+        index = cls._cache.get(key)
+        if index is not None:
+            cls._cache.move_to_end(key)
+            return index
+        index = cls(tools)
+        cls._cache[key] = index
+        if len(cls._cache) > cls._cache_size:
+            cls._cache.popitem(last=False)
+        return index
+
+    def get(self, func_name: str, arg_key: str) -> Optional[str]:
+        return self._arg_types.get((func_name, arg_key))
+
+    def enum(self, func_name: str, arg_key: str) -> Optional[List[Any]]:
+        return self._arg_enums.get((func_name, arg_key))
+
+    def required_args(self, func_name: str) -> Tuple[str, ...]:
+        return self._required.get(func_name, ())
+
+
+class GrammarCache:
+    """LRU of grammars built from a tools list.
+
+    Entries are keyed by a grammar kind (``"ebnf"``, ``"structural_tag"``, or
+    any caller-chosen kind such as a compiled grammar) and a canonical hash
+    of the tool names, parameter schemas and ``strict`` flags, so an agent
+    that sends the same tools on every turn builds each grammar once.
+    ``hits`` and ``misses`` count lookups since the last ``clear``.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+
+    @staticmethod
+    def tools_key(tools: List[Tool]) -> str:
+        return _tools_key(tools, with_strict=True)
+
+    def get_or_build(
+        self, kind: str, tools: List[Tool], build: Callable[[], Any]
+    ) -> Any:
+        key = (kind, self.tools_key(tools))
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        value = build()
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 def get_argument_type(
     func_name: str, arg_key: str, defined_tools: List[Tool]
 ) -> Optional[str]:
-    name2tool = {tool.function.name: tool for tool in defined_tools}
-    tool = name2tool.get(func_name)
-    if not tool:
-        return None
-    params = getattr(tool.function, "parameters", None)
-    if not isinstance(params, dict):
-        return None
-    properties = params.get("properties")
-    if not isinstance(properties, dict):
-        return None
-    arg_spec = properties.get(arg_key)
-    if isinstance(arg_spec, dict):
-        return infer_type_from_json_schema(arg_spec)
-    return None
+    return ToolSchemaIndex.for_tools(defined_tools).get(func_name, arg_key)
+
+
+def _value_holdback_start(text: str, pos: int) -> int:
+    """Index from which ``text`` could still be the start of ``</arg_value>``.
+
+    The closing tag contains a single ``<``, so only the last ``<`` in the
+    final ``len(tag) - 1`` characters can begin a partial tag.
+    """
+    lt = text.rfind("<", max(pos, len(text) - len(_ARG_VALUE_END) + 1))
+    if lt != -1 and _ARG_VALUE_END.startswith(text[lt:]):
+        return lt
+    return len(text)
+
+
+class _PrefixAutomaton:
+    """KMP automaton for one token, used to size the streaming holdback.
+
+    ``suffix_match_length`` returns the length of the longest suffix of a text
+    that is a proper prefix of the token, i.e. exactly the part that is still
+    ambiguous and must be held back; everything before it can be released.
+    """
+
+    __slots__ = ("token", "_failure")
+
+    def __init__(self, token: str):
+        self.token = token
+        failure = [0] * len(token)
+        k = 0
+        for i in range(1, len(token)):
+            while k and token[i] != token[k]:
+                k = failure[k - 1]
+            if token[i] == token[k]:
+                k += 1
+            failure[i] = k
+        self._failure = failure
+
+    def suffix_match_length(self, text: str) -> int:
+        token = self.token
+        state = 0
+        # Only the last len(token) - 1 characters can hold a proper prefix.
+        for char in text[-(len(token) - 1) :] if len(token) > 1 else "":
+            while state and char != token[state]:
+                state = self._failure[state - 1]
+            if char == token[state]:
+                state += 1
+                if state == len(token):
+                    state = self._failure[state - 1]
+        return state
+
+
+_AUTOMATA: Dict[str, _PrefixAutomaton] = {}
+
+
+def _partial_suffix_length(text: str, token: str) -> int:
+    """Length of the longest suffix of ``text`` that is a proper prefix of ``token``."""
+    automaton = _AUTOMATA.get(token)
+    if automaton is None:
+        automaton = _AUTOMATA[token] = _PrefixAutomaton(token)
+    return automaton.suffix_match_length(text)
 
 
 def _convert_to_number(value: str) -> Any:
@@ -56,116 +306,271 @@ def _convert_to_number(value: str) -> Any:
         return value
 
 
+# ast.literal_eval on a large non-literal (e.g. a whole source file) is slow to
+# fail, and nothing that large is a plausible Python literal argument.
+_LITERAL_EVAL_MAX_CHARS = 4096
+
+
+def _decode_json(json_value: str, arg_type: Optional[str]) -> Any:
+    parsed_value = json.loads(json_value)
+    if arg_type == "number" and isinstance(parsed_value, str):
+        parsed_value = _convert_to_number(parsed_value)
+    return parsed_value
+
+
+def _decode_escaped_json(json_value: str, arg_type: Optional[str]) -> Any:
+    wrapped = json.loads('{"tmp": "' + json_value + '"}')
+    return _decode_json(wrapped["tmp"], arg_type)
+
+
+def _decode_python_literal(json_value: str, arg_type: Optional[str]) -> Any:
+    if len(json_value) > _LITERAL_EVAL_MAX_CHARS:
+        raise ValueError("value too large for literal_eval")
+    return ast.literal_eval(json_value)
+
+
+# Decoding strategies tried in order for each declared argument type. Untyped
+# (or unknown) arguments get the full cascade; string arguments are taken
+# verbatim, matching what the streaming path emits.
+_UNTYPED_DECODERS = (_decode_json, _decode_escaped_json, _decode_python_literal)
+_TYPED_DECODERS = {
+    "string": (),
+    "integer": (_decode_json, _decode_python_literal),
+    "number": (_decode_json, _decode_python_literal),
+    "boolean": (_decode_json, _decode_python_literal),
+    "null": (_decode_json,),
+    "object": (_decode_json, _decode_escaped_json, _decode_python_literal),
+    "array": (_decode_json, _decode_escaped_json, _decode_python_literal),
+}
+
+
 def parse_arguments(
     json_value: str, arg_type: Optional[str] = None
 ) -> Tuple[Any, bool]:
-    try:
-        parsed_value = json.loads(json_value)
-        if arg_type == "number" and isinstance(parsed_value, str):
-            parsed_value = _convert_to_number(parsed_value)
-        return parsed_value, True
-    except (json.JSONDecodeError, ValueError):
-        pass
-    try:
-        wrapped = json.loads('{"tmp": "' + json_value + '"}')
-        parsed_value = json.loads(wrapped["tmp"])
-        if arg_type == "number" and isinstance(parsed_value, str):
-            parsed_value = _convert_to_number(parsed_value)
-        return parsed_value, True
-    except (json.JSONDecodeError, ValueError, KeyError):
-        pass
-    try:
-        parsed_value = ast.literal_eval(json_value)
-        return parsed_value, True
-    except (ValueError, SyntaxError):
-        pass
-    try:
-        quoted_value = json.dumps(str(json_value))
-        return json.loads(quoted_value), True
-    except (json.JSONDecodeError, ValueError):
-        return json_value, False
+    """Decode one argument value, picking strategies from its schema type.
+
+    Returns ``(value, is_good_json)``; when every strategy fails the raw
+    string is returned with ``False``.
+    """
+    if arg_type == "string":
+        return json_value, True
+    for decoder in _TYPED_DECODERS.get(arg_type, _UNTYPED_DECODERS):
+        try:
+            return decoder(json_value, arg_type), True
+        except (ValueError, TypeError, KeyError, SyntaxError, MemoryError, RecursionError):
+            continue
+    return json_value, False
 
 
-class Glm47MoeDetector(BaseFormatDetector):
+# isinstance checks for the JSON Schema types an argument can be validated
+# against; other (or missing) types are not checked.
+_TYPE_CHECKS = {
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+    or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+}
+
+
+def validate_argument(
+    value: str, arg_type: Optional[str], enum: Optional[List[Any]] = None
+) -> Optional[str]:
+    """Check one complete argument value against its schema type and enum.
+
+    Returns a short error message, or None when the value is acceptable.
+    ``null`` is accepted for every type since optional arguments are usually
+    declared nullable, and a false rejection is worse than a missed one.
     """
-    Detector for GLM-4.7 and GLM-5 models.
-    Assumes function call format:
-      <tool_call>get_weather<arg_key>city</arg_key><arg_value>北京</arg_value></tool_call>
+    value = value.strip()
+    parsed, is_good_json = parse_arguments(value, arg_type)
+    return _check_decoded_argument(value, parsed, is_good_json, arg_type, enum)
+
+
+def _check_decoded_argument(
+    value: str,
+    parsed: Any,
+    is_good_json: bool,
+    arg_type: Optional[str],
+    enum: Optional[List[Any]],
+) -> Optional[str]:
+    check = _TYPE_CHECKS.get(arg_type)
+    if check is not None and (
+        not is_good_json or (parsed is not None and not check(parsed))
+    ):
+        return f"expected {arg_type}, got {value[:40]!r}"
+    if enum is not None and parsed is not None and parsed not in enum:
+        return f"{parsed!r} is not one of {enum[:10]!r}"
+    return None
+
+
+def _coerce_argument(
+    value: str, parsed: Any, is_good_json: bool, arg_type: Optional[str]
+) -> Any:
+    """Final argument value published in ``prev_tool_call_arr`` / tool calls."""
+    if arg_type == "string":
+        if isinstance(parsed, str):
+            return parsed
+        elif isinstance(parsed, (dict, list)):
+            return json.dumps(parsed, ensure_ascii=False)
+        else:
+            return str(parsed)
+    return parsed if is_good_json else value
+
+
+def _structural_value_format(
+    spec: Dict[str, Any],
+    root: Dict[str, Any],
+    arg_type: Optional[str],
+    enum: Optional[List[Any]],
+) -> Dict[str, Any]:
+    """Structural tag format for one ``<arg_value>`` body, as the parser reads it back."""
+    if enum:
+        values = [v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in enum]
+        return {"type": "or", "elements": [{"type": "const_string", "value": v} for v in values]}
+    if arg_type in (None, "string"):
+        return {"type": "any_text"}
+    schema = dict(_resolve_local_ref(spec, root))
+    for defs in ("$defs", "definitions"):
+        if defs in root and defs not in schema:
+            schema[defs] = root[defs]
+    return {"type": "json_schema", "json_schema": schema}
+
+
+def _structural_arguments_format(
+    arg_tags: List[Tuple[str, Dict[str, Any]]], required: bool
+) -> Dict[str, Any]:
+    """Structural tag format for the arguments of one call, in any order.
+
+    xgrammar needs a non-empty separator between tags, so ``<arg_key>`` is
+    split off the tag begins and used as the separator. A call without
+    required arguments may also have none, or exactly one argument written
+    with its full ``<arg_key>`` begin.
     """
+    if not arg_tags:
+        return {"type": "grammar", "grammar": 'root ::= ""'}
 
-    def __init__(self):
-        super().__init__()
-        self.bot_token = "<tool_call>"
-        self.eot_token = "</tool_call>"
-        self.func_call_regex = r"<tool_call>.*?</tool_call>"
-        self.func_detail_regex = re.compile(
-            r"<tool_call>(.*?)(<arg_key>.*?)?</tool_call>", re.DOTALL
-        )
-        self.func_arg_regex = re.compile(
-            r"<arg_key>(.*?)</arg_key>(?:\\n|\s)*<arg_value>(.*?)</arg_value>",
-            re.DOTALL,
-        )
-        self._last_arguments = ""
+    def tags(prefix: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "type": "tag",
+                "begin": f"{prefix}{key}</arg_key><arg_value>",
+                "content": value_format,
+                "end": "</arg_value>",
+            }
+            for key, value_format in arg_tags
+        ]
+
+    one_or_more = {
+        "type": "sequence",
+        "elements": [
+            {"type": "const_string", "value": "<arg_key>"},
+            {
+                "type": "tags_with_separator",
+                "tags": tags(""),
+                "separator": "<arg_key>",
+                "at_least_one": True,
+            },
+        ],
+    }
+    if required:
+        return one_or_more
+    at_most_one = {
+        "type": "tags_with_separator",
+        "tags": tags("<arg_key>"),
+        "separator": "<arg_key>",
+        "stop_after_first": True,
+    }
+    return {"type": "or", "elements": [one_or_more, at_most_one]}
+
+
+class _Glm47Stream:
+    """Streaming state and state machine for one GLM-4.7 response.
+
+    Base of ``Glm47MoeDetector``, and the per-stream state of
+    ``Glm47BatchParser``. State lives in ``__slots__`` and containers that
+    only a tool call needs are allocated when one starts, so an idle stream
+    is a single small object; patterns and tokens are class-level.
+    """
+
+    __slots__ = (
+        "tools",
+        "_buffer",
+        "prev_tool_call_arr",
+        "streamed_args_for_tool",
+        "current_tool_id",
+        "current_tool_name_sent",
+        "_in_tool_call",
+        "_scan_pos",
+        "_current_func_name",
+        "_sent_empty_object",
+        "_schema_tools",
+        "_schema_index",
+        "_stream_state",
+        "_current_key",
+        "_value_parts",
+        "_xml_tag_buffer",
+        "_is_first_param",
+        "_value_started",
+        "_cached_value_type",
+        "_arguments",
+        "validation_errors",
+    )
+
+    bot_token = "<tool_call>"
+    eot_token = "</tool_call>"
+    func_arg_regex = _FUNC_ARG_REGEX
+
+    def __init__(self, tools: Optional[List[Tool]] = None):
+        # Default tools for Glm47BatchParser streams; a detector gets them per call.
+        self.tools: Optional[List[Tool]] = tools
+        self._buffer = ""
+        # Empty tuples until _open_tool_call allocates the lists for the first
+        # tool call; the serving layer only reads them.
+        self.prev_tool_call_arr: Sequence[Dict[str, Any]] = ()
+        self.streamed_args_for_tool: Sequence[str] = ()
         self.current_tool_id = -1
         self.current_tool_name_sent = False
-        self._streamed_raw_length = 0
-        self._tool_call_completed = False
-        self._sent_empty_object = False
+        self._in_tool_call = False
+        self._scan_pos = 0
+        self._current_func_name: Optional[str] = None
+        self._schema_tools: Optional[List[Tool]] = None
+        self._schema_index: Optional[ToolSchemaIndex] = None
+        # (tool_index, message) for every argument that failed schema validation
+        # so far; a caller can abort the request as soon as this becomes non-empty.
+        # Replaced by a list on the first error, so idle streams share the empty tuple.
+        self.validation_errors: Sequence[Tuple[int, str]] = ()
+        # Text of the argument value being streamed; cleared, not replaced.
+        self._value_parts: List[str] = []
         self._reset_streaming_state()
 
     def _reset_streaming_state(self) -> None:
         self._stream_state = StreamState.INIT
         self._current_key = ""
-        self._current_value = ""
+        # The argument dict is allocated when a named tool call starts, so idle
+        # streams do not hold one.
+        self._value_parts.clear()
         self._xml_tag_buffer = ""
         self._is_first_param = True
         self._value_started = False
         self._cached_value_type: Optional[str] = None
-        self._tool_call_completed = False
+        self._arguments: Optional[Dict[str, Any]] = None
         self._sent_empty_object = False
 
-    def has_tool_call(self, text: str) -> bool:
-        return self.bot_token in text
-
-    def detect_and_parse(self, text: str, tools: List[Tool]) -> StreamingParseResult:
-        if self.bot_token not in text:
-            return StreamingParseResult(normal_text=text, calls=[])
-
-        normal_text_parts = []
-        last_end = 0
-        for match in re.finditer(self.func_call_regex, text, re.DOTALL):
-            if match.start() > last_end:
-                normal_text_parts.append(text[last_end : match.start()])
-            last_end = match.end()
-        if last_end < len(text):
-            normal_text_parts.append(text[last_end:])
-        normal_text = "".join(normal_text_parts).strip()
-
-        match_result_list = re.findall(self.func_call_regex, text, re.DOTALL)
-        calls = []
-        try:
-            for match_result in match_result_list:
-                func_detail = self.func_detail_regex.search(match_result)
-                if func_detail is None:
-                    continue
-                func_name = func_detail.group(1) if func_detail.group(1) else ""
-                func_args = func_detail.group(2) if func_detail.group(2) else ""
-                arguments = {}
-                if func_args:
-                    pairs = self.func_arg_regex.findall(func_args)
-                    arguments = self._parse_argument_pairs(pairs, func_name, tools)
-                match_result = {"name": func_name, "parameters": arguments}
-                calls.extend(self.parse_base_json(match_result, tools))
-            return StreamingParseResult(normal_text=normal_text, calls=calls)
-        except Exception as e:
-            logger.error(f"Error in detect_and_parse: {e}", exc_info=True)
-            return StreamingParseResult(normal_text=text)
+    def _get_schema_index(self, tools: List[Tool]) -> ToolSchemaIndex:
+        # The serving layer passes the same tools list on every call of a
+        # request, so an identity check avoids rehashing it per argument.
+        if tools is not self._schema_tools:
+            self._schema_index = ToolSchemaIndex.for_tools(tools)
+            self._schema_tools = tools
+        return self._schema_index
 
     def _get_value_type(self, func_name: str, key: str, tools: List[Tool]) -> str:
-        arg_type = get_argument_type(func_name, key, tools)
+        arg_type = self._get_schema_index(tools).get(func_name, key)
         if arg_type:
             return arg_type
-        value_content = self._current_value.strip() if self._current_value else ""
+        value_content = "".join(self._value_parts).strip()
         if not value_content:
             return "string"
         try:
@@ -205,104 +610,112 @@ class Glm47MoeDetector(BaseFormatDetector):
         else:
             return value
 
+    def _stream_value_chunk(self, content: str, json_output: List[str]) -> None:
+        if not content:
+            return
+        value_type = self._cached_value_type or "string"
+        if value_type == "string":
+            if not self._value_started:
+                json_output.append('"')
+            json_output.append(encode_basestring(content)[1:-1])
+        else:
+            json_output.append(content)
+        self._value_started = True
+        self._value_parts.append(content)
+
+    def _record_validation_error(self, message: str) -> None:
+        logger.debug(f"Invalid tool call {self.current_tool_id}: {message}")
+        self.validation_errors = [*self.validation_errors, (self.current_tool_id, message)]
+
+    def _complete_argument(self, func_name: str, tools: List[Tool]) -> None:
+        """Decode and check the argument that just closed with ``</arg_value>``.
+
+        The typed value is stored in ``self._arguments``, so finalizing the
+        call only publishes it instead of re-parsing the raw argument XML.
+        """
+        key = self._current_key
+        schema_index = self._get_schema_index(tools)
+        arg_type = schema_index.get(func_name, key)
+        value = "".join(self._value_parts).strip()
+        parsed, is_good_json = parse_arguments(value, arg_type)
+        self._arguments[key] = _coerce_argument(value, parsed, is_good_json, arg_type)
+        enum = schema_index.enum(func_name, key)
+        if enum is None and arg_type in (None, "string"):
+            return
+        error = _check_decoded_argument(value, parsed, is_good_json, arg_type, enum)
+        if error:
+            self._record_validation_error(f"{func_name}.{key}: {error}")
+
+    def _finish_value(self, json_output: List[str], func_name: str, tools: List[Tool]) -> None:
+        value_type = self._cached_value_type or "string"
+        if self._value_started:
+            if value_type == "string":
+                json_output.append('"')
+        else:
+            json_output.append(
+                self._format_value_complete("".join(self._value_parts), value_type)
+            )
+        self._complete_argument(func_name, tools)
+        self._stream_state = StreamState.BETWEEN
+        self._value_parts.clear()
+        self._value_started = False
+        self._cached_value_type = None
+
     def _process_xml_to_json_streaming(
         self, raw_increment: str, func_name: str, tools: List[Tool]
     ) -> str:
-        json_output = ""
-        for char in raw_increment:
-            self._xml_tag_buffer += char
-            if self._stream_state in [StreamState.INIT, StreamState.BETWEEN]:
-                if self._xml_tag_buffer.endswith("<arg_key>"):
-                    self._stream_state = StreamState.IN_KEY
-                    self._current_key = ""
-                    self._xml_tag_buffer = ""
-                    json_output += "{" if self._is_first_param else ", "
-                    self._is_first_param = False
-            elif self._stream_state == StreamState.IN_KEY:
-                if self._xml_tag_buffer.endswith("</arg_key>"):
-                    self._current_key = self._xml_tag_buffer[:-10].strip()
-                    self._xml_tag_buffer = ""
-                    self._stream_state = StreamState.WAITING_VALUE
-                    json_output += json.dumps(self._current_key, ensure_ascii=False) + ": "
-            elif self._stream_state == StreamState.WAITING_VALUE:
-                if self._xml_tag_buffer.endswith("<arg_value>"):
-                    self._stream_state = StreamState.IN_VALUE
-                    self._current_value = ""
-                    self._xml_tag_buffer = ""
-                    self._value_started = False
-                    self._cached_value_type = self._get_value_type(
-                        func_name, self._current_key, tools
-                    )
-            elif self._stream_state == StreamState.IN_VALUE:
-                if self._xml_tag_buffer.endswith("</arg_value>"):
-                    final_value = self._xml_tag_buffer[:-12]
-                    self._current_value += final_value
-                    value_type = self._cached_value_type or "string"
-                    if self._value_started:
-                        if final_value:
-                            if value_type == "string":
-                                json_output += json.dumps(final_value, ensure_ascii=False)[1:-1]
-                            else:
-                                json_output += final_value
-                        if value_type == "string":
-                            json_output += '"'
-                    else:
-                        json_output += self._format_value_complete(self._current_value, value_type)
-                    self._xml_tag_buffer = ""
-                    self._stream_state = StreamState.BETWEEN
-                    self._current_value = ""
-                    self._value_started = False
-                    self._cached_value_type = None
+        """Convert a chunk of argument XML into the matching JSON fragment.
+
+        Works on whole runs of text between tags: value text is escaped once per
+        run, and only a trailing fragment that could still become the awaited
+        tag is kept in ``_xml_tag_buffer`` for the next chunk.
+        """
+        json_output: List[str] = []
+        text = self._xml_tag_buffer + raw_increment
+        self._xml_tag_buffer = ""
+        pos = 0
+        while pos < len(text):
+            state = self._stream_state
+            end_tag = _STATE_END_TAGS[state]
+            end = text.find(end_tag, pos)
+            if state == StreamState.IN_VALUE:
+                if end == -1:
+                    hold = _value_holdback_start(text, pos)
+                    self._stream_value_chunk(text[pos:hold], json_output)
+                    self._xml_tag_buffer = text[hold:]
+                    break
+                self._stream_value_chunk(text[pos:end], json_output)
+                self._finish_value(json_output, func_name, tools)
+            elif end == -1:
+                if state == StreamState.IN_KEY:
+                    self._xml_tag_buffer = text[pos:]
                 else:
-                    closing_tag = "</arg_value>"
-                    is_potential_closing = len(self._xml_tag_buffer) <= len(closing_tag) and closing_tag.startswith(self._xml_tag_buffer)
-                    if not is_potential_closing:
-                        content = self._xml_tag_buffer
-                        value_type = self._cached_value_type or "string"
-                        if value_type == "string":
-                            if not self._value_started:
-                                json_output += '"'
-                                self._value_started = True
-                            if content:
-                                json_output += json.dumps(content, ensure_ascii=False)[1:-1]
-                                self._current_value += content
-                                self._xml_tag_buffer = ""
-                        elif value_type == "number":
-                            if content:
-                                if not self._value_started:
-                                    self._value_started = True
-                                json_output += content
-                                self._current_value += content
-                                self._xml_tag_buffer = ""
-                        else:
-                            if content:
-                                if not self._value_started:
-                                    self._value_started = True
-                                json_output += content
-                                self._current_value += content
-                                self._xml_tag_buffer = ""
-        return json_output
-
-    def _extract_match_groups(self, match: re.Match) -> tuple:
-        func_name = match.group(1).strip()
-        func_args_raw = match.group(2).strip() if match.group(2) else ""
-        is_tool_end = match.group(3) or ""
-        return func_name, func_args_raw, is_tool_end
-
-    def _send_tool_name_if_needed(
-        self, func_name: str, has_arg_key: bool, is_tool_end: str
-    ) -> Optional[ToolCallItem]:
-        if self.current_tool_name_sent:
-            return None
-        is_func_name_complete = has_arg_key or is_tool_end == self.eot_token
-        if not is_func_name_complete:
-            return None
-        if not func_name:
-            logger.warning("Empty function name detected, skipping tool call")
-            return None
+                    keep = _partial_suffix_length(text[pos:], end_tag)
+                    self._xml_tag_buffer = text[len(text) - keep :] if keep else ""
+                break
+            elif state == StreamState.IN_KEY:
+                self._current_key = text[pos:end].strip()
+                self._stream_state = StreamState.WAITING_VALUE
+                json_output.append(json.dumps(self._current_key, ensure_ascii=False) + ": ")
+            elif state == StreamState.WAITING_VALUE:
+                self._stream_state = StreamState.IN_VALUE
+                self._value_parts.clear()
+                self._value_started = False
+                self._cached_value_type = self._get_value_type(
+                    func_name, self._current_key, tools
+                )
+            else:
+                self._stream_state = StreamState.IN_KEY
+                self._current_key = ""
+                json_output.append("{" if self._is_first_param else ", ")
+                self._is_first_param = False
+            pos = end + len(end_tag)
+        return "".join(json_output)
+
+    def _send_tool_name(self, func_name: str) -> ToolCallItem:
         self.current_tool_name_sent = True
-        self._streamed_raw_length = 0
         self._reset_streaming_state()
+        self._arguments = {}
         self.prev_tool_call_arr[self.current_tool_id] = {
             "name": func_name,
             "arguments": {},
@@ -314,19 +727,15 @@ class Glm47MoeDetector(BaseFormatDetector):
         )
 
     def _process_arguments_streaming(
-        self, func_name: str, func_args_raw: str, tools: List[Tool]
+        self, func_name: str, raw_increment: str, tools: List[Tool]
     ) -> Optional[ToolCallItem]:
-        current_raw_length = len(func_args_raw)
-        if current_raw_length <= self._streamed_raw_length:
+        if not raw_increment:
             return None
-        raw_increment = func_args_raw[self._streamed_raw_length :]
         json_increment = self._process_xml_to_json_streaming(
             raw_increment, func_name, tools
         )
-        self._streamed_raw_length = current_raw_length
         if not json_increment:
             return None
-        self._last_arguments += json_increment
         self.streamed_args_for_tool[self.current_tool_id] += json_increment
         return ToolCallItem(
             tool_index=self.current_tool_id,
@@ -335,135 +744,369 @@ class Glm47MoeDetector(BaseFormatDetector):
         )
 
     def _finalize_tool_call(
-        self, func_name: str, func_args_raw: str, tools: List[Tool],
-        match_end_pos: int, current_text: str,
+        self, func_name: str, tools: List[Tool]
     ) -> List[ToolCallItem]:
         calls = []
         if self._is_first_param and not self._sent_empty_object:
             calls.append(ToolCallItem(tool_index=self.current_tool_id, name=None, parameters="{}"))
-            self._last_arguments += "{}"
             self.streamed_args_for_tool[self.current_tool_id] += "{}"
             self._sent_empty_object = True
-        elif not self._last_arguments.endswith("}") and not self._sent_empty_object:
+        elif (
+            not self.streamed_args_for_tool[self.current_tool_id].endswith("}")
+            and not self._sent_empty_object
+        ):
             calls.append(ToolCallItem(tool_index=self.current_tool_id, name=None, parameters="}"))
-            self._last_arguments += "}"
             self.streamed_args_for_tool[self.current_tool_id] += "}"
             self._sent_empty_object = True
-        if func_args_raw:
-            try:
-                pairs = self.func_arg_regex.findall(func_args_raw)
-                if pairs:
-                    arguments = self._parse_argument_pairs(pairs, func_name, tools)
-                    self.prev_tool_call_arr[self.current_tool_id]["arguments"] = arguments
-            except Exception as e:
-                logger.debug(f"Failed to parse arguments: {e}", exc_info=True)
-        self._buffer = current_text[match_end_pos:]
-        self._tool_call_completed = True
+        missing = [
+            key
+            for key in self._get_schema_index(tools).required_args(func_name)
+            if key not in self._arguments
+        ]
+        if missing:
+            self._record_validation_error(f"{func_name}: missing required {missing}")
+        self.prev_tool_call_arr[self.current_tool_id]["arguments"] = self._arguments
         self.current_tool_id += 1
-        self._last_arguments = ""
+        self._close_tool_call()
+        return calls
+
+    def _open_tool_call(self) -> None:
+        if self.current_tool_id == -1:
+            self.current_tool_id = 0
+            self.prev_tool_call_arr = []
+            self.streamed_args_for_tool = [""]
+        while len(self.prev_tool_call_arr) <= self.current_tool_id:
+            self.prev_tool_call_arr.append({})
+        while len(self.streamed_args_for_tool) <= self.current_tool_id:
+            self.streamed_args_for_tool.append("")
+        self._in_tool_call = True
+        self._scan_pos = 0
+        self._current_func_name = None
         self.current_tool_name_sent = False
-        self._streamed_raw_length = 0
         self._reset_streaming_state()
-        return calls
 
-    def parse_streaming_increment(
-        self, new_text: str, tools: List[Tool]
-    ) -> StreamingParseResult:
-        self._buffer += new_text
+    def _close_tool_call(self) -> None:
+        self._in_tool_call = False
+        self._scan_pos = 0
+        self._current_func_name = None
+        self.current_tool_name_sent = False
+        self._reset_streaming_state()
+
+    def _scan_normal_text(self) -> Tuple[str, bool]:
+        """Consume normal text from the buffer.
+
+        Returns the text that can be released and whether a ``<tool_call>``
+        was opened. Only the unconsumed tail is kept in ``self._buffer``.
+        """
         current_text = self._buffer
-        has_tool_call = self.bot_token in current_text
-        if not has_tool_call:
-            is_potential_start = any(
-                self.bot_token.startswith(current_text[-i:])
-                for i in range(1, min(len(current_text), len(self.bot_token)) + 1)
+        bot_idx = current_text.find(self.bot_token)
+        if bot_idx != -1:
+            self._buffer = current_text[bot_idx + len(self.bot_token) :]
+            self._open_tool_call()
+            return current_text[:bot_idx], True
+        # Hold back only the suffix that may still grow into <tool_call> (or a
+        # stray </tool_call>, which is dropped from normal text); the rest of
+        # the text is released right away.
+        if "<" in current_text[-len(self.eot_token) :]:
+            keep = max(
+                _partial_suffix_length(current_text, self.bot_token),
+                _partial_suffix_length(current_text, self.eot_token),
             )
-            if not is_potential_start:
-                output_text = current_text
-                self._buffer = ""
-                if self.eot_token in output_text:
-                    output_text = output_text.replace(self.eot_token, "")
-                return StreamingParseResult(normal_text=output_text)
-            else:
-                return StreamingParseResult(normal_text="", calls=[])
-        normal_text = ""
-        first_bot_token_idx = current_text.find(self.bot_token)
-        if first_bot_token_idx > 0:
-            normal_text = current_text[:first_bot_token_idx]
-            current_text = current_text[first_bot_token_idx:]
-            self._buffer = current_text
-        if not hasattr(self, "_tool_indices"):
-            self._tool_indices = self._get_tool_indices(tools)
-        calls: list[ToolCallItem] = []
-        try:
-            partial_match = re.search(
-                r"<tool_call>(.*?)(?:(<arg_key.*?))?(?:(</tool_call>)|$)",
-                current_text,
-                re.DOTALL,
+        else:
+            keep = 0
+        released = current_text[: len(current_text) - keep]
+        self._buffer = current_text[len(current_text) - keep :]
+        if self.eot_token in released:
+            released = released.replace(self.eot_token, "")
+        return released, False
+
+    def _scan_tool_name(self) -> Tuple[List[ToolCallItem], bool]:
+        """Look for the end of the function name after ``<tool_call>``.
+
+        The search resumes at ``self._scan_pos`` so text that was already
+        examined on a previous delta is not scanned again. Returns the emitted
+        calls and whether the scanner made progress.
+        """
+        match = _NAME_END_REGEX.search(self._buffer, self._scan_pos)
+        if match is None:
+            self._scan_pos = max(0, len(self._buffer) - _NAME_END_OVERLAP)
+            return [], False
+        func_name = self._buffer[: match.start()].strip()
+        self._current_func_name = func_name
+        calls = []
+        if func_name:
+            calls.append(self._send_tool_name(func_name))
+        self._buffer = self._buffer[match.start() :]
+        self._scan_pos = 0
+        return calls, True
+
+    def _scan_tool_arguments(self, tools: List[Tool]) -> Tuple[List[ToolCallItem], bool]:
+        """Stream argument XML up to ``</tool_call>``.
+
+        Everything except a possible partial ``</tool_call>`` suffix is handed
+        to the XML state machine and dropped from the buffer, so each delta is
+        examined once. Returns the emitted calls and whether the tool call was
+        closed.
+        """
+        current_text = self._buffer
+        func_name = self._current_func_name
+        end_idx = current_text.find(self.eot_token)
+        if end_idx == -1:
+            keep = (
+                _partial_suffix_length(current_text, self.eot_token)
+                if "<" in current_text[-len(self.eot_token) :]
+                else 0
             )
-            if not partial_match:
-                return StreamingParseResult(normal_text=normal_text, calls=[])
-            func_name, func_args_raw, is_tool_end = self._extract_match_groups(partial_match)
-            if self.current_tool_id == -1:
-                self.current_tool_id = 0
-                self.prev_tool_call_arr = []
-                self.streamed_args_for_tool = [""]
-                self._streamed_raw_length = 0
-                self.current_tool_name_sent = False
-                self._reset_streaming_state()
-            elif not self.current_tool_name_sent:
-                pass
-            while len(self.prev_tool_call_arr) <= self.current_tool_id:
-                self.prev_tool_call_arr.append({})
-            while len(self.streamed_args_for_tool) <= self.current_tool_id:
-                self.streamed_args_for_tool.append("")
-            has_arg_key = "<arg_key" in current_text
-            tool_name_item = self._send_tool_name_if_needed(func_name, has_arg_key, is_tool_end)
-            if tool_name_item:
-                calls.append(tool_name_item)
-            if self.current_tool_name_sent:
-                arg_item = self._process_arguments_streaming(func_name, func_args_raw, tools)
-                if arg_item:
-                    calls.append(arg_item)
-                if is_tool_end == self.eot_token and not self._tool_call_completed:
-                    finalize_calls = self._finalize_tool_call(
-                        func_name, func_args_raw, tools, partial_match.end(), current_text,
+            raw_increment = current_text[: len(current_text) - keep]
+            self._buffer = current_text[len(current_text) - keep :]
+        else:
+            raw_increment = current_text[:end_idx].rstrip()
+            self._buffer = current_text[end_idx + len(self.eot_token) :]
+        calls = []
+        if self.current_tool_name_sent:
+            arg_item = self._process_arguments_streaming(func_name, raw_increment, tools)
+            if arg_item:
+                calls.append(arg_item)
+        if end_idx == -1:
+            return calls, False
+        if self.current_tool_name_sent:
+            calls.extend(self._finalize_tool_call(func_name, tools))
+        else:
+            logger.warning("Empty function name detected, skipping tool call")
+            self._close_tool_call()
+        return calls, True
+
+    def _feed(self, new_text: str, tools: List[Tool]) -> Tuple[str, List[ToolCallItem]]:
+        """Append a delta and return the released normal text and tool call items.
+
+        Most deltas contain no ``<`` and continue plain text or a string value
+        with nothing pending; those are emitted directly instead of going
+        through the scanners and the XML state machine.
+        """
+        if not self._buffer and "<" not in new_text:
+            if not self._in_tool_call:
+                return new_text, []
+            if (
+                self.current_tool_name_sent
+                and self._stream_state is StreamState.IN_VALUE
+                and not self._xml_tag_buffer
+                and self._cached_value_type in (None, "string")
+                and self._value_started
+            ):
+                self._value_parts.append(new_text)
+                json_increment = encode_basestring(new_text)[1:-1]
+                self.streamed_args_for_tool[self.current_tool_id] += json_increment
+                return "", [
+                    ToolCallItem(
+                        tool_index=self.current_tool_id,
+                        name=None,
+                        parameters=json_increment,
                     )
-                    calls.extend(finalize_calls)
-                    return StreamingParseResult(normal_text=normal_text, calls=calls)
-        except Exception as e:
-            logger.error(f"Error in parse_streaming_increment: {e}", exc_info=True)
-            return StreamingParseResult(normal_text=current_text)
-        return StreamingParseResult(normal_text=normal_text, calls=calls)
+                ]
+        self._buffer += new_text
+        return self._advance(tools)
+
+    def _advance(self, tools: List[Tool]) -> Tuple[str, List[ToolCallItem]]:
+        """Run the scanners over ``self._buffer`` until they need more text."""
+        normal_text_parts = []
+        calls: list[ToolCallItem] = []
+        while self._buffer:
+            if not self._in_tool_call:
+                text, opened = self._scan_normal_text()
+                if text:
+                    normal_text_parts.append(text)
+                if not opened:
+                    break
+            elif self._current_func_name is None:
+                name_calls, progressed = self._scan_tool_name()
+                calls.extend(name_calls)
+                if not progressed:
+                    break
+            else:
+                arg_calls, closed = self._scan_tool_arguments(tools)
+                calls.extend(arg_calls)
+                if not closed:
+                    break
+        return "".join(normal_text_parts), calls
 
     def _parse_argument_pairs(
         self, pairs: List[Tuple[str, str]], func_name: str, tools: List[Tool]
     ) -> Dict[str, Any]:
         arguments = {}
+        schema_index = self._get_schema_index(tools)
         for arg_key, arg_value in pairs:
             arg_key = arg_key.strip()
             arg_value = arg_value.strip()
-            arg_type = get_argument_type(func_name, arg_key, tools)
+            arg_type = schema_index.get(func_name, arg_key)
             parsed_value, is_good_json = parse_arguments(arg_value, arg_type)
-            if arg_type == "string":
-                if isinstance(parsed_value, str):
-                    arguments[arg_key] = parsed_value
-                elif isinstance(parsed_value, (dict, list)):
-                    arguments[arg_key] = json.dumps(parsed_value, ensure_ascii=False)
-                else:
-                    arguments[arg_key] = str(parsed_value)
-            elif arg_type is None:
-                arguments[arg_key] = parsed_value if is_good_json else arg_value
-            else:
-                arguments[arg_key] = parsed_value if is_good_json else arg_value
+            arguments[arg_key] = _coerce_argument(
+                arg_value, parsed_value, is_good_json, arg_type
+            )
         return arguments
 
+
+class Glm47MoeDetector(_Glm47Stream, BaseFormatDetector):
+    """
+    Detector for GLM-4.7 and GLM-5 models.
+    Assumes function call format:
+      <tool_call>get_weather<arg_key>city</arg_key><arg_value>北京</arg_value></tool_call>
+    """
+
+    # Streaming state lives in _Glm47Stream's slots, including the
+    # BaseFormatDetector attributes the serving layer reads.
+    # Shared by all detectors: the server creates one detector per request.
+    grammar_cache = GrammarCache()
+
+    def __init__(self):
+        BaseFormatDetector.__init__(self)
+        _Glm47Stream.__init__(self)
+        self.bot_token = _Glm47Stream.bot_token
+        self.eot_token = _Glm47Stream.eot_token
+
+    def has_tool_call(self, text: str) -> bool:
+        return self.bot_token in text
+
+    def _iter_tool_calls(
+        self, text: str
+    ) -> Iterator[Tuple[str, Optional[str], List[Tuple[str, str]]]]:
+        """Split a complete response in one left-to-right pass.
+
+        Yields ``(normal_text, func_name, pairs)`` for every closed tool call,
+        where ``normal_text`` is the text preceding it. The last item carries
+        the trailing text with ``func_name=None``; an unclosed ``<tool_call>``
+        stays part of that text.
+        """
+        pos = 0
+        while True:
+            start = text.find(self.bot_token, pos)
+            end = -1 if start == -1 else text.find(self.eot_token, start)
+            if end == -1:
+                yield text[pos:], None, []
+                return
+            name_start = start + len(self.bot_token)
+            args_start = text.find("<arg_key>", name_start, end)
+            if args_start == -1:
+                func_name, pairs = text[name_start:end], []
+            else:
+                func_name = text[name_start:args_start]
+                pairs = self.func_arg_regex.findall(text, args_start, end)
+            yield text[pos:start], func_name.strip(), pairs
+            pos = end + len(self.eot_token)
+
+    def detect_and_parse(self, text: str, tools: List[Tool]) -> StreamingParseResult:
+        if self.bot_token not in text:
+            return StreamingParseResult(normal_text=text, calls=[])
+
+        normal_text_parts = []
+        calls = []
+        try:
+            for normal_text, func_name, pairs in self._iter_tool_calls(text):
+                normal_text_parts.append(normal_text)
+                if func_name is None:
+                    break
+                arguments = {}
+                if pairs:
+                    arguments = self._parse_argument_pairs(pairs, func_name, tools)
+                match_result = {"name": func_name, "parameters": arguments}
+                calls.extend(self.parse_base_json(match_result, tools))
+            return StreamingParseResult(
+                normal_text="".join(normal_text_parts).strip(), calls=calls
+            )
+        except Exception as e:
+            logger.error(f"Error in detect_and_parse: {e}", exc_info=True)
+            return StreamingParseResult(normal_text=text)
+
+    def parse_streaming_increment(
+        self, new_text: str, tools: List[Tool]
+    ) -> StreamingParseResult:
+        try:
+            normal_text, calls = self._feed(new_text, tools)
+        except Exception as e:
+            logger.error(f"Error in parse_streaming_increment: {e}", exc_info=True)
+            return StreamingParseResult(normal_text=self._buffer)
+        return StreamingParseResult(normal_text=normal_text, calls=calls)
+
+    def _get_tool_indices(self, tools: List[Tool]) -> Dict[str, int]:
+        # Computed once per tools list and shared through the schema index cache.
+        return self._get_schema_index(tools).tool_indices
+
     def supports_structural_tag(self) -> bool:
-        return False
+        return True
 
     def structure_info(self) -> _GetInfoFunc:
-        raise NotImplementedError()
+        return lambda name: StructureInfo(
+            begin=f"{self.bot_token}{name}",
+            end=self.eot_token,
+            trigger=self.bot_token,
+        )
+
+    def build_structural_tag(self, tools: List[Tool]):
+        """Structural tag for GLM-4.7 tool calls in xgrammar's tag format.
+
+        The legacy ``structure_info`` tags constrain the call body as JSON,
+        which GLM's ``<arg_key>``/``<arg_value>`` arguments are not. Here each
+        strict tool's body is a run of argument tags: string (and untyped)
+        values are free text up to ``</arg_value>``, enums are one of their
+        literal values and other types are JSON matching the property schema.
+        Non-strict tools only get the call framing. Text outside
+        ``<tool_call>`` stays unconstrained.
+        """
+        return self.grammar_cache.get_or_build(
+            "structural_tag", tools, lambda: self._compose_structural_tag(tools)
+        )
+
+    def _compose_structural_tag(self, tools: List[Tool]):
+        from xgrammar import StructuralTag
+
+        index = self._get_schema_index(tools)
+        tags = []
+        for tool in tools:
+            name = tool.function.name
+            if not name:
+                continue
+            params = getattr(tool.function, "parameters", None)
+            properties = params.get("properties") if isinstance(params, dict) else None
+            if not tool.function.strict or not isinstance(properties, dict):
+                content = {"type": "any_text"}
+            else:
+                arg_tags = [
+                    (
+                        key,
+                        _structural_value_format(
+                            spec, params, index.get(name, key), index.enum(name, key)
+                        ),
+                    )
+                    for key, spec in properties.items()
+                    if isinstance(spec, dict)
+                ]
+                content = _structural_arguments_format(
+                    arg_tags, bool(index.required_args(name))
+                )
+            tags.append(
+                {
+                    "type": "tag",
+                    "begin": f"{self.bot_token}{name}",
+                    "content": content,
+                    "end": self.eot_token,
+                }
+            )
+        return StructuralTag.from_json(
+            {
+                "type": "structural_tag",
+                "format": {
+                    "type": "triggered_tags",
+                    "triggers": [self.bot_token],
+                    "tags": tags,
+                },
+            }
+        )
 
     def build_ebnf(self, tools: List[Tool]):
+        return self.grammar_cache.get_or_build(
+            "ebnf", tools, lambda: self._compose_ebnf(tools)
+        )
+
+    def _compose_ebnf(self, tools: List[Tool]):
         from sglang.srt.function_call.ebnf_composer import EBNFComposer
         return EBNFComposer.build_ebnf(
             tools,
@@ -475,3 +1118,63 @@ class Glm47MoeDetector(BaseFormatDetector):
             key_value_rule_fmt='"<arg_key>{key}</arg_key>" "<arg_value>" {valrule} "</arg_value>"',
             key_value_separator='""',
         )
+
+
+class Glm47BatchParser:
+    """Advance many concurrent GLM-4.7 tool call streams with one call.
+
+    Produces the same normal text and tool call items as one
+    ``Glm47MoeDetector`` per stream, without the per-request detector objects
+    and without building a ``StreamingParseResult`` per delta. Streams are
+    opened implicitly on their first delta (with the parser's default tools)
+    or explicitly with ``open``.
+    """
+
+    def __init__(self, tools: Optional[List[Tool]] = None):
+        self.tools: List[Tool] = tools if tools is not None else []
+        self._streams: Dict[Any, _Glm47Stream] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def __contains__(self, stream_id: Any) -> bool:
+        return stream_id in self._streams
+
+    def open(self, stream_id: Any, tools: Optional[List[Tool]] = None) -> _Glm47Stream:
+        stream = _Glm47Stream(tools if tools is not None else self.tools)
+        self._streams[stream_id] = stream
+        return stream
+
+    def close(self, stream_id: Any) -> Optional[_Glm47Stream]:
+        """Forget a finished stream and return its final state, if any."""
+        return self._streams.pop(stream_id, None)
+
+    def stream(self, stream_id: Any) -> _Glm47Stream:
+        """State of an open stream (``prev_tool_call_arr``, ``streamed_args_for_tool``,
+        ``validation_errors``)."""
+        return self._streams[stream_id]
+
+    def feed_many(
+        self, deltas: Iterable[Tuple[Any, str]]
+    ) -> List[Tuple[Any, str, List[ToolCallItem]]]:
+        """Append each ``(stream_id, delta)`` and advance its stream.
+
+        Returns ``(stream_id, normal_text, calls)`` per delta, in input order,
+        so a stream fed twice in one batch gets two entries. A parse error
+        only affects its own stream, which flushes its buffer as normal text
+        like the detector.
+        """
+        streams = self._streams
+        results = []
+        append = results.append
+        for stream_id, delta in deltas:
+            stream = streams.get(stream_id)
+            if stream is None:
+                stream = self.open(stream_id)
+            try:
+                normal_text, calls = stream._feed(delta, stream.tools)
+            except Exception as e:
+                logger.error(f"Error in feed_many for stream {stream_id!r}: {e}", exc_info=True)
+                normal_text, calls = stream._buffer, []
+            append((stream_id, normal_text, calls))
+        return results
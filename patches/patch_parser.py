@@ -3,6 +3,15 @@
 import sys
 
 filepath = sys.argv[1]
+
+
+def replace(content, old, new, what):
+    """Replace old with new, or exit non-zero (file untouched) if this sglang build lacks old"""
+    if old not in content:
+        sys.exit(f"Cannot add {what}: {old.strip()!r} not found in {filepath}")
+    return content.replace(old, new)
+
+
 with open(filepath, 'r') as f:
     content = f.read()
 
@@ -13,12 +22,20 @@ if 'glm47' in content:
 # Add import
 old_import = "from sglang.srt.function_call.glm4_moe_detector import Glm4MoeDetector"
 new_import = old_import + "\nfrom sglang.srt.function_call.glm47_moe_detector import Glm47MoeDetector"
-content = content.replace(old_import, new_import)
+content = replace(content, old_import, new_import, "the glm47 import")
 
 # Add to parser enum
 old_enum = '"glm45": Glm4MoeDetector,'
 new_enum = old_enum + '\n        "glm47": Glm47MoeDetector,'
-content = content.replace(old_enum, new_enum)
+content = replace(content, old_enum, new_enum, "glm47 to the parser enum")
+
+# Let detectors that build their own structural tag (glm47: XML arguments, not JSON) supply it
+old_tag = "            tag = self.get_structure_tag()"
+new_tag = """            if hasattr(self.detector, "build_structural_tag"):
+                tag = self.detector.build_structural_tag(self.tools)
+            else:
+                tag = self.get_structure_tag()"""
+content = replace(content, old_tag, new_tag, "the glm47 structural tag")
 
 with open(filepath, 'w') as f:
     f.write(content)
@@ -4,84 +4,169 @@ import sys
 
 FUNC_CODE = '''
 
-def infer_type_from_json_schema(schema):
-    """Infer the primary type of a parameter from JSON Schema."""
-    if not isinstance(schema, dict):
-        return None
-    if "type" in schema:
-        type_value = schema["type"]
-        if isinstance(type_value, str):
-            return type_value
-        elif isinstance(type_value, list) and type_value:
-            non_null_types = [t for t in type_value if t != "null"]
-            if non_null_types:
-                return non_null_types[0]
-            return "string"
-    if "anyOf" in schema or "oneOf" in schema:
-        schemas = schema.get("anyOf") or schema.get("oneOf")
-        types = []
-        if isinstance(schemas, list):
-            for sub_schema in schemas:
-                inferred_type = infer_type_from_json_schema(sub_schema)
-                if inferred_type:
-                    types.append(inferred_type)
-            if types:
-                if len(set(types)) == 1:
+_SCHEMA_RESOLVER_CACHE_SIZE = 256
+_schema_resolvers = {}
+
+
+def _json_pointer_get(document, pointer):
+    """Follow a JSON pointer such as ``/$defs/Item`` inside ``document``."""
+    node = document
+    for token in pointer.split("/")[1:]:
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(node, dict):
+            node = node.get(token)
+        elif isinstance(node, list) and token.isdigit() and int(token) < len(node):
+            node = node[int(token)]
+        else:
+            return None
+    return node
+
+
+class _SchemaTypeResolver:
+    """Memoized type inference over one root schema.
+
+    Schema nodes are interned by identity while the resolver keeps the root
+    alive, so every node (including ``$defs`` targets shared by many
+    properties) is inferred once. Local ``$ref`` pointers are resolved against
+    the root, and reference cycles resolve to None instead of recursing.
+    Schemas are treated as immutable once seen.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._types = {}
+        self._nodes = {}
+        self._active = set()
+
+    def resolve_ref(self, ref):
+        if not isinstance(ref, str) or not ref.startswith("#"):
+            return None
+        target = _json_pointer_get(self.root, ref[1:])
+        return target if isinstance(target, dict) else None
+
+    def infer(self, schema):
+        if not isinstance(schema, dict):
+            return None
+        key = id(schema)
+        if key in self._types:
+            return self._types[key]
+        if key in self._active:
+            return None
+        self._active.add(key)
+        try:
+            inferred_type = self._infer_node(schema)
+        finally:
+            self._active.discard(key)
+        self._nodes[key] = schema
+        self._types[key] = inferred_type
+        return inferred_type
+
+    def _infer_node(self, schema):
+        if "type" in schema:
+            type_value = schema["type"]
+            if isinstance(type_value, str):
+                return type_value
+            elif isinstance(type_value, list) and type_value:
+                non_null_types = [t for t in type_value if t != "null"]
+                if non_null_types:
+                    return non_null_types[0]
+                return "string"
+        if "$ref" in schema:
+            inferred_type = self.infer(self.resolve_ref(schema["$ref"]))
+            if inferred_type:
+                return inferred_type
+        if "anyOf" in schema or "oneOf" in schema:
+            schemas = schema.get("anyOf") or schema.get("oneOf")
+            types = []
+            if isinstance(schemas, list):
+                for sub_schema in schemas:
+                    inferred_type = self.infer(sub_schema)
+                    if inferred_type:
+                        types.append(inferred_type)
+                if types:
+                    if len(set(types)) == 1:
+                        return types[0]
+                    if "string" in types:
+                        return "string"
                     return types[0]
-                if "string" in types:
-                    return "string"
-                return types[0]
-    if "enum" in schema and isinstance(schema["enum"], list):
-        if not schema["enum"]:
+        if "enum" in schema and isinstance(schema["enum"], list):
+            if not schema["enum"]:
+                return "string"
+            enum_types = set()
+            for value in schema["enum"]:
+                if value is None:
+                    enum_types.add("null")
+                elif isinstance(value, bool):
+                    enum_types.add("boolean")
+                elif isinstance(value, int):
+                    enum_types.add("integer")
+                elif isinstance(value, float):
+                    enum_types.add("number")
+                elif isinstance(value, str):
+                    enum_types.add("string")
+                elif isinstance(value, list):
+                    enum_types.add("array")
+                elif isinstance(value, dict):
+                    enum_types.add("object")
+            if len(enum_types) == 1:
+                return enum_types.pop()
             return "string"
-        enum_types = set()
-        for value in schema["enum"]:
-            if value is None:
-                enum_types.add("null")
-            elif isinstance(value, bool):
-                enum_types.add("boolean")
-            elif isinstance(value, int):
-                enum_types.add("integer")
-            elif isinstance(value, float):
-                enum_types.add("number")
-            elif isinstance(value, str):
-                enum_types.add("string")
-            elif isinstance(value, list):
-                enum_types.add("array")
-            elif isinstance(value, dict):
-                enum_types.add("object")
-        if len(enum_types) == 1:
-            return enum_types.pop()
-        return "string"
-    if "allOf" in schema and isinstance(schema["allOf"], list):
-        for sub_schema in schema["allOf"]:
-            inferred_type = infer_type_from_json_schema(sub_schema)
-            if inferred_type and inferred_type != "string":
-                return inferred_type
-        return "string"
-    if "properties" in schema:
-        return "object"
-    if "items" in schema:
-        return "array"
-    return None
+        if "allOf" in schema and isinstance(schema["allOf"], list):
+            for sub_schema in schema["allOf"]:
+                inferred_type = self.infer(sub_schema)
+                if inferred_type and inferred_type != "string":
+                    return inferred_type
+            return "string"
+        if "properties" in schema:
+            return "object"
+        if "items" in schema:
+            return "array"
+        return None
+
+
+def infer_type_from_json_schema(schema, root=None):
+    """Infer the primary type of a parameter from JSON Schema.
+
+    ``$ref`` pointers are resolved against ``root``, the schema holding
+    ``$defs``/``definitions`` (usually the tool's ``parameters``); it
+    defaults to ``schema`` itself. Results are memoized per root.
+    """
+    if not isinstance(schema, dict):
+        return None
+    if root is None:
+        root = schema
+    resolver = _schema_resolvers.get(id(root))
+    if resolver is None or resolver.root is not root:
+        resolver = _SchemaTypeResolver(root)
+        _schema_resolvers[id(root)] = resolver
+        if len(_schema_resolvers) > _SCHEMA_RESOLVER_CACHE_SIZE:
+            del _schema_resolvers[next(iter(_schema_resolvers))]
+    return resolver.infer(schema)
 
 '''
 
-filepath = sys.argv[1]
-with open(filepath, 'r') as f:
-    content = f.read()
 
-if 'infer_type_from_json_schema' in content:
-    print("Already patched")
-    sys.exit(0)
+def main():
+    filepath = sys.argv[1]
+    with open(filepath, 'r') as f:
+        content = f.read()
+
+    if '_SchemaTypeResolver' in content:
+        print("Already patched")
+        sys.exit(0)
+
+    marker = "def get_json_schema_constraint("
+    idx = content.find(marker)
+    if 'infer_type_from_json_schema' in content or idx == -1:
+        # Appending rebinds any older infer_type_from_json_schema in the module
+        content += FUNC_CODE
+    else:
+        content = content[:idx] + FUNC_CODE + content[idx:]
+
+    with open(filepath, 'w') as f:
+        f.write(content)
+    print("Patched successfully")
 
-marker = "def get_json_schema_constraint("
-idx = content.find(marker)
-if idx == -1:
-    content += FUNC_CODE
-else:
-    content = content[:idx] + FUNC_CODE + content[idx:]
 
-with open(filepath, 'w') as f:
-    f.write(content)
-print("Patched successfully")
+if __name__ == "__main__":
+    main()